@@ -0,0 +1,818 @@
+# analysis.py
+"""
+Review analysis pipeline (Layer 2 ML + Layer 3 behavioral + final decision).
+
+Modes:
+  - full:        re-score every review and rebuild behavioral analysis from scratch.
+  - incremental: score only reviews created/edited since the persisted watermark
+                 (or never analyzed), and re-run behavioral rules only for the
+                 users, devices and IPs those reviews touch.
+  - stream:      a full pass in fixed-size chunks with bounded memory, yielding
+                 one result per review (see stream_analysis).
+  - offline:     a resumable, checkpointed chunked pass over all or part of
+                 the reviews, run by `flask analyze` (see run_offline_analysis).
+
+Full and incremental runs take `workers`: with more than one, ML and
+behavioral scoring run on a process pool (parallel_scoring) with the same results.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, update
+
+import metrics
+from collusion import graph
+from extensions import db
+from feature_store import stored_features
+from ml_layer import (
+    SHARED_DEVICE_MAX_USERS,
+    SHARED_IP_MAX_USERS,
+    ml_model_predict_batch,
+    user_behavioral_analysis,
+)
+from models import AnalysisState, Review
+from parallel_scoring import behavioral_rows, predict_batch, scoring_pool
+from product_stats import StatsDelta, is_flagged
+from response_cache import response_cache
+
+WATERMARK_NAME = "analyze_all"
+# Verdict rows per executemany'd UPDATE batch
+PERSIST_CHUNK_SIZE = 1000
+# Incremental runs re-score every user in the touched collusion clusters; past
+# this many users that is no cheaper than a full run, which is used instead.
+INCREMENTAL_MAX_CLUSTER_USERS = 5000
+
+
+# -------------------------------
+# Watermark
+# -------------------------------
+def get_watermark(name=WATERMARK_NAME):
+    return AnalysisState.query.get(name)
+
+
+def advance_watermark(reviews, name=WATERMARK_NAME):
+    """Move the watermark to the newest (updated_at, id) among `reviews`."""
+    newest = max(
+        ((r.updated_at, r.id) for r in reviews if r.updated_at is not None),
+        default=None,
+    )
+    state = get_watermark(name)
+    if state is None:
+        state = AnalysisState(name=name)
+        db.session.add(state)
+    if newest is not None and (
+        state.last_updated_at is None
+        or newest > (state.last_updated_at, state.last_review_id or "")
+    ):
+        state.last_updated_at, state.last_review_id = newest
+    state.updated_at = datetime.utcnow()
+
+
+def _pending_filter(state):
+    """Reviews created/edited after the watermark, plus anything never analyzed."""
+    pending = Review.is_fake.is_(None)
+    if state is None or state.last_updated_at is None:
+        return pending
+    return or_(
+        pending,
+        Review.updated_at > state.last_updated_at,
+        and_(Review.updated_at == state.last_updated_at, Review.id > state.last_review_id),
+    )
+
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def _stored_ml(review):
+    if review.is_fake_ml is None:
+        return None
+    return {
+        "is_fake_ml": bool(review.is_fake_ml),
+        "confidence": review.ml_confidence or 0.0,
+        "model_version": review.ml_model_version,
+    }
+
+
+def _rings(rebuild=False):
+    """
+    Current collusion rings for the behavioral layer, or None when the graph is
+    off. rebuild re-reads the graph from the database first (whole-table runs),
+    so the result does not depend on what this process has seen.
+    """
+    ready = graph.rebuild() if rebuild else graph.ensure_warm()
+    return graph.ring_members() if ready else None
+
+
+def _behavioral_row(review, is_fake_ml):
+    """Projected (id, user_id, timestamp, device, ip, fake_signal) tuple for behavioral_analysis_rows."""
+    return (
+        review.id,
+        review.user_id,
+        review.timestamp,
+        review.device_fingerprint,
+        review.user_ip,
+        bool(review.is_fake_rule_based or is_fake_ml),
+    )
+
+
+def _verdict(review, ml_results, behavioral_results):
+    """
+    Final decision for one review (ORM object or stream row).
+
+    Returns the API row and the column values to persist. ML columns are left
+    out when ml_results is None (nothing stored and nothing new to store).
+    """
+    is_fake_final = bool(
+        review.is_fake_rule_based
+        or (ml_results or {}).get("is_fake_ml")
+        or behavioral_results.get("is_fake_behavioral", False)
+    )
+
+    values = {}
+    if ml_results is not None:
+        values["is_fake_ml"] = int(ml_results["is_fake_ml"])
+        values["ml_confidence"] = ml_results["confidence"]
+        values["ml_model_version"] = ml_results["model_version"]
+    values["is_fake_behavioral"] = int(behavioral_results.get("is_fake_behavioral", False))
+    values["behavioral_flags"] = ",".join(behavioral_results.get("flags", []))
+    values["behavioral_score"] = behavioral_results.get("suspicious_score", 0.0)
+    values["is_fake"] = 1 if is_fake_final else 0
+
+    result = {
+        "review_id": review.id,
+        "user_id": review.user_id,
+        "timestamp": review.timestamp.isoformat() if review.timestamp else None,
+        "rule_based": int(review.is_fake_rule_based) if review.is_fake_rule_based is not None else None,
+        "ml": ml_results,
+        "behavioral": behavioral_results,
+        "is_fake_final": is_fake_final,
+    }
+    return result, values
+
+
+def _collect_verdict(review, ml_results, behavioral_results, results, updates, stats):
+    """
+    Append the API row to `results` and, if any stored value changes, the
+    update to `updates` and the product_stats change to `stats`.
+    """
+    result, values = _verdict(review, ml_results, behavioral_results)
+    results.append(result)
+    if any(getattr(review, column) != value for column, value in values.items()):
+        updates.append({"id": review.id, **values})
+        stats.change(
+            (review.product_id, review.rating, is_flagged(review.is_fake, review.is_fake_rule_based)),
+            (review.product_id, review.rating, is_flagged(values["is_fake"], review.is_fake_rule_based)),
+        )
+
+
+def persist_verdicts(updates, stats=None, chunk_size=PERSIST_CHUNK_SIZE):
+    """
+    Write verdict rows ({"id": ..., column: value}) with set-based
+    UPDATE ... WHERE id = ? statements, executemany'd chunk_size rows at a time,
+    then the matching product_stats deltas. Every written row gets
+    results_updated_at = the database's now(), the clock updated_at comes from
+    (incremental exports follow both). Does not commit; loaded ORM objects are
+    not refreshed until they expire.
+    """
+    now = db.session.scalar(select(func.now())) if updates else None
+    for start in range(0, len(updates), chunk_size):
+        db.session.execute(update(Review), [
+            dict(row, results_updated_at=now) for row in updates[start:start + chunk_size]
+        ])
+    if stats is not None:
+        stats.apply()
+    return len(updates)
+
+
+def _summary(mode, results, total_analyzed, **extra):
+    flagged = [r for r in results if r["is_fake_final"]]
+    return {
+        "message": "Analysis complete",
+        "mode": mode,
+        "flagged_reviews": flagged,
+        "flagged_users": list({r["user_id"] for r in flagged}),
+        "total_analyzed": total_analyzed,
+        "fake_count": len(flagged),
+        "all_reviews": results,
+        **extra,
+    }
+
+
+# -------------------------------
+# Single review (async ingestion)
+# -------------------------------
+def score_review(review):
+    """
+    ML, behavioral and final verdict for one review whose rules have run.
+
+    Behavioral rules see all of the user's stored reviews; shared devices/IPs
+    are counted in SQL and the ring comes from the collusion graph, so the
+    review gets the verdict a full run would give it. The user's other
+    reviews are not rescored here (the next analysis run settles them).
+    Sets the verdict columns on `review` (caller commits); returns the API row.
+    """
+    ml_results = ml_model_predict_batch(
+        [review.review_text], features=stored_features([review]), cleaned_texts=[review.clean_review_text]
+    )[0]
+
+    user_rows = db.session.query(
+        Review.id, Review.timestamp, Review.device_fingerprint, Review.user_ip,
+        Review.is_fake_rule_based, Review.is_fake_ml,
+    ).filter(Review.user_id == review.user_id, Review.id != review.id)
+    inputs = [
+        {
+            "id": row.id,
+            "user_id": review.user_id,
+            "timestamp": row.timestamp,
+            "device_fingerprint": row.device_fingerprint,
+            "user_ip": row.user_ip,
+            "is_fake_rule_based": row.is_fake_rule_based,
+            "is_fake_ml": row.is_fake_ml,
+        }
+        for row in user_rows
+    ]
+    inputs.append({
+        "id": review.id,
+        "user_id": review.user_id,
+        "timestamp": review.timestamp,
+        "device_fingerprint": review.device_fingerprint,
+        "user_ip": review.user_ip,
+        "is_fake_rule_based": review.is_fake_rule_based,
+        "is_fake_ml": ml_results["is_fake_ml"],
+    })
+
+    def shared(column, value, max_users):
+        users = db.session.query(func.count(func.distinct(Review.user_id))).filter(column == value).scalar()
+        return {value} if users > max_users else set()
+
+    rings = None
+    if graph.ensure_warm():
+        ring = graph.user_ring(review.user_id)
+        rings = {review.user_id: ring} if ring else {}
+
+    behavioral_results = user_behavioral_analysis(
+        inputs,
+        shared(Review.device_fingerprint, review.device_fingerprint, SHARED_DEVICE_MAX_USERS),
+        shared(Review.user_ip, review.user_ip, SHARED_IP_MAX_USERS),
+        rings,
+    )[review.id]
+
+    result, values = _verdict(review, ml_results, behavioral_results)
+    for column, value in values.items():
+        setattr(review, column, value)
+    review.results_updated_at = func.now()
+    return result
+
+
+# -------------------------------
+# Full mode
+# -------------------------------
+def run_full_analysis(workers=1):
+    # id breaks timestamp ties so burst flags land on the same review in every mode
+    with metrics.analysis_stage_seconds.time(mode="full", stage="load"):
+        reviews = Review.query.order_by(Review.timestamp.desc(), Review.id.desc()).all()
+    if not reviews:
+        return None
+
+    # ----- Layer 2 (ML predictions, scored in batches) -----
+    with metrics.analysis_stage_seconds.time(mode="full", stage="ml"):
+        ml_predictions = predict_batch(
+            [review.review_text for review in reviews], features=stored_features(reviews), workers=workers,
+            cleaned_texts=[review.clean_review_text for review in reviews],
+        )
+    ml_results_map = {review.id: pred for review, pred in zip(reviews, ml_predictions)}
+
+    # ----- Layer 3 (Behavioral analysis across ALL reviews) -----
+    with metrics.analysis_stage_seconds.time(mode="full", stage="behavioral"):
+        behavioral_results_map = behavioral_rows(
+            (_behavioral_row(r, ml_results_map[r.id]["is_fake_ml"]) for r in reviews),
+            rings=_rings(rebuild=True),
+            workers=workers,
+        )
+
+    # ----- Final Decision and DB Update -----
+    # Only rows whose stored verdict changes are written, so re-runs are cheap.
+    results, updates, stats = [], [], StatsDelta()
+    with metrics.analysis_stage_seconds.time(mode="full", stage="verdict"):
+        for review in reviews:
+            _collect_verdict(review, ml_results_map[review.id], behavioral_results_map.get(review.id, {}),
+                             results, updates, stats)
+    with metrics.analysis_stage_seconds.time(mode="full", stage="write"):
+        persisted = persist_verdicts(updates, stats)
+        advance_watermark(reviews)
+    with metrics.analysis_stage_seconds.time(mode="full", stage="commit"):
+        db.session.commit()
+    response_cache.invalidate("analysis")
+    metrics.analysis_reviews.inc(len(results), mode="full")
+
+    return _summary("full", results, len(reviews), persisted=persisted)
+
+
+# -------------------------------
+# Incremental mode
+# -------------------------------
+def run_incremental_analysis(workers=1):
+    state = get_watermark()
+    pending = _pending_filter(state)
+
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="load"):
+        targets = Review.query.filter(pending).order_by(Review.updated_at, Review.id).all()
+    if not targets:
+        return None
+
+    # A new edge can merge clusters and change the ring status of all their users
+    rings = _rings()
+    cluster_users = graph.cluster_users(r.user_id for r in targets) if rings is not None else set()
+    if len(cluster_users) > INCREMENTAL_MAX_CLUSTER_USERS:
+        return run_full_analysis(workers)
+
+    # ----- Layer 2 (ML only for new/edited reviews) -----
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="ml"):
+        ml_predictions = predict_batch(
+            [review.review_text for review in targets], features=stored_features(targets), workers=workers,
+            cleaned_texts=[review.clean_review_text for review in targets],
+        )
+    ml_results_map = {review.id: pred for review, pred in zip(targets, ml_predictions)}
+
+    # ----- Layer 3 (Behavioral, scoped to what the new reviews touch) -----
+    # Affected users: authors of the new reviews plus everyone sharing their
+    # devices/IPs or collusion clusters. Loading all reviews of those users,
+    # and all reviews on any device/IP they used, makes every user/device/IP
+    # group that can change complete, so the affected users' verdicts match a
+    # full run.
+    touched_devices = select(Review.device_fingerprint).where(pending)
+    touched_ips = select(Review.user_ip).where(pending)
+    affected_users = select(Review.user_id).where(or_(
+        pending,
+        Review.device_fingerprint.in_(touched_devices),
+        Review.user_ip.in_(touched_ips),
+        Review.user_id.in_(cluster_users),
+    ))
+    user_devices = select(Review.device_fingerprint).where(Review.user_id.in_(affected_users))
+    user_ips = select(Review.user_ip).where(Review.user_id.in_(affected_users))
+
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="load_context"):
+        context = Review.query.filter(or_(
+            Review.user_id.in_(affected_users),
+            Review.device_fingerprint.in_(user_devices),
+            Review.user_ip.in_(user_ips),
+        )).all()
+    context_by_id = {r.id: r for r in context}
+    for review in targets:
+        context_by_id.setdefault(review.id, review)
+    context = sorted(context_by_id.values(), key=lambda r: (r.timestamp, r.id), reverse=True)
+
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="behavioral"):
+        behavioral_results_map = behavioral_rows(
+            (
+                _behavioral_row(
+                    r,
+                    ml_results_map[r.id]["is_fake_ml"] if r.id in ml_results_map else r.is_fake_ml,
+                )
+                for r in context
+            ),
+            rings=rings,
+            workers=workers,
+        )
+
+    # ----- Final Decision and DB Update -----
+    # Only reviews by affected users can change; others in the context were
+    # loaded just to complete device/IP groups.
+    target_devices = {r.device_fingerprint for r in targets}
+    target_ips = {r.user_ip for r in targets}
+    affected_user_ids = {r.user_id for r in targets} | cluster_users
+    affected_user_ids.update(
+        r.user_id for r in context
+        if r.device_fingerprint in target_devices or r.user_ip in target_ips
+    )
+
+    results, updates, stats = [], [], StatsDelta()
+    rescored = 0
+    for review in context:
+        if review.user_id not in affected_user_ids:
+            continue
+        if review.id in ml_results_map:
+            ml_results = ml_results_map[review.id]
+        else:
+            ml_results = _stored_ml(review)
+            rescored += 1
+        _collect_verdict(review, ml_results, behavioral_results_map.get(review.id, {}), results, updates, stats)
+
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="write"):
+        persisted = persist_verdicts(updates, stats)
+        advance_watermark(targets)
+    with metrics.analysis_stage_seconds.time(mode="incremental", stage="commit"):
+        db.session.commit()
+    response_cache.invalidate("analysis")
+    metrics.analysis_reviews.inc(len(results), mode="incremental")
+
+    return _summary("incremental", results, len(targets), behavioral_rescored=rescored, persisted=persisted)
+
+
+# -------------------------------
+# Streaming mode
+# -------------------------------
+STREAM_COLUMNS = (
+    Review.id,
+    Review.user_id,
+    Review.product_id,
+    Review.rating,
+    Review.timestamp,
+    Review.updated_at,
+    Review.device_fingerprint,
+    Review.user_ip,
+    Review.review_text,
+    Review.clean_review_text,
+    Review.feature_vector,
+    Review.feature_vectorizer_version,
+    Review.is_fake_rule_based,
+    # stored verdict, so unchanged rows are not rewritten
+    Review.is_fake_ml,
+    Review.ml_confidence,
+    Review.ml_model_version,
+    Review.is_fake_behavioral,
+    Review.behavioral_flags,
+    Review.behavioral_score,
+    Review.is_fake,
+)
+
+
+def shared_keys(column, max_users):
+    """Values of `column` (device/IP) used by more than `max_users` distinct users."""
+    rows = (
+        db.session.query(column)
+        .group_by(column)
+        .having(func.count(func.distinct(Review.user_id)) > max_users)
+    )
+    return {value for (value,) in rows}
+
+
+def _score_user_block(block, shared_devices, shared_ips, rings, stats, scored_ids=None):
+    """
+    Final verdicts for one user's (row, ml_results) pairs; product_stats
+    changes go to `stats`. With scored_ids, only those rows get a verdict and
+    the others (ml_results None or stored) are context for the per-user rules.
+    """
+    inputs = [
+        {
+            "id": row.id,
+            "user_id": row.user_id,
+            "timestamp": row.timestamp,
+            "device_fingerprint": row.device_fingerprint,
+            "user_ip": row.user_ip,
+            "is_fake_rule_based": row.is_fake_rule_based,
+            "is_fake_ml": ml_results["is_fake_ml"] if ml_results is not None else row.is_fake_ml,
+        }
+        for row, ml_results in block
+    ]
+    behavioral_results_map = user_behavioral_analysis(inputs, shared_devices, shared_ips, rings)
+
+    results, updates = [], []
+    for row, ml_results in block:
+        if scored_ids is None or row.id in scored_ids:
+            _collect_verdict(row, ml_results, behavioral_results_map[row.id], results, updates, stats)
+    return results, updates
+
+
+def iter_analysis_chunks(chunk_size=1000, after_user_id=None, before_commit=None):
+    """
+    Full analysis pass with bounded memory, one committed chunk at a time.
+
+    Reviews are read through a server-side cursor ordered by user, so each
+    user's reviews arrive contiguously and per-user rules (burst, repeat
+    offender) can be decided as soon as the user's block ends. Device/IP
+    sharing is precomputed with GROUP BY queries. Each chunk is ML-scored in
+    one batch, written back and committed before the next one is read.
+
+    after_user_id resumes a pass after the last fully committed user.
+    before_commit(results, last_user_id) runs inside each chunk's transaction
+    (e.g. to save a checkpoint atomically with the results).
+
+    Yields (results, last_user_id) after every commit. Peak memory is one
+    chunk plus the largest single-user block.
+    """
+    with metrics.analysis_stage_seconds.time(mode="stream", stage="precompute"):
+        shared_devices = shared_keys(Review.device_fingerprint, SHARED_DEVICE_MAX_USERS)
+        shared_ips = shared_keys(Review.user_ip, SHARED_IP_MAX_USERS)
+        rings = _rings(rebuild=True)
+    db.session.commit()
+
+    newest = None
+    pending_block = []  # (row, ml_results) of the user still being read
+
+    def commit(blocks):
+        results, updates, stats = [], [], StatsDelta()
+        with metrics.analysis_stage_seconds.time(mode="stream", stage="behavioral"):
+            for block in blocks:
+                block_results, block_updates = _score_user_block(block, shared_devices, shared_ips, rings, stats)
+                results.extend(block_results)
+                updates.extend(block_updates)
+        last_user_id = blocks[-1][0][0].user_id if blocks else None
+        with metrics.analysis_stage_seconds.time(mode="stream", stage="write"):
+            persist_verdicts(updates, stats)
+            if before_commit is not None:
+                before_commit(results, last_user_id)
+        with metrics.analysis_stage_seconds.time(mode="stream", stage="commit"):
+            db.session.commit()
+        response_cache.invalidate("analysis")
+        metrics.analysis_reviews.inc(len(results), mode="stream")
+        return results, last_user_id
+
+    # Same timestamp tie-break as run_full_analysis (id descending)
+    query = select(*STREAM_COLUMNS).order_by(Review.user_id, Review.timestamp, Review.id.desc())
+    if after_user_id is not None:
+        query = query.where(Review.user_id > after_user_id)
+
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            with metrics.analysis_stage_seconds.time(mode="stream", stage="ml"):
+                ml_predictions = ml_model_predict_batch(
+                    [row.review_text for row in rows], batch_size=chunk_size, features=stored_features(rows),
+                    cleaned_texts=[row.clean_review_text for row in rows],
+                )
+
+            complete_blocks = []
+            for row, ml_results in zip(rows, ml_predictions):
+                if pending_block and pending_block[-1][0].user_id != row.user_id:
+                    complete_blocks.append(pending_block)
+                    pending_block = []
+                pending_block.append((row, ml_results))
+                if row.updated_at is not None and (newest is None or (row.updated_at, row.id) > newest):
+                    newest = (row.updated_at, row.id)
+
+            if complete_blocks:
+                yield commit(complete_blocks)
+
+        if pending_block:
+            yield commit([pending_block])
+
+    # A resumed pass has not seen every row, so only a complete one moves the watermark.
+    if newest is not None and after_user_id is None:
+        state = get_watermark() or AnalysisState(name=WATERMARK_NAME)
+        state.last_updated_at, state.last_review_id = newest
+        state.updated_at = datetime.utcnow()
+        db.session.add(state)
+        db.session.commit()
+
+
+def stream_analysis(chunk_size=1000):
+    """
+    iter_analysis_chunks flattened into {"type": "review", ...} items,
+    followed by one {"type": "summary"} item.
+    """
+    total = fake_count = flagged_users = chunks = 0
+    last_flagged_user = object()
+
+    for results, _ in iter_analysis_chunks(chunk_size=chunk_size):
+        chunks += 1
+        for item in results:
+            total += 1
+            if item["is_fake_final"]:
+                fake_count += 1
+                if item["user_id"] != last_flagged_user:  # reviews arrive grouped by user
+                    flagged_users += 1
+                    last_flagged_user = item["user_id"]
+            yield {"type": "review", **item}
+
+    yield {
+        "type": "summary",
+        "message": "Analysis complete",
+        "mode": "stream",
+        "total_analyzed": total,
+        "fake_count": fake_count,
+        "flagged_user_count": flagged_users,
+        "chunks": chunks,
+    }
+
+
+# -------------------------------
+# Offline mode (flask analyze)
+# -------------------------------
+OFFLINE_STATE_PREFIX = "analyze:"
+
+
+def _newest(current, row):
+    if row.updated_at is not None and (current is None or (row.updated_at, row.id) > current):
+        return (row.updated_at, row.id)
+    return current
+
+
+def offline_state_name(since=None, product_id=None):
+    """analysis_state row holding the checkpoint of one offline scope."""
+    scope = ",".join(
+        part for part in (
+            f"product={product_id}" if product_id is not None else None,
+            f"since={since.isoformat()}" if since is not None else None,
+        ) if part
+    ) or "all"
+    name = OFFLINE_STATE_PREFIX + scope
+    if len(name) > 100:  # analysis_state.name is VARCHAR(100)
+        name = OFFLINE_STATE_PREFIX + hashlib.sha1(scope.encode()).hexdigest()
+    return name
+
+
+def _offline_scope(since, product_id):
+    """(SQL filter or None, Python predicate on a row) for the reviews to re-score."""
+    clauses = []
+    if since is not None:
+        clauses.append(func.coalesce(Review.updated_at, Review.timestamp) >= since)
+    if product_id is not None:
+        clauses.append(Review.product_id == product_id)
+
+    def in_scope(row):
+        if since is not None and (row.updated_at or row.timestamp or datetime.min) < since:
+            return False
+        return product_id is None or row.product_id == product_id
+
+    return (and_(*clauses) if clauses else None), in_scope
+
+
+def iter_offline_chunks(chunk_size=1000, since=None, product_id=None, after_user_id=None, workers=1,
+                        dry_run=False, before_commit=None):
+    """
+    Offline analysis pass, one committed chunk at a time (flask analyze).
+
+    Like iter_analysis_chunks, but users are paged with keyset queries
+    (WHERE user_id > last user ORDER BY user_id LIMIT chunk_size), so no cursor
+    or transaction stays open between chunks. A page that ends inside a user
+    is completed with that user's remaining reviews. Reviews without a user
+    (user_id NULL) are scored as one block in a last chunk, whose
+    last_user_id is None.
+
+    since/product_id limit the re-scored reviews to those created or edited
+    since `since` and/or of one product. All other reviews of the same users
+    are read too, as context for the per-user rules, and keep their stored
+    verdicts. Layer 1 verdicts are the stored rule columns: the rules measure
+    rates relative to the moment a review was posted, so they are not re-run.
+
+    ML batches go to one scoring_pool(workers) kept for the whole pass.
+    dry_run scores and reports but rolls every chunk back.
+    before_commit(last_user_id) runs inside each chunk's transaction; a
+    resumable caller stores last_user_id as its checkpoint, and the final
+    chunk's None clears it, as the pass is then complete.
+
+    Yields one {"results", "scanned", "updated", "last_user_id"} dict per chunk.
+    """
+    with metrics.analysis_stage_seconds.time(mode="offline", stage="precompute"):
+        shared_devices = shared_keys(Review.device_fingerprint, SHARED_DEVICE_MAX_USERS)
+        shared_ips = shared_keys(Review.user_ip, SHARED_IP_MAX_USERS)
+        rings = _rings(rebuild=True)
+    db.session.commit()
+
+    scope, in_scope = _offline_scope(since, product_id)
+    # Same order (and timestamp tie-break) as iter_analysis_chunks
+    ordered = select(*STREAM_COLUMNS).order_by(Review.user_id, Review.timestamp, Review.id.desc())
+    # The keyset runs on user_id, so reviews without a user are scored in one
+    # block after the last page (as iter_analysis_chunks groups them)
+    query = ordered.where(Review.user_id.is_not(None))
+    if scope is not None:
+        query = query.where(Review.user_id.in_(select(Review.user_id).where(scope)))
+
+    def score(rows, pool):
+        """Score one page of complete user blocks. Returns (results, updates, stats)."""
+        nonlocal newest
+        targets = [row for row in rows if in_scope(row)]
+        with metrics.analysis_stage_seconds.time(mode="offline", stage="ml"):
+            ml_predictions = predict_batch(
+                [row.review_text for row in targets], features=stored_features(targets),
+                workers=workers, batch_size=chunk_size, pool=pool,
+                cleaned_texts=[row.clean_review_text for row in targets],
+            )
+        ml_results_map = {row.id: pred for row, pred in zip(targets, ml_predictions)}
+
+        results, updates, stats = [], [], StatsDelta()
+        with metrics.analysis_stage_seconds.time(mode="offline", stage="behavioral"):
+            block = []
+            for row in rows:
+                if block and block[-1][0].user_id != row.user_id:
+                    block_results, block_updates = _score_user_block(
+                        block, shared_devices, shared_ips, rings, stats, ml_results_map)
+                    results.extend(block_results)
+                    updates.extend(block_updates)
+                    block = []
+                block.append((row, ml_results_map.get(row.id) or _stored_ml(row)))
+                newest = _newest(newest, row)
+            block_results, block_updates = _score_user_block(
+                block, shared_devices, shared_ips, rings, stats, ml_results_map)
+            results.extend(block_results)
+            updates.extend(block_updates)
+        return results, updates, stats
+
+    def finish(rows, results, updates, stats, last_user_id):
+        if dry_run:
+            db.session.rollback()
+        else:
+            with metrics.analysis_stage_seconds.time(mode="offline", stage="write"):
+                persist_verdicts(updates, stats)
+                if before_commit is not None:
+                    before_commit(last_user_id)
+            with metrics.analysis_stage_seconds.time(mode="offline", stage="commit"):
+                db.session.commit()
+            response_cache.invalidate("analysis")
+        metrics.analysis_reviews.inc(len(results), mode="offline")
+        return {"results": results, "scanned": len(rows), "updated": len(updates), "last_user_id": last_user_id}
+
+    newest = None
+    last_user_id = after_user_id
+    with scoring_pool(workers) as pool:
+        while True:
+            with metrics.analysis_stage_seconds.time(mode="offline", stage="load"):
+                page = query if last_user_id is None else query.where(Review.user_id > last_user_id)
+                rows = db.session.execute(page.limit(chunk_size)).all()
+                if not rows:
+                    break
+                if len(rows) == chunk_size:
+                    tail_user_id = rows[-1].user_id
+                    rows = [row for row in rows if row.user_id != tail_user_id]
+                    rows.extend(db.session.execute(query.where(Review.user_id == tail_user_id)).all())
+
+            results, updates, stats = score(rows, pool)
+            last_user_id = rows[-1].user_id
+            yield finish(rows, results, updates, stats, last_user_id)
+
+        # Final pass over the reviews without a user. It commits with
+        # before_commit(None), which marks the keyset part as done.
+        with metrics.analysis_stage_seconds.time(mode="offline", stage="load"):
+            rows = db.session.execute(ordered.where(Review.user_id.is_(None))).all()
+        if any(in_scope(row) for row in rows):
+            results, updates, stats = score(rows, pool)
+            yield finish(rows, results, updates, stats, None)
+
+    # Only a complete, unscoped pass has seen every row, like iter_analysis_chunks
+    if newest is not None and after_user_id is None and scope is None and not dry_run:
+        state = get_watermark() or AnalysisState(name=WATERMARK_NAME)
+        state.last_updated_at, state.last_review_id = newest
+        state.updated_at = datetime.utcnow()
+        db.session.add(state)
+        db.session.commit()
+
+
+def run_offline_analysis(chunk_size=1000, since=None, product_id=None, workers=1, dry_run=False,
+                         restart=False, on_chunk=None):
+    """
+    Resumable iter_offline_chunks. The last committed user is checkpointed in
+    analysis_state (one row per scope, see offline_state_name) with every
+    chunk, and an interrupted run of the same scope continues after it unless
+    `restart`. The checkpoint is cleared when the pass completes.
+    on_chunk(totals) is called after every chunk. Returns the totals.
+    """
+    name = offline_state_name(since, product_id)
+    state = get_watermark(name)
+    after_user_id = None if restart or state is None else state.checkpoint_user_id
+
+    def save_checkpoint(last_user_id):
+        state = get_watermark(name)
+        if state is None:
+            state = AnalysisState(name=name)
+            db.session.add(state)
+        state.checkpoint_user_id = last_user_id
+        state.updated_at = datetime.utcnow()
+
+    totals = {
+        "resumed_after_user": after_user_id,
+        "dry_run": dry_run,
+        "workers": workers,
+        "chunks": 0,
+        "scanned": 0,
+        "analyzed": 0,
+        "updated": 0,
+        "fake_count": 0,
+        "last_user_id": after_user_id,
+    }
+    started = time.perf_counter()
+    for chunk in iter_offline_chunks(chunk_size=chunk_size, since=since, product_id=product_id,
+                                     after_user_id=after_user_id, workers=workers, dry_run=dry_run,
+                                     before_commit=None if dry_run else save_checkpoint):
+        totals["chunks"] += 1
+        totals["scanned"] += chunk["scanned"]
+        totals["analyzed"] += len(chunk["results"])
+        totals["updated"] += chunk["updated"]
+        totals["fake_count"] += sum(1 for r in chunk["results"] if r["is_fake_final"])
+        totals["last_user_id"] = chunk["last_user_id"]
+        totals["seconds"] = time.perf_counter() - started
+        if on_chunk is not None:
+            on_chunk(totals)
+
+    if not dry_run and get_watermark(name) is not None:
+        get_watermark(name).checkpoint_user_id = None
+        db.session.commit()
+    totals["seconds"] = time.perf_counter() - started
+    totals["reviews_per_second"] = totals["analyzed"] / totals["seconds"] if totals["seconds"] else 0.0
+    return totals
+
+
+def run_analysis(mode=None, workers=1):
+    """
+    Run the pipeline in `mode` ("full" or "incremental") on `workers`
+    processes. Without a mode, the first run is full and later runs are incremental.
+    Returns the response payload, or None when there is nothing to analyze.
+    """
+    if mode is None:
+        mode = "incremental" if get_watermark() is not None else "full"
+    if mode == "full":
+        return run_full_analysis(workers)
+    if mode == "incremental":
+        return run_incremental_analysis(workers)
+    raise ValueError(f"Unknown analysis mode: {mode}")
@@ -16,11 +16,53 @@ from models import User, Product, Review
 from routes.users import users_bp
 from routes.products import products_bp
 from routes.reviews import reviews_bp
+from routes.clusters import clusters_bp
 
 
 app.register_blueprint(users_bp, url_prefix="/api/users")
 app.register_blueprint(products_bp, url_prefix="/api/products")
 app.register_blueprint(reviews_bp, url_prefix="/api/reviews")
+app.register_blueprint(clusters_bp, url_prefix="/api/clusters")
+
+# Request metrics and GET /metrics
+import metrics
+
+metrics.init_app(app)
+
+# Background analysis jobs
+import jobs
+
+jobs.init_app(app)
+
+# In-memory counters for the add_review rule checks
+import rule_counters
+
+rule_counters.init_app(app)
+
+# Collusion graph (clusters of users sharing devices/IPs)
+import collusion
+
+collusion.init_app(app)
+
+# ML model registry (loaded lazily on first prediction)
+import ml_layer
+
+ml_layer.init_app(app)
+
+# Server-side cache and ETags for product/review reads
+import response_cache
+
+response_cache.init_app(app)
+
+# Async review scoring (POST /api/reviews/?async=1)
+import review_queue
+
+review_queue.init_app(app)
+
+# CLI commands (flask --app app <command>)
+from commands import register_commands
+
+register_commands(app)
 
 if __name__ == "__main__":
     app.run(debug=True)
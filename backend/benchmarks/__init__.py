@@ -0,0 +1,8 @@
+"""
+Benchmarks for the detection pipeline.
+
+    python -m benchmarks.run       # run stages on synthetic data, write JSON
+    python -m benchmarks.compare   # diff two result files
+
+See benchmarks/run.py for options.
+"""
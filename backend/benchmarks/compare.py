@@ -0,0 +1,58 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 10]
+
+Prints throughput, p50, p99 and peak memory for every (stage, size) present in
+both files, with the relative change. Exits with status 1 when any p50
+latency got worse by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("throughput_per_s", "p50_ms", "p99_ms", "peak_memory_mb")
+
+
+def _load(path):
+    with open(path) as f:
+        return {(r["stage"], r["size"]): r for r in json.load(f)["results"]}
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="p50 regression (percent) that fails the comparison (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    old, new = _load(args.old), _load(args.new)
+    regressions = []
+    print(f"{'stage':<26} {'size':>9}  " + "  ".join(f"{m:>26}" for m in METRICS))
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        cells = []
+        for metric in METRICS:
+            change = _change(old[key].get(metric), new[key].get(metric))
+            cell = f"{old[key].get(metric)} -> {new[key].get(metric)}"
+            cells.append(f"{cell:>17} ({change:+6.1f}%)" if change is not None else f"{cell:>26}")
+        print(f"{key[0]:<26} {key[1]:>9}  " + "  ".join(cells))
+
+        p50_change = _change(old[key].get("p50_ms"), new[key].get("p50_ms"))
+        if p50_change is not None and p50_change > args.threshold:
+            regressions.append((key, p50_change))
+
+    for (stage, size), change in regressions:
+        print(f"REGRESSION {stage} @ {size}: p50 {change:+.1f}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+# benchmarks/generator.py
+"""
+Seeded synthetic users, products and reviews for the benchmarks.
+
+The same seed and sizes always produce the same data. On top of ordinary
+reviews, the generator injects the patterns the detection layers look for:
+  - bursts:            one user posting several reviews within minutes
+  - shared devices:    device fingerprints used by several accounts
+  - shared IPs:        proxy IPs used by several accounts
+  - duplicate campaigns: near-identical texts posted by many accounts on one
+                       product in a short window
+Some of it lands in the last hour so the time-window rules fire too.
+"""
+import hashlib
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from faker import Faker
+
+import dedup_index
+import product_stats
+from rules import clean_text
+
+# Ordinary reviews draw 1-3 sentences from a pool that grows with the data
+# set, so accidental duplicates stay rare and duplicates come from campaigns.
+MIN_SENTENCE_POOL = 2000
+MAX_SENTENCE_POOL = 200_000
+HISTORY = timedelta(days=30)
+RECENT = timedelta(hours=1)
+
+
+class SyntheticData:
+    def __init__(
+        self,
+        n_reviews,
+        seed=42,
+        n_users=None,
+        n_products=None,
+        burst_rate=0.02,
+        campaign_rate=0.01,
+        shared_device_rate=0.05,
+        shared_ip_rate=0.05,
+        recent_rate=0.01,
+        now=None,
+    ):
+        self.n_reviews = n_reviews
+        self.n_users = n_users or max(10, n_reviews // 5)
+        self.n_products = n_products or max(5, n_reviews // 50)
+        self.burst_rate = burst_rate
+        self.campaign_rate = campaign_rate
+        self.shared_device_rate = shared_device_rate
+        self.shared_ip_rate = shared_ip_rate
+        self.recent_rate = recent_rate
+        self.now = now or datetime.utcnow().replace(microsecond=0)
+
+        self.rng = random.Random(seed)
+        self.faker = Faker()
+        self.faker.seed_instance(seed)
+        pool_size = min(MAX_SENTENCE_POOL, max(MIN_SENTENCE_POOL, n_reviews))
+        self.sentences = [self.faker.sentence(nb_words=self.rng.randint(4, 14)) for _ in range(pool_size)]
+
+        self.users = self._make_users()
+        self.products = self._make_products()
+
+    # -------------------------------
+    # Helpers
+    # -------------------------------
+    def _uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128)))
+
+    def _ip(self):
+        return ".".join(str(self.rng.randint(1, 254)) for _ in range(4))
+
+    def _text(self):
+        return " ".join(self.rng.choice(self.sentences) for _ in range(self.rng.randint(1, 3)))
+
+    def _timestamp(self):
+        if self.rng.random() < self.recent_rate:
+            return self.now - timedelta(seconds=self.rng.randint(0, int(RECENT.total_seconds())))
+        return self.now - timedelta(seconds=self.rng.randint(0, int(HISTORY.total_seconds())))
+
+    # -------------------------------
+    # Entities
+    # -------------------------------
+    def _make_users(self):
+        farm_devices = [hashlib.md5(self._uuid().encode()).hexdigest() for _ in range(max(1, self.n_users // 50))]
+        proxy_ips = [self._ip() for _ in range(max(1, self.n_users // 50))]
+
+        users = []
+        for _ in range(self.n_users):
+            user_id = self._uuid()
+            new_account = self.rng.random() < 0.05
+            age = timedelta(days=self.rng.randint(0, 6)) if new_account else timedelta(days=self.rng.randint(7, 720))
+            users.append({
+                "id": user_id,
+                "user_name": self.faker.user_name(),
+                "email": f"{user_id[:8]}@{self.faker.free_email_domain()}",
+                "password": "benchmark",
+                "created_at": self.now - age,
+                # not columns; used to place the user's reviews
+                "_device": (self.rng.choice(farm_devices) if self.rng.random() < self.shared_device_rate
+                            else hashlib.md5(user_id.encode()).hexdigest()),
+                "_ip": self.rng.choice(proxy_ips) if self.rng.random() < self.shared_ip_rate else self._ip(),
+            })
+        return users
+
+    def _make_products(self):
+        categories = [self.faker.word().title() for _ in range(20)]
+        return [
+            {
+                "id": self._uuid(),
+                "name": self.faker.catch_phrase(),
+                "category": self.rng.choice(categories),
+                "about_product": self.faker.paragraph(nb_sentences=8),
+                "rating": round(self.rng.uniform(1, 5), 1),
+                "rating_count": self.rng.randint(0, 10000),
+                "discount_percentage": f"{self.rng.randint(0, 80)}%",
+                "actual_price": f"₹{self.rng.randint(99, 99999)}",
+            }
+            for _ in range(self.n_products)
+        ]
+
+    def user_rows(self):
+        return [{k: v for k, v in u.items() if not k.startswith("_")} for u in self.users]
+
+    def product_rows(self):
+        return self.products
+
+    # -------------------------------
+    # Reviews
+    # -------------------------------
+    def _review(self, user, product_id, text, timestamp):
+        clean = clean_text(text)
+        return {
+            "id": self._uuid(),
+            "product_id": product_id,
+            "user_id": user["id"],
+            "review_text": text,
+            "rating": self.rng.choice([1, 2, 3, 4, 5, 5, 5]),
+            "timestamp": timestamp,
+            "updated_at": timestamp,
+            "user_ip": user["_ip"],
+            "device_fingerprint": user["_device"],
+            "clean_review_text": clean,
+        }
+
+    def _events(self):
+        """Yield lists of reviews: single reviews, bursts and campaigns."""
+        while True:
+            roll = self.rng.random()
+            if roll < self.campaign_rate:
+                template = self._text()
+                product_id = self.rng.choice(self.products)["id"]
+                start = self._timestamp()
+                reviews = []
+                for _ in range(self.rng.randint(5, 30)):
+                    text = template
+                    if self.rng.random() < 0.5:  # trivial variation
+                        text = text.upper() if self.rng.random() < 0.3 else text + self.rng.choice(["!", "!!", " :)", "."])
+                    reviews.append(self._review(self.rng.choice(self.users), product_id, text,
+                                                start + timedelta(seconds=self.rng.randint(0, 600))))
+                yield reviews
+            elif roll < self.campaign_rate + self.burst_rate:
+                user = self.rng.choice(self.users)
+                start = self._timestamp()
+                yield [
+                    self._review(user, self.rng.choice(self.products)["id"], self._text(),
+                                 start + timedelta(seconds=self.rng.randint(0, 300)))
+                    for _ in range(self.rng.randint(3, 12))
+                ]
+            else:
+                yield [self._review(self.rng.choice(self.users), self.rng.choice(self.products)["id"],
+                                    self._text(), self._timestamp())]
+
+    def review_batches(self, batch_size=10000):
+        """Yield lists of review rows (exactly n_reviews in total)."""
+        if self.n_reviews <= 0:
+            return
+        batch, produced = [], 0
+        for event in self._events():
+            for review in event:
+                batch.append(review)
+                produced += 1
+                if len(batch) >= batch_size or produced == self.n_reviews:
+                    yield batch
+                    batch = []
+                if produced == self.n_reviews:
+                    return
+
+
+def populate(db, data, batch_size=10000, index=True):
+    """
+    Insert the generated data with multi-row INSERTs. With index=True the
+    MinHash signatures and LSH buckets are written too, so duplicate lookups
+    behave as in production.
+    """
+    from sqlalchemy import insert
+
+    from models import Product, Review, ReviewLSHBucket, User
+
+    db.session.execute(insert(User), data.user_rows())
+    db.session.execute(insert(Product), data.product_rows())
+    db.session.commit()
+
+    inserted = 0
+    for batch in data.review_batches(batch_size):
+        buckets = []
+        if index:
+            for review in batch:
+                signature = dedup_index.compute_signature(review["clean_review_text"])
+                review["minhash_signature"] = signature.tobytes() if signature is not None else None
+                if signature is not None:
+                    buckets.extend(dedup_index.bucket_rows(
+                        review["id"], dedup_index.index_keys(review["clean_review_text"], signature)))
+        db.session.execute(insert(Review), batch)
+        if buckets:
+            db.session.execute(insert(ReviewLSHBucket), buckets)
+        db.session.commit()
+        inserted += len(batch)
+    product_stats.rebuild_product_stats()
+    return inserted
@@ -0,0 +1,171 @@
+# check_query_plans.py
+"""
+EXPLAIN every hot query issued by routes/reviews.py and routes/products.py
+(and the keyset pages of `flask analyze`) and fail if any of them needs a
+sequential scan, or, for paginated listings, sorts the whole result instead
+of reading it in index order.
+
+Usage (from backend/, against a migrated PostgreSQL database):
+
+    python check_query_plans.py
+
+The plans are taken with `enable_seqscan = off`. On a small development
+table the planner prefers a Seq Scan even when a good index exists; with
+seqscan disabled it still falls back to one only when no index can serve the
+query, which is what this check is after.
+
+Deliberate full passes (analysis in full/stream mode, GROUP BY device/IP,
+index rebuilds) are not listed: they read the whole table by design. The
+offline pass is listed because each of its pages must be a bounded index
+range, however large the table.
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_, select, text, tuple_
+
+from analysis import STREAM_COLUMNS, _offline_scope
+from app import app
+from extensions import db
+from models import AnalysisJobResult, Product, ProductStats, Review, ReviewLSHBucket, User
+from routes.products import PRODUCT_FILTERS, PRODUCT_LIST_FIELDS, PRODUCT_SORT_KEYS
+
+SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def _product_page(sort=None, descending=False, conditions=()):
+    """get_all_products as the route builds it (cursor applied)."""
+    columns = [column.label(name) for name, column in PRODUCT_LIST_FIELDS.items()]
+    query = (select(*columns).select_from(Product)
+             .outerjoin(ProductStats, ProductStats.product_id == Product.id).where(*conditions))
+    if sort is None:
+        return query.where(Product.id > SAMPLE_ID).order_by(Product.id).limit(20)
+    key = PRODUCT_SORT_KEYS[sort]
+    order = (key.desc(), Product.id.desc()) if descending else (key, Product.id)
+    position = tuple_(key, Product.id)
+    beyond = position < (0.5, SAMPLE_ID) if descending else position > (0.5, SAMPLE_ID)
+    return query.add_columns(key.label("_sort_key")).where(beyond).order_by(*order).limit(20)
+
+
+def _offline_page(since=None, product_id=None):
+    """One keyset page of iter_offline_chunks."""
+    scope, _ = _offline_scope(since, product_id)
+    query = select(*STREAM_COLUMNS).order_by(Review.user_id, Review.timestamp, Review.id.desc())
+    if scope is not None:
+        query = query.where(Review.user_id.in_(select(Review.user_id).where(scope)))
+    return query.where(Review.user_id > SAMPLE_ID).limit(1000)
+
+
+def hot_queries():
+    """(name, statement[, must read in index order]) for each query the request paths issue."""
+    now = datetime.utcnow()
+    return [
+        # routes/reviews.py
+        ("get_reviews", Review.query.filter(Review.id > SAMPLE_ID).order_by(Review.id).limit(20)),
+        ("get_reviews?product_id", Review.query.filter(
+            Review.product_id == SAMPLE_ID, Review.id > SAMPLE_ID).order_by(Review.id).limit(20)),
+        ("get_review / update_review / delete_review", Review.query.filter(Review.id == SAMPLE_ID)),
+        ("add_review: user lookup", User.query.filter(User.id == SAMPLE_ID)),
+        ("add_review: duplicate candidates", db.session.query(ReviewLSHBucket.review_id, func.count())
+            .filter(tuple_(ReviewLSHBucket.band, ReviewLSHBucket.bucket).in_([(0, 1), (1, 2)]))
+            .group_by(ReviewLSHBucket.review_id)),
+        ("add_review: candidate texts", db.session.query(Review.id, Review.clean_review_text)
+            .filter(Review.id.in_([SAMPLE_ID]))),
+        ("delete_review: drop LSH buckets", ReviewLSHBucket.query.filter_by(review_id=SAMPLE_ID)),
+        ("check_rate_limit", db.session.query(func.count(Review.id)).filter(
+            Review.user_id == SAMPLE_ID, Review.timestamp >= now - timedelta(minutes=5))),
+        ("check_burst_activity", db.session.query(func.count(Review.id)).filter(
+            Review.product_id == SAMPLE_ID, Review.timestamp >= now - timedelta(minutes=10))),
+        ("check_same_device", db.session.query(func.count(Review.id)).filter(
+            Review.device_fingerprint == SAMPLE_ID, Review.user_id != SAMPLE_ID)),
+        ("rule counters warm-up", db.session.query(Review.id).filter(
+            Review.timestamp >= now - timedelta(minutes=10))),
+        ("analyze_all incremental: pending reviews", Review.query.filter(or_(
+            Review.is_fake.is_(None),
+            Review.updated_at > now,
+        ))),
+        ("analyze_all incremental: context by user", Review.query.filter(Review.user_id.in_([SAMPLE_ID]))),
+        ("analyze_all incremental: context by device", Review.query.filter(
+            Review.device_fingerprint.in_([SAMPLE_ID]))),
+        ("analyze_all incremental: context by IP", Review.query.filter(Review.user_ip.in_([SAMPLE_ID]))),
+        ("analysis job results page", AnalysisJobResult.query.filter(
+            AnalysisJobResult.job_id == SAMPLE_ID, AnalysisJobResult.id > 0)
+            .order_by(AnalysisJobResult.id).limit(100)),
+        # routes/products.py
+        ("get_all_products", _product_page(), True),
+        # sorted pages join from products (see PRODUCT_SORT_KEYS): a top-N sort, but no Seq Scan
+        *((f"get_all_products?sort={sort}", _product_page(sort)) for sort in PRODUCT_SORT_KEYS),
+        *((f"get_all_products?sort={sort}&order=desc", _product_page(sort, descending=True))
+          for sort in PRODUCT_SORT_KEYS),
+        ("get_all_products?sort=fake_ratio&min_fake_ratio", _product_page(
+            "fake_ratio", conditions=[PRODUCT_FILTERS["fake_ratio"] >= 0.5])),
+        ("get_product", db.session.query(Product, ProductStats)
+            .outerjoin(ProductStats, ProductStats.product_id == Product.id).filter(Product.id == SAMPLE_ID)),
+        # flask analyze (analysis.iter_offline_chunks)
+        ("analyze offline: user page", _offline_page(), True),
+        ("analyze offline: rest of a user", select(*STREAM_COLUMNS).where(Review.user_id == SAMPLE_ID)
+            .order_by(Review.user_id, Review.timestamp, Review.id.desc())),
+        # scoped pages may sort: only the reviews of the users in scope are read
+        ("analyze offline --since: user page", _offline_page(since=now)),
+        ("analyze offline --product-id: user page", _offline_page(product_id=SAMPLE_ID)),
+        # routes/users.py
+        ("login / signup: user by email", User.query.filter_by(email="someone@example.com")),
+    ]
+
+
+def seq_scans(plan):
+    """Relations read with a Seq Scan anywhere in a JSON plan tree."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def full_sorts(plan):
+    """Sort nodes (not Incremental Sort) anywhere in a JSON plan tree."""
+    found = [plan] if plan.get("Node Type") == "Sort" else []
+    for child in plan.get("Plans", []):
+        found.extend(full_sorts(child))
+    return found
+
+
+def main():
+    with app.app_context():
+        if db.engine.dialect.name != "postgresql":
+            print(f"check_query_plans needs PostgreSQL, not {db.engine.dialect.name}")
+            return 2
+
+        failures = 0
+        with db.engine.connect() as conn:
+            conn.execute(text("SET enable_seqscan = off"))
+            for name, query, *ordered in hot_queries():
+                statement = getattr(query, "statement", query)
+                compiled = statement.compile(
+                    dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True}
+                )
+                plan = conn.exec_driver_sql(
+                    "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+                ).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+
+                scans = seq_scans(plan[0]["Plan"])
+                sorts = full_sorts(plan[0]["Plan"]) if ordered and ordered[0] else []
+                if scans:
+                    failures += 1
+                    print(f"FAIL  {name}: Seq Scan on {', '.join(sorted(set(scans)))}")
+                elif sorts:
+                    failures += 1
+                    print(f"FAIL  {name}: sorts the whole result ({', '.join(sorts[0].get('Sort Key', []))})")
+                else:
+                    print(f"ok    {name}")
+
+        print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} with sequential scans or full sorts")
+        return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
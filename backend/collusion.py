@@ -0,0 +1,350 @@
+# collusion.py
+"""
+Incrementally maintained collusion graph over users, devices and IPs.
+
+Every review adds the edges user-device and user-IP. Connected components
+(clusters) are kept with union-find (union by size, path halving), so an
+insert costs O(α(n)) amortized and no rescan is needed. A ring that rotates
+devices still ends up in one cluster as long as its accounts overlap on some
+device or IP.
+
+Per cluster the graph keeps the number of users, devices, IPs, reviews and
+rule-flagged reviews, and derives a ring suspicion score from them:
+
+    ring_score = 0.5 * min(1, (users - 1) / (devices + ips))    # identifier reuse
+               + 0.5 * flagged_reviews / reviews                # flagged share
+
+Clusters with fewer than COLLUSION_MIN_USERS users score 0. Clusters with a
+score of at least COLLUSION_RING_MIN_SCORE are reported as rings; the
+behavioral layer flags their members' reviews as "collusion_ring".
+
+A cluster's id is a hash of its smallest user id, so the same cluster has
+the same id in every process and after a restart. When two clusters merge,
+the old ids still resolve to the merged cluster until the next rebuild.
+Members are also linked in a circular list, which is spliced in O(1) on
+union, so listing a cluster costs O(its size).
+
+An IP used by more than SHARED_IP_MAX_USERS users (NAT, VPN or mobile
+carrier egress) is not evidence of collusion and would merge everyone behind
+it into one cluster, so it gets no edges; behavioral analysis flags such IPs
+as shared_ip on its own. Reviews without a user are left out.
+
+Edges are never removed (union-find cannot split). A deleted review only
+decrements the counts, so POST /api/clusters/rebuild re-reads the graph
+from the database. When an IP passes SHARED_IP_MAX_USERS after it already
+joined clusters, the graph is rebuilt on the next request. Like
+rule_counters, the graph warms on the first request, is updated by the
+insert paths and is per process. Full, stream and offline analysis runs
+rebuild it from the database first, so their ring verdicts do not depend on
+which process ran them.
+"""
+import hashlib
+import logging
+import threading
+
+from sqlalchemy import case, func
+
+from extensions import db
+from ml_layer import SHARED_IP_MAX_USERS
+from models import Review
+
+logger = logging.getLogger(__name__)
+
+COLLUSION_MIN_USERS = 3
+COLLUSION_RING_MIN_SCORE = 0.5
+
+USER, DEVICE, IP = "user", "device", "ip"
+
+
+class CollusionGraph:
+    def __init__(self):
+        self.enabled = True
+        self.warm = False
+        self._lock = threading.Lock()
+        self._warm_failed = False
+        self._clear()
+
+    def _clear(self):
+        self._ids = {}      # (kind, value) -> node
+        self._nodes = []    # node -> (kind, value)
+        self._parent = []
+        self._next = []     # circular list of each cluster's members
+        self._stats = {}    # root -> [nodes, users, devices, ips, reviews, flagged]
+        self._min_user = {}     # root -> smallest user id of the cluster
+        self._cluster_ids = {}  # cluster id (current or merged away) -> a node of the cluster
+        self._ip_users = {}     # IP -> its users, while at most SHARED_IP_MAX_USERS
+        self._shared_ips = set()
+
+    @staticmethod
+    def cluster_id_of(user_id) -> str:
+        return hashlib.sha1(str(user_id).encode()).hexdigest()[:16]
+
+    def _cluster_id(self, root):
+        return self.cluster_id_of(self._min_user[root])
+
+    # -------------------------------
+    # Union-find
+    # -------------------------------
+    def _node(self, kind, value):
+        key = (kind, value)
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._ids[key] = node
+            self._nodes.append(key)
+            self._parent.append(node)
+            self._next.append(node)
+            self._stats[node] = [1, int(kind == USER), int(kind == DEVICE), int(kind == IP), 0, 0]
+            if kind == USER:
+                self._min_user[node] = value
+                self._cluster_ids[self.cluster_id_of(value)] = node
+        return node
+
+    def _find(self, node):
+        parent = self._parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return a
+        if self._stats[a][0] < self._stats[b][0]:
+            a, b = b, a
+        self._parent[b] = a
+        self._next[a], self._next[b] = self._next[b], self._next[a]
+        merged, absorbed = self._stats[a], self._stats.pop(b)
+        for i, value in enumerate(absorbed):
+            merged[i] += value
+        # A device/IP node has no users until its first union
+        min_a, min_b = self._min_user.get(a), self._min_user.pop(b, None)
+        if min_b is not None and (min_a is None or min_b < min_a):
+            self._min_user[a] = min_b
+            self._cluster_ids[self.cluster_id_of(min_b)] = a
+        return a
+
+    def _add(self, user_id, device_fp, ip, reviews=1, flagged=0) -> bool:
+        """Add a review's edges and counts; False when the graph must be rebuilt (an IP became shared)."""
+        if user_id is None:
+            return True
+        node = self._node(USER, user_id)
+        if device_fp:  # missing/empty identifiers are not shared evidence
+            node = self._union(node, self._node(DEVICE, device_fp))
+        consistent = True
+        if ip and ip not in self._shared_ips:
+            users = self._ip_users.setdefault(ip, set())
+            users.add(user_id)
+            if len(users) > SHARED_IP_MAX_USERS:
+                # Its edges already joined clusters; only a rebuild can split them
+                self._shared_ips.add(ip)
+                del self._ip_users[ip]
+                consistent = False
+            else:
+                node = self._union(node, self._node(IP, ip))
+        stats = self._stats[self._find(node)]
+        stats[4] += reviews
+        stats[5] += flagged
+        return consistent
+
+    # -------------------------------
+    # Warm-up
+    # -------------------------------
+    def _load(self):
+        self._clear()
+        self._shared_ips = {
+            ip for (ip,) in db.session.query(Review.user_ip)
+            .filter(Review.user_ip.isnot(None), Review.user_id.isnot(None))
+            .group_by(Review.user_ip)
+            .having(func.count(func.distinct(Review.user_id)) > SHARED_IP_MAX_USERS)
+        }
+        rows = (
+            db.session.query(
+                Review.user_id,
+                Review.device_fingerprint,
+                Review.user_ip,
+                func.count(Review.id),
+                func.sum(case((Review.is_fake_rule_based == 1, 1), else_=0)),
+            )
+            .group_by(Review.user_id, Review.device_fingerprint, Review.user_ip)
+            .yield_per(10000)
+        )
+        for user_id, device_fp, ip, reviews, flagged in rows:
+            self._add(user_id, device_fp, ip, reviews, int(flagged or 0))
+
+    def ensure_warm(self) -> bool:
+        """Build the graph from the DB once (must be called inside an app context)."""
+        if self.warm or not self.enabled or self._warm_failed:
+            return self.warm
+        with self._lock:
+            if self.warm:
+                return True
+            try:
+                self._load()
+                self.warm = True
+            except Exception:
+                logger.warning("Collusion graph could not be built", exc_info=True)
+                db.session.rollback()
+                self._warm_failed = True
+        return self.warm
+
+    def rebuild(self) -> bool:
+        """Re-read the graph from the DB now, even if warm; inserts wait until it is done."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            try:
+                self._load()
+                self.warm, self._warm_failed = True, False
+            except Exception:
+                logger.warning("Collusion graph could not be rebuilt", exc_info=True)
+                db.session.rollback()
+                self._clear()
+                self.warm, self._warm_failed = False, True
+        return self.warm
+
+    def reset(self):
+        """Drop the graph; the next use rebuilds it from the DB."""
+        with self._lock:
+            self.warm = False
+            self._warm_failed = False
+            self._clear()
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def record_review(self, user_id, device_fp, ip, flagged=False):
+        with self._lock:  # waits for an in-progress warm-up instead of dropping the event
+            if self.warm and not self._add(user_id, device_fp, ip, 1, int(bool(flagged))):
+                self.warm = False  # rebuilt by the next ensure_warm()
+
+    def forget_review(self, user_id, device_fp, ip, flagged=False):
+        """Only the counts change; the edges stay until the next rebuild."""
+        with self._lock:
+            node = self._ids.get((USER, user_id))
+            if not self.warm or node is None:
+                return
+            stats = self._stats[self._find(node)]
+            stats[4] = max(0, stats[4] - 1)
+            stats[5] = max(0, stats[5] - int(bool(flagged)))
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    @staticmethod
+    def _ring_score(stats):
+        _, users, devices, ips, reviews, flagged = stats
+        if users < COLLUSION_MIN_USERS:
+            return 0.0
+        reuse = min(1.0, (users - 1) / max(1, devices + ips))
+        flagged_share = flagged / reviews if reviews else 0.0
+        return round(0.5 * reuse + 0.5 * flagged_share, 2)
+
+    def _summary(self, root):
+        stats = self._stats[root]
+        score = self._ring_score(stats)
+        return {
+            "cluster_id": self._cluster_id(root),
+            "users": stats[1],
+            "devices": stats[2],
+            "ips": stats[3],
+            "reviews": stats[4],
+            "flagged_reviews": stats[5],
+            "ring_score": score,
+            "is_ring": score >= COLLUSION_RING_MIN_SCORE,
+        }
+
+    def _ring_info(self, root):
+        stats = self._stats[root]
+        score = self._ring_score(stats)
+        if score < COLLUSION_RING_MIN_SCORE:
+            return None
+        return {"cluster_id": self._cluster_id(root), "cluster_size": stats[1], "ring_score": score}
+
+    def _members(self, root):
+        node = root
+        while True:
+            yield self._nodes[node]
+            node = self._next[node]
+            if node == root:
+                return
+
+    def clusters(self, min_users=COLLUSION_MIN_USERS, rings_only=False, limit=50):
+        """Cluster summaries, most suspicious first."""
+        with self._lock:
+            found = [
+                self._summary(root) for root, stats in self._stats.items()
+                if stats[1] >= min_users
+            ]
+        if rings_only:
+            found = [c for c in found if c["is_ring"]]
+        found.sort(key=lambda c: (-c["ring_score"], -c["users"], c["cluster_id"]))
+        return found[:limit]
+
+    def cluster(self, cluster_id, member_limit=1000):
+        """Summary and members of the cluster that `cluster_id` belongs to now, or None."""
+        with self._lock:
+            node = self._cluster_ids.get(cluster_id)
+            if node is None:
+                return None
+            root = self._find(node)
+            summary = self._summary(root)
+            members = {USER: [], DEVICE: [], IP: []}
+            for count, (kind, value) in enumerate(self._members(root)):
+                if count >= member_limit:
+                    summary["members_truncated"] = True
+                    break
+                members[kind].append(value)
+        summary["members"] = {"users": members[USER], "devices": members[DEVICE], "ips": members[IP]}
+        return summary
+
+    def user_cluster_id(self, user_id):
+        with self._lock:
+            node = self._ids.get((USER, user_id))
+            return self._cluster_id(self._find(node)) if node is not None else None
+
+    def user_ring(self, user_id):
+        """Ring info ({"cluster_id", "cluster_size", "ring_score"}) of the user's cluster, or None."""
+        with self._lock:
+            node = self._ids.get((USER, user_id))
+            if node is None:
+                return None
+            return self._ring_info(self._find(node))
+
+    def ring_members(self) -> dict:
+        """user_id -> {"cluster_id", "cluster_size", "ring_score"} for every user in a ring."""
+        rings = {}
+        with self._lock:
+            for root in self._stats:
+                info = self._ring_info(root)
+                if info is None:
+                    continue
+                for kind, value in self._members(root):
+                    if kind == USER:
+                        rings[value] = info
+        return rings
+
+    def cluster_users(self, user_ids) -> set:
+        """All users in the clusters of `user_ids` (their ring status can change together)."""
+        users = set()
+        with self._lock:
+            roots = {
+                self._find(node) for node in
+                (self._ids.get((USER, u)) for u in set(user_ids)) if node is not None
+            }
+            for root in roots:
+                users.update(value for kind, value in self._members(root) if kind == USER)
+        return users
+
+
+graph = CollusionGraph()
+
+
+def init_app(app):
+    """Build the graph when the process serves its first request."""
+    graph.enabled = app.config.get("COLLUSION_GRAPH_ENABLED", True)
+
+    @app.before_request
+    def _warm_collusion_graph():
+        graph.ensure_warm()
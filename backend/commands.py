@@ -0,0 +1,201 @@
+# commands.py
+import click
+from flask import current_app
+from sqlalchemy import func
+
+import analysis
+import compiled_model
+import dedup_index
+import feature_store
+import ingest
+import ml_layer
+import online_training
+import product_stats
+import review_export
+from extensions import db
+from models import Review
+
+
+def register_commands(app):
+    @app.cli.command("rebuild-dedup-index")
+    @click.option("--batch-size", default=1000, show_default=True)
+    def rebuild_dedup_index(batch_size):
+        """Recompute MinHash signatures and LSH buckets for every review."""
+        indexed = dedup_index.rebuild_index(batch_size=batch_size)
+        click.echo(f"Indexed {indexed} reviews")
+
+    @app.cli.command("rebuild-feature-vectors")
+    @click.option("--batch-size", default=1000, show_default=True)
+    @click.option("--all", "rebuild_all", is_flag=True,
+                  help="Recompute every vector, not only missing or stale ones.")
+    def rebuild_feature_vectors(batch_size, rebuild_all):
+        """Recompute stored TF-IDF vectors (run after changing the vectorizer)."""
+        rebuilt = feature_store.rebuild_feature_vectors(batch_size=batch_size, stale_only=not rebuild_all)
+        click.echo(f"Rebuilt feature vectors for {rebuilt} reviews")
+
+    @app.cli.command("rebuild-product-stats")
+    def rebuild_product_stats():
+        """Recompute the product_stats table from the reviews."""
+        rebuilt = product_stats.rebuild_product_stats()
+        click.echo(f"Rebuilt stats for {rebuilt} products")
+
+    @app.cli.command("import-reviews")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), default=None,
+                  help="Input format (default: from the file extension).")
+    @click.option("--chunk-size", default=1000, show_default=True)
+    def import_reviews(path, fmt, chunk_size):
+        """Bulk-import reviews from a JSON lines or CSV file."""
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        with open(path, encoding="utf-8", newline="") as f:
+            records = ingest.parse_csv(f) if fmt == "csv" else ingest.parse_jsonl(f)
+            report = ingest.ingest_records(records, chunk_size=chunk_size)
+
+        click.echo(f"Inserted {report['inserted']} reviews ({report['flagged']} flagged by rules), "
+                   f"{report['failed']} failed")
+        for error in report["errors"]:
+            click.echo(f"  row {error['row']}: {error['error']}", err=True)
+
+    @app.cli.command("analyze")
+    @click.option("--since", type=click.DateTime(), default=None,
+                  help="Only re-score reviews created or edited at/after this time.")
+    @click.option("--product", "product_id", default=None, help="Only re-score reviews of this product.")
+    @click.option("--workers", type=click.IntRange(min=1), default=None,
+                  help="Scoring processes (default: ANALYSIS_WORKERS).")
+    @click.option("--chunk-size", type=click.IntRange(min=1), default=1000, show_default=True)
+    @click.option("--dry-run", is_flag=True, help="Score and report, but write no verdicts or checkpoints.")
+    @click.option("--restart", is_flag=True, help="Ignore the checkpoint of an interrupted run.")
+    def analyze(since, product_id, workers, chunk_size, dry_run, restart):
+        """Run the ML + behavioral pipeline offline, resumable after interruption."""
+        workers = workers or current_app.config.get("ANALYSIS_WORKERS", 1)
+
+        def report(totals):
+            if totals["chunks"] == 1 and totals["resumed_after_user"] is not None:
+                click.echo(f"Resuming after user {totals['resumed_after_user']}", err=True)
+            click.echo(f"  chunk {totals['chunks']}: {totals['analyzed']} reviews scored "
+                       f"({totals['analyzed'] / totals['seconds']:.0f}/s), through user {totals['last_user_id']}",
+                       err=True)
+
+        summary = analysis.run_offline_analysis(
+            chunk_size=chunk_size, since=since, product_id=product_id, workers=workers,
+            dry_run=dry_run, restart=restart, on_chunk=report,
+        )
+        click.echo(f"{'Would update' if dry_run else 'Updated'} {summary['updated']} of {summary['analyzed']} "
+                   f"reviews ({summary['fake_count']} flagged, {summary['scanned']} read) "
+                   f"in {summary['chunks']} chunks")
+        click.echo(f"{summary['seconds']:.1f}s, {summary['reviews_per_second']:.0f} reviews/s "
+                   f"on {summary['workers']} worker(s)")
+
+    @app.cli.command("export-reviews")
+    @click.argument("out_dir", type=click.Path(file_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(review_export.FORMATS), default="parquet", show_default=True)
+    @click.option("--partition-by", type=click.Choice(review_export.PARTITION_KEYS), multiple=True,
+                  help="Write one file per value, in hive-style directories (repeatable).")
+    @click.option("--since", type=click.DateTime(), default=None,
+                  help="Only reviews created or edited at/after this time.")
+    @click.option("--incremental", "incremental_name", default=None, metavar="NAME",
+                  help="Only reviews changed since the last export under NAME; moves its watermark.")
+    @click.option("--row-group-size", type=click.IntRange(min=1), default=review_export.EXPORT_ROW_GROUP_SIZE,
+                  show_default=True)
+    @click.option("--vectors", is_flag=True, help="Include the stored TF-IDF feature vectors.")
+    def export_reviews(out_dir, fmt, partition_by, since, incremental_name, row_group_size, vectors):
+        """Export reviews and detection results to Parquet or Arrow IPC files."""
+        try:
+            report = review_export.export_reviews(
+                out_dir, fmt=fmt, partition_by=partition_by, since=since, incremental_name=incremental_name,
+                row_group_size=row_group_size, include_vectors=vectors,
+            )
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Exported {report['rows']} reviews in {report['row_groups']} row groups "
+                   f"to {len(report['files'])} files under {out_dir}")
+        if report["watermark"] is not None:
+            click.echo(f"Watermark of {incremental_name!r} is now {report['watermark']}")
+
+    @app.cli.command("train-online-model")
+    @click.option("--output", "path", type=click.Path(dir_okay=False), default=None,
+                  help="Model file (default: ML_HASHING_MODEL_PATH).")
+    @click.option("--label-source", "label_sources", multiple=True,
+                  help="Train on human labels with this manual_label_source "
+                       "(repeatable; default: ML_TRAINING_LABEL_SOURCES).")
+    @click.option("--full", is_flag=True, help="Start a new model from all labelled reviews.")
+    @click.option("--epochs", type=click.IntRange(min=1), default=1, show_default=True)
+    @click.option("--batch-size", type=click.IntRange(min=1), default=online_training.TRAINING_BATCH_SIZE,
+                  show_default=True)
+    def train_online_model(path, label_sources, full, epochs, batch_size):
+        """Train the hashing model (ML_BACKEND=hashing) on newly labelled reviews."""
+        path = path or current_app.config["ML_HASHING_MODEL_PATH"]
+        label_sources = label_sources or current_app.config.get("ML_TRAINING_LABEL_SOURCES") or ["manual"]
+
+        def report_batch(epoch, rows):
+            click.echo(f"  epoch {epoch + 1}: {rows} rows", err=True)
+
+        report = online_training.train_online_model(
+            path=path, label_sources=label_sources, full=full, epochs=epochs, batch_size=batch_size,
+            on_batch=report_batch,
+        )
+        if not report["saved"]:
+            click.echo(f"No new labelled reviews ({', '.join(label_sources)}); {path} unchanged")
+            return
+        click.echo(f"{'Updated' if report['resumed'] else 'Trained'} {path} on {report['new_rows']} reviews "
+                   f"({report['n_samples']} in total), through {report['trained_through']}")
+        click.echo("Reload serving processes with POST /api/reviews/model/reload")
+
+    def _parity_corpus(corpus_path, sample):
+        """Cleaned texts from a file (one per line) or a random sample of stored reviews."""
+        if corpus_path is not None:
+            with open(corpus_path, encoding="utf-8") as f:
+                texts = [line.rstrip("\n") for line in f if line.strip()]
+        else:
+            texts = [text for (text,) in db.session.query(Review.review_text).order_by(func.random()).limit(sample)]
+        return [ml_layer.clean_text(text) for text in texts]
+
+    def _echo_parity(report):
+        click.echo(f"Parity on {report['texts']} texts: max probability diff {report['max_probability_diff']:.2e}, "
+                   f"max feature diff {report['max_feature_diff']}, {report['label_mismatches']} label mismatches "
+                   f"(tolerance {report['tolerance']:.0e})")
+
+    @app.cli.command("compile-model")
+    @click.option("--output", "out_dir", type=click.Path(file_okay=False), default=None,
+                  help="Directory to write (default: ML_COMPILED_MODEL_DIR).")
+    @click.option("--corpus", "corpus_path", type=click.Path(exists=True, dir_okay=False), default=None,
+                  help="Parity-check on these texts (one per line) instead of stored reviews.")
+    @click.option("--sample", type=click.IntRange(min=1), default=2000, show_default=True,
+                  help="Stored reviews to parity-check on.")
+    def compile_model(out_dir, corpus_path, sample):
+        """Compile the pickled model for ML_BACKEND=compiled; installed only if it matches."""
+        out_dir = out_dir or current_app.config["ML_COMPILED_MODEL_DIR"]
+        loaded = ml_layer.load_ml_model(current_app.config["ML_MODEL_PATH"], current_app.config["ML_VECTORIZER_PATH"])
+        if loaded is None:
+            raise click.ClickException("Pickled model files missing; nothing to compile")
+        try:
+            meta, report = compiled_model.compile_model(loaded, out_dir, parity_texts=_parity_corpus(corpus_path, sample))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        _echo_parity(report)
+        click.echo(f"Compiled model {meta['version']} ({meta['n_features']} features) to {out_dir}")
+        click.echo("Serve it with ML_BACKEND=compiled (POST /api/reviews/model/reload to swap in)")
+
+    @app.cli.command("check-compiled-model")
+    @click.option("--model-dir", type=click.Path(file_okay=False), default=None,
+                  help="Compiled model (default: ML_COMPILED_MODEL_DIR).")
+    @click.option("--corpus", "corpus_path", type=click.Path(exists=True, dir_okay=False), default=None,
+                  help="Texts to compare on, one per line (default: a sample of stored reviews).")
+    @click.option("--sample", type=click.IntRange(min=1), default=2000, show_default=True)
+    def check_compiled_model(model_dir, corpus_path, sample):
+        """Verify the compiled model scores like ml_model_predict with the pickled files."""
+        model_dir = model_dir or current_app.config["ML_COMPILED_MODEL_DIR"]
+        compiled = compiled_model.load_compiled_model(model_dir)
+        loaded = ml_layer.load_ml_model(current_app.config["ML_MODEL_PATH"], current_app.config["ML_VECTORIZER_PATH"])
+        if compiled is None or loaded is None:
+            raise click.ClickException("Compiled model or pickled model files missing")
+        if compiled.meta["version"] != loaded.version:
+            click.echo(f"Compiled from model {compiled.meta['version']}, pickled files are {loaded.version}; "
+                       "run `flask compile-model`", err=True)
+        try:
+            report = compiled_model.check_parity(loaded, compiled, _parity_corpus(corpus_path, sample))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        _echo_parity(report)
+        if not report["ok"]:
+            raise click.ClickException("Compiled model does not match the pickled one")
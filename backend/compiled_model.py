@@ -0,0 +1,274 @@
+# compiled_model.py
+"""
+Compiled inference for the pickled TF-IDF + logistic regression model
+(ML_BACKEND=compiled, built with `flask compile-model`).
+
+sklearn's transform and predict_proba spend most of a single-review call on
+input validation, not on the arithmetic. Compiling turns the fitted pair into
+plain data, written to one directory:
+
+    meta.json       tokenizer settings (token pattern, lowercase, stop words,
+                    n-gram range, tf/idf/norm options), intercept, and the
+                    versions of the pickled files it was compiled from
+    vocabulary.txt  one token per line, line number = column index
+    idf.npy         IDF weight per column (ones without use_idf)
+    coef.npy        coefficient per column
+
+The .npy arrays are memory-mapped on load, so forked workers share them, and
+the vocabulary becomes a dict (the token -> index hash table). Serving needs
+numpy and scipy only; sklearn is imported by compile_model alone.
+
+CompiledModel has the vectorizer and model methods ml_layer uses
+(transform, predict_proba), so it drops into the registry as both. It keeps
+the pickle's version and vectorizer_version: it computes the same
+probabilities and feature rows (check_parity verifies that on a sample), so
+the prediction cache and stored feature vectors stay valid across a switch.
+"""
+import json
+import math
+import os
+import re
+import shutil
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.special import expit
+
+FORMAT_VERSION = 1
+PARITY_TOLERANCE = 1e-9
+
+
+# -------------------------------
+# Compile (needs sklearn)
+# -------------------------------
+def _check_compilable(vectorizer, model):
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+    if not isinstance(vectorizer, CountVectorizer):
+        raise ValueError(f"Cannot compile a {type(vectorizer).__name__}; expected a TfidfVectorizer")
+    if vectorizer.analyzer != "word" or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+        raise ValueError("Only the built-in word analyzer can be compiled")
+    if vectorizer.strip_accents is not None:
+        raise ValueError("strip_accents is not supported by the compiled tokenizer")
+    if isinstance(vectorizer, TfidfVectorizer) and vectorizer.norm not in ("l1", "l2", None):
+        raise ValueError(f"Unsupported norm: {vectorizer.norm}")
+    logistic = isinstance(model, LogisticRegression) or (
+        isinstance(model, SGDClassifier) and model.loss == "log_loss"
+    )
+    if not logistic or model.coef_.shape[0] != 1 or list(model.classes_) != [0, 1]:
+        raise ValueError("Only a binary (0/1) logistic model can be compiled")
+
+
+def compile_model(loaded, out_dir, parity_texts=None, mmap_mode="r"):
+    """
+    Write the compiled form of a pickled LoadedModel to out_dir. With
+    parity_texts (cleaned), the new files are first checked against `loaded`
+    and only installed if check_parity passes; otherwise ValueError. A
+    previous compiled model is replaced only once the new one is complete.
+    Returns (meta, parity report or None).
+    """
+    vectorizer, model = loaded.vectorizer, loaded.model
+    _check_compilable(vectorizer, model)
+    tfidf = hasattr(vectorizer, "idf_")
+
+    vocabulary = sorted(vectorizer.vocabulary_.items(), key=lambda item: item[1])
+    if [index for _, index in vocabulary] != list(range(len(vocabulary))):
+        raise ValueError("Vocabulary indices are not contiguous")
+    if any("\n" in token for token, _ in vocabulary):
+        raise ValueError("Tokens containing newlines cannot be compiled")
+    stop_words = vectorizer.get_stop_words()
+    meta = {
+        "format": FORMAT_VERSION,
+        "version": loaded.version,
+        "vectorizer_version": loaded.vectorizer_version,
+        "n_features": len(vocabulary),
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": vectorizer.lowercase,
+        "stop_words": sorted(stop_words) if stop_words else [],
+        "ngram_range": list(vectorizer.ngram_range),
+        "binary": vectorizer.binary,
+        "sublinear_tf": tfidf and vectorizer.sublinear_tf,
+        "norm": vectorizer.norm if tfidf else None,
+        "intercept": float(model.intercept_[0]),
+    }
+
+    out_dir = out_dir.rstrip(os.sep)
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        with open(os.path.join(tmp_dir, "vocabulary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(token for token, _ in vocabulary))
+        idf = vectorizer.idf_ if tfidf and vectorizer.use_idf else np.ones(len(vocabulary))
+        np.save(os.path.join(tmp_dir, "idf.npy"), np.ascontiguousarray(idf, dtype=np.float64))
+        np.save(os.path.join(tmp_dir, "coef.npy"), np.ascontiguousarray(model.coef_[0], dtype=np.float64))
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        report = None
+        if parity_texts is not None:
+            report = check_parity(loaded, load_compiled_model(tmp_dir, mmap_mode=mmap_mode), parity_texts)
+            if not report["ok"]:
+                raise ValueError(f"Compiled model does not match the pickled one: {report}")
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Swap directories; readers only load on startup or /model/reload
+    old_dir = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return meta, report
+
+
+# -------------------------------
+# Serve (numpy + scipy only)
+# -------------------------------
+class CompiledModel:
+    """TF-IDF transform and logistic scoring from compiled arrays."""
+
+    def __init__(self, meta, vocabulary, idf, coef):
+        self.meta = meta
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.coef = coef
+        self.intercept = meta["intercept"]
+        self.n_features = meta["n_features"]
+        self._find_tokens = re.compile(meta["token_pattern"]).findall
+        self._stop_words = frozenset(meta["stop_words"])
+        self._min_n, self._max_n = meta["ngram_range"]
+
+    def _tokens(self, text):
+        """Same terms, in the same order, as sklearn's word analyzer."""
+        if self.meta["lowercase"]:
+            text = text.lower()
+        tokens = self._find_tokens(text)
+        if self._stop_words:
+            tokens = [t for t in tokens if t not in self._stop_words]
+        if self._max_n == 1:
+            return tokens
+        terms = list(tokens) if self._min_n == 1 else []
+        for n in range(max(self._min_n, 2), min(self._max_n, len(tokens)) + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def row(self, text):
+        """(sorted column indices, normalized TF-IDF values) of one cleaned text."""
+        counts = {}
+        vocabulary = self.vocabulary
+        for term in self._tokens(text):
+            index = vocabulary.get(term)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        indices = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+        if self.meta["binary"]:
+            values = np.ones(len(indices))
+        else:
+            values = np.fromiter((counts[i] for i in indices.tolist()), dtype=np.float64, count=len(counts))
+            if self.meta["sublinear_tf"]:
+                values = np.log(values) + 1
+        values *= self.idf[indices]
+        norm = self.meta["norm"]
+        if norm is not None and len(values):
+            # Summed in column order, as sklearn's normalize does, for identical values
+            total = 0.0
+            for value in values.tolist():
+                total += value * value if norm == "l2" else abs(value)
+            if norm == "l2":
+                total = math.sqrt(total)
+            if total > 0:
+                values /= total
+        return indices, values
+
+    def probability(self, text):
+        """Fake probability of one cleaned text, without building a matrix."""
+        indices, values = self.row(text)
+        return float(expit(np.dot(values, self.coef[indices]) + self.intercept))
+
+    # --- vectorizer / model interface used by ml_layer ---
+    def transform(self, texts):
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            row_indices, row_values = self.row(text)
+            indices.append(row_indices)
+            data.append(row_values)
+            indptr.append(indptr[-1] + len(row_indices))
+        return csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                np.asarray(indptr),
+            ),
+            shape=(len(texts), self.n_features),
+        )
+
+    def predict_proba(self, X):
+        probs = expit(X @ self.coef + self.intercept)
+        return np.column_stack((1 - probs, probs))
+
+
+def load_compiled_model(model_dir, mmap_mode="r"):
+    """CompiledModel from a compile_model directory, or None when it is missing."""
+    meta_path = os.path.join(model_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{model_dir} has compiled format {meta.get('format')}, expected {FORMAT_VERSION}; "
+                         "run `flask compile-model` again")
+    with open(os.path.join(model_dir, "vocabulary.txt"), encoding="utf-8") as f:
+        tokens = f.read().split("\n")
+    vocabulary = dict(zip(tokens, range(len(tokens))))
+    idf = np.load(os.path.join(model_dir, "idf.npy"), mmap_mode=mmap_mode)
+    coef = np.load(os.path.join(model_dir, "coef.npy"), mmap_mode=mmap_mode)
+    if not len(vocabulary) == len(idf) == len(coef) == meta["n_features"]:
+        raise ValueError(f"{model_dir} is inconsistent (vocabulary, idf and coef sizes differ)")
+    return CompiledModel(meta, vocabulary, idf, coef)
+
+
+# -------------------------------
+# Parity check
+# -------------------------------
+def check_parity(reference, compiled, texts, tolerance=PARITY_TOLERANCE):
+    """
+    Compare the compiled model with the pickled LoadedModel `reference` on
+    cleaned texts: the probabilities ml_model_predict would return (sklearn
+    transform + predict_proba, as in ml_layer.batch_probabilities), the
+    single-text fast path, and the TF-IDF rows stored as feature vectors.
+    Returns a report dict; report["ok"] is False if anything differs by more
+    than `tolerance` or a label flips. ValueError for an empty corpus, which
+    would pass without checking anything.
+    """
+    if not len(texts):
+        raise ValueError("Parity corpus is empty; pass --corpus or store some reviews first")
+    expected = reference.model.predict_proba(reference.vectorizer.transform(texts))[:, 1]
+    batched = compiled.predict_proba(compiled.transform(texts))[:, 1]
+    single = np.array([compiled.probability(text) for text in texts])
+
+    X_ref = reference.vectorizer.transform(texts).tocsr()
+    X_ref.sort_indices()
+    X_new = compiled.transform(texts)
+    same_terms = X_ref.shape == X_new.shape and np.array_equal(X_ref.indptr, X_new.indptr) \
+        and np.array_equal(X_ref.indices, X_new.indices)
+    feature_diff = float(np.abs(X_ref.data - X_new.data).max(initial=0)) if same_terms else None
+
+    report = {
+        "texts": len(texts),
+        "max_probability_diff": float(max(np.abs(expected - batched).max(initial=0),
+                                          np.abs(expected - single).max(initial=0))),
+        "label_mismatches": int(((expected > 0.5) != (batched > 0.5)).sum() + ((expected > 0.5) != (single > 0.5)).sum()),
+        "same_terms": bool(same_terms),
+        "max_feature_diff": feature_diff,
+        "tolerance": tolerance,
+    }
+    report["ok"] = (
+        report["max_probability_diff"] <= tolerance
+        and report["label_mismatches"] == 0
+        and same_terms
+        and feature_diff <= tolerance
+    )
+    return report
@@ -11,3 +11,90 @@ DB_HOST = os.getenv("DB_HOST")
 
 SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Background analysis jobs (jobs.py)
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+ANALYSIS_JOB_CHUNK_SIZE = int(os.getenv("ANALYSIS_JOB_CHUNK_SIZE", "1000"))
+# A running job refreshes its heartbeat every ANALYSIS_JOB_HEARTBEAT_SECONDS; one whose
+# heartbeat is older than ANALYSIS_JOB_STALE_SECONDS is treated as orphaned and resumed
+# by whichever process's recovery thread (also run every ANALYSIS_JOB_HEARTBEAT_SECONDS)
+# sees it first. Keep the stale threshold several heartbeats long.
+ANALYSIS_JOB_HEARTBEAT_SECONDS = int(os.getenv("ANALYSIS_JOB_HEARTBEAT_SECONDS", "30"))
+ANALYSIS_JOB_STALE_SECONDS = int(os.getenv("ANALYSIS_JOB_STALE_SECONDS", "120"))
+
+# Processes used by full/incremental analysis runs (parallel_scoring.py); 1 = serial.
+# Workers are forked, so they share the loaded model with the web process.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "1"))
+# Upper bound for ?workers= on /analyze_all; pools are also capped at the CPU count.
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+# In-process counters for the add_review rule checks (rule_counters.py).
+# State is per process, so outcomes only match the SQL checks when a single
+# process serves all writes: on by default, but turned off (with a warning)
+# when WEB_CONCURRENCY (below) is above 1. Set 0 when reviews are also
+# imported with `flask import-reviews` while the server runs.
+RULE_COUNTERS_ENABLED = os.getenv("RULE_COUNTERS_ENABLED", "1") == "1"
+
+# In-process collusion graph (collusion.py, /api/clusters). Also per process;
+# full, stream and offline analysis rebuild it from the database before
+# scoring. When disabled, analysis runs without the collusion_ring rule.
+COLLUSION_GRAPH_ENABLED = os.getenv("COLLUSION_GRAPH_ENABLED", "1") == "1"
+
+# ML model files (ml_layer.registry). Loaded lazily; numpy arrays are
+# memory-mapped (mmap mode "r") so worker processes share their pages.
+# Set ML_MODEL_MMAP_MODE to an empty string to load private copies instead.
+_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes")
+ML_MODEL_PATH = os.getenv("ML_MODEL_PATH", os.path.join(_MODEL_DIR, "ml_model.pkl"))
+ML_VECTORIZER_PATH = os.getenv("ML_VECTORIZER_PATH", os.path.join(_MODEL_DIR, "vectorizer.pkl"))
+ML_MODEL_MMAP_MODE = os.getenv("ML_MODEL_MMAP_MODE", "r")
+# POST /api/reviews/model/reload reloads every worker process; each one checks
+# for new reload requests at most this often.
+ML_RELOAD_CHECK_SECONDS = int(os.getenv("ML_RELOAD_CHECK_SECONDS", "10"))
+
+# ML_BACKEND: pickle (the Colab-trained files above) or hashing (a stateless
+# HashingVectorizer + SGD model in one .npz, trained in-repo with
+# `flask train-online-model` from human labels whose manual_label_source is listed below).
+ML_BACKEND = os.getenv("ML_BACKEND", "pickle")
+ML_HASHING_MODEL_PATH = os.getenv("ML_HASHING_MODEL_PATH", os.path.join(_MODEL_DIR, "hashing_model.npz"))
+ML_TRAINING_LABEL_SOURCES = [s for s in os.getenv("ML_TRAINING_LABEL_SOURCES", "manual").split(",") if s]
+# ML_BACKEND=compiled serves the pickled model from plain arrays (no sklearn at
+# serve time); build ML_COMPILED_MODEL_DIR from the pickle files with `flask compile-model`.
+ML_COMPILED_MODEL_DIR = os.getenv("ML_COMPILED_MODEL_DIR", os.path.join(_MODEL_DIR, "compiled_model"))
+
+# ML prediction cache (prediction_cache.py), keyed by cleaned-text hash + model version.
+# PREDICTION_CACHE_SIZE=0 disables the in-memory tier; PREDICTION_CACHE_PERSIST=1
+# also keeps predictions in the prediction_cache table across restarts.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL_SECONDS = int(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "86400"))
+PREDICTION_CACHE_PERSIST = os.getenv("PREDICTION_CACHE_PERSIST", "0") == "1"
+
+# Metrics (metrics.py, GET /metrics in Prometheus text format)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Opt-in sampling profiler: profiles PROFILE_SAMPLE_RATE of requests and writes
+# folded stacks to PROFILE_DIR for those slower than PROFILE_MIN_DURATION_MS.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_MIN_DURATION_MS = int(os.getenv("PROFILE_MIN_DURATION_MS", "500"))
+PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+# Response cache (response_cache.py) for product and review reads.
+# CACHE_BACKEND: memory (per process), redis (shared, needs the redis package) or none.
+# WEB_CONCURRENCY is the number of server worker processes (gunicorn reads the
+# same variable); memory caching is turned off when it is above 1.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Async review ingestion (review_queue.py). REVIEW_QUEUE_MAX_DEPTH bounds the
+# reviews queued or being scored per process; beyond it submissions get 503.
+REVIEW_QUEUE_WORKERS = int(os.getenv("REVIEW_QUEUE_WORKERS", "2"))
+REVIEW_QUEUE_MAX_DEPTH = int(os.getenv("REVIEW_QUEUE_MAX_DEPTH", "1000"))
+REVIEW_QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("REVIEW_QUEUE_RETRY_AFTER_SECONDS", "5"))
+# Reviews submitted, or claimed for scoring, longer than REVIEW_QUEUE_STALE_SECONDS
+# ago are requeued by the recovery pass every process runs each
+# REVIEW_QUEUE_RECOVERY_SECONDS.
+REVIEW_QUEUE_STALE_SECONDS = int(os.getenv("REVIEW_QUEUE_STALE_SECONDS", "300"))
+REVIEW_QUEUE_RECOVERY_SECONDS = int(os.getenv("REVIEW_QUEUE_RECOVERY_SECONDS", "60"))
@@ -0,0 +1,328 @@
+# dedup_index.py
+"""
+Near-duplicate index for review text (MinHash + LSH banding).
+
+Every review gets a MinHash signature over character shingles of its
+clean_review_text. The signature is split into bands and each band is hashed
+into a bucket row in `review_lsh_buckets`. Reviews that share at least one
+bucket with a new text are the only candidates for the exact
+SequenceMatcher comparison, so a lookup touches a handful of rows instead
+of the whole table.
+
+In short texts every edit changes a large share of the 5-character
+shingles, so the bands miss near-duplicates such as "gr8 product" vs
+"gr8 prodct". Texts shorter than SHORT_TEXT_LEN therefore also get buckets in
+bands NUM_BANDS and up, from a second MinHash over their character 3-grams
+(padded at both ends) with two rows per band.
+
+Texts of at most TINY_TEXT_LEN characters are not looked up by bands at all:
+a duplicate score above 0.8 (rule_duplicate_text) needs a text of similar length,
+so they are compared with every distinct indexed text in that length range
+(texts shorter than TINY_INDEX_LEN carry a LENGTH_BAND row keyed by their
+length).
+
+Otherwise a lookup takes up to CANDIDATE_POOL reviews by number of shared
+buckets and keeps the MAX_CANDIDATES whose SequenceMatcher.quick_ratio (an
+upper bound of the duplicate score) is highest, so a popular bucket does not
+crowd out the best match.
+
+Buckets added here need `flask rebuild-dedup-index` for reviews indexed before.
+"""
+import hashlib
+import zlib
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+from sqlalchemy import func, insert, tuple_, update
+
+from extensions import db
+from models import Review, ReviewLSHBucket
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+NUM_BANDS = 32
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+MAX_CANDIDATES = 50
+CANDIDATE_POOL = 10 * MAX_CANDIDATES
+
+SHORT_TEXT_LEN = 64
+SHORT_SHINGLE_SIZE = 3
+SHORT_BANDS = 32
+SHORT_ROWS_PER_BAND = 2
+
+TINY_TEXT_LEN = 12
+# One more than the longest text a tiny one can score above 0.8 against
+TINY_INDEX_LEN = (3 * TINY_TEXT_LEN - 1) // 2 + 1
+LENGTH_BAND = -1
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed: signatures are persisted, so the permutations must never change.
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def _shingles(text: str) -> set:
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _short_shingles(text: str) -> set:
+    padded = f"^{text}$"
+    if len(padded) <= SHORT_SHINGLE_SIZE:
+        return {padded}
+    return {padded[i:i + SHORT_SHINGLE_SIZE] for i in range(len(padded) - SHORT_SHINGLE_SIZE + 1)}
+
+
+def _minhash(shingles: set, n_perm: int):
+    hv = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    phv = ((np.outer(hv, _PERM_A[:n_perm]) + _PERM_B[:n_perm]) % _MERSENNE_PRIME) & _MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+
+def compute_signature(text: str):
+    """MinHash signature (uint32[NUM_PERM]) of a cleaned text, or None if empty."""
+    shingles = _shingles(text or "")
+    if not shingles:
+        return None
+    return _minhash(shingles, NUM_PERM)
+
+
+def _bucket(chunk) -> int:
+    return int.from_bytes(hashlib.blake2b(chunk.tobytes(), digest_size=8).digest(), "big", signed=True)
+
+
+def band_keys(signature) -> list:
+    """(band, bucket) pairs for a signature."""
+    return [
+        (band, _bucket(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(NUM_BANDS)
+    ]
+
+
+def _short_text_keys(text: str) -> list:
+    signature = _minhash(_short_shingles(text), SHORT_BANDS * SHORT_ROWS_PER_BAND)
+    return [
+        (NUM_BANDS + band, _bucket(signature[band * SHORT_ROWS_PER_BAND:(band + 1) * SHORT_ROWS_PER_BAND]))
+        for band in range(SHORT_BANDS)
+    ]
+
+
+def lsh_keys(text: str, signature=None) -> list:
+    """
+    The band (band, bucket) pairs of a cleaned text: the bands of its
+    signature (compute_signature(text), if not given) plus, for short texts,
+    the 3-gram bands.
+    """
+    if not text:
+        return []
+    if signature is None:
+        signature = compute_signature(text)
+    keys = band_keys(signature)
+    if len(text) < SHORT_TEXT_LEN:
+        keys.extend(_short_text_keys(text))
+    return keys
+
+
+def index_keys(text: str, signature=None) -> list:
+    """Every (band, bucket) pair stored for a review: lsh_keys and, for short texts, its length."""
+    keys = lsh_keys(text, signature)
+    if keys and len(text) < TINY_INDEX_LEN:
+        keys.append((LENGTH_BAND, len(text)))
+    return keys
+
+
+def _tiny_lengths(text: str):
+    """
+    For a tiny text, the lengths m a text needs to score above 0.8 against
+    it: SequenceMatcher.ratio <= 2 * min(n, m) / (n + m), so 2n/3 < m < 3n/2.
+    None for other texts.
+    """
+    n = len(text)
+    if not 0 < n <= TINY_TEXT_LEN:
+        return None
+    return range(2 * n // 3 + 1, (3 * n - 1) // 2 + 1)
+
+
+def lookup_keys(text: str, signature=None) -> list:
+    """The keys whose reviews are candidates for `text` (see index_keys)."""
+    lengths = _tiny_lengths(text or "")
+    if lengths is not None:
+        return [(LENGTH_BAND, m) for m in lengths]
+    return lsh_keys(text, signature)
+
+
+def _best_candidates(text, hits: Counter, texts: dict, limit: int) -> list:
+    """(review_id, clean text, hits) of the `limit` entries of the pool closest to `text`."""
+    matcher = SequenceMatcher(None, "", text)  # caches `text` (seq2) across candidates
+    # Tiny texts are ranked by their exact score: the pool is every text of a similar length
+    score = matcher.ratio if _tiny_lengths(text) is not None else matcher.quick_ratio
+    scores = {}
+    scored = []
+    for review_id, count in hits.items():
+        clean = texts.get(review_id)
+        if not clean:
+            continue
+        if clean not in scores:
+            matcher.set_seq1(clean)
+            scores[clean] = score()
+        scored.append((scores[clean], count, review_id, clean))
+    scored.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    return [(review_id, clean, count) for _, count, review_id, clean in scored[:limit]]
+
+
+def _texts(review_ids) -> dict:
+    review_ids = list(review_ids)
+    texts = {}
+    for start in range(0, len(review_ids), 1000):
+        texts.update(
+            db.session.query(Review.id, Review.clean_review_text)
+            .filter(Review.id.in_(review_ids[start:start + 1000]))
+        )
+    return texts
+
+
+def _pool_size(text, limit):
+    return None if _tiny_lengths(text) is not None else max(limit, CANDIDATE_POOL)
+
+
+def find_candidates(text: str, limit: int = MAX_CANDIDATES) -> list:
+    """
+    Reviews sharing at least one lookup key with `text`.
+
+    Returns a list of (review_id, clean_review_text, estimated_similarity),
+    at most `limit`, closest first: of the CANDIDATE_POOL reviews with the
+    most shared buckets or, for tiny texts, of all reviews of a similar
+    length. estimated_similarity is the fraction of the keys that matched.
+    """
+    keys = lookup_keys(text)
+    if not keys:
+        return []
+
+    hits = func.count().label("hits")
+    rows = (
+        db.session.query(ReviewLSHBucket.review_id, hits)
+        .filter(tuple_(ReviewLSHBucket.band, ReviewLSHBucket.bucket).in_(keys))
+        .group_by(ReviewLSHBucket.review_id)
+        .order_by(hits.desc())
+        .limit(_pool_size(text, limit))
+        .all()
+    )
+    if not rows:
+        return []
+
+    hits_by_id = Counter(dict(rows))
+    return [
+        (review_id, clean, count / len(keys))
+        for review_id, clean, count in _best_candidates(text, hits_by_id, _texts(hits_by_id), limit)
+    ]
+
+
+def find_candidate_texts(text: str) -> list:
+    return [clean for _, clean, _ in find_candidates(text)]
+
+
+def find_candidate_texts_batch(texts: list, signatures: list = None, limit: int = MAX_CANDIDATES) -> list:
+    """
+    find_candidate_texts for many cleaned texts (with their precomputed
+    signatures, if given) with one bucket lookup per band and one text fetch
+    in total. Empty texts get [].
+    """
+    if signatures is None:
+        signatures = [compute_signature(text) for text in texts]
+    keys_per_row = [
+        lookup_keys(text, sig) if sig is not None else [] for text, sig in zip(texts, signatures)
+    ]
+    all_keys = {key for keys in keys_per_row for key in keys}
+    if not all_keys:
+        return [[] for _ in texts]
+
+    # One query per band: a row-value IN over thousands of keys is expanded
+    # into nested ORs by PostgreSQL and overflows its stack on large batches.
+    buckets_by_band = defaultdict(list)
+    for band, bucket in all_keys:
+        buckets_by_band[band].append(bucket)
+    reviews_by_key = defaultdict(list)
+    for band, buckets in sorted(buckets_by_band.items()):
+        for bucket, review_id in db.session.query(ReviewLSHBucket.bucket, ReviewLSHBucket.review_id).filter(
+            ReviewLSHBucket.band == band, ReviewLSHBucket.bucket.in_(buckets)
+        ):
+            reviews_by_key[(band, bucket)].append(review_id)
+
+    hits_per_row = []
+    wanted = set()
+    for text, keys in zip(texts, keys_per_row):
+        hits = Counter(review_id for key in keys for review_id in reviews_by_key.get(key, ()))
+        hits = Counter(dict(hits.most_common(_pool_size(text, limit))))
+        hits_per_row.append(hits)
+        wanted.update(hits)
+
+    found = _texts(wanted) if wanted else {}
+    return [
+        [clean for _, clean, _ in _best_candidates(text, hits, found, limit)]
+        for text, hits in zip(texts, hits_per_row)
+    ]
+
+
+def bucket_rows(review_id, keys) -> list:
+    """review_lsh_buckets rows for the index_keys of a review."""
+    return [{"band": band, "bucket": bucket, "review_id": review_id} for band, bucket in keys]
+
+
+def index_review(review: Review):
+    """Store the signature on the review and add its bucket rows (caller commits)."""
+    signature = compute_signature(review.clean_review_text)
+    review.minhash_signature = signature.tobytes() if signature is not None else None
+    db.session.flush()  # bucket rows reference the review row
+
+    ReviewLSHBucket.query.filter_by(review_id=review.id).delete()
+    if signature is not None:
+        db.session.execute(
+            insert(ReviewLSHBucket), bucket_rows(review.id, index_keys(review.clean_review_text, signature))
+        )
+
+
+def remove_review(review_id):
+    """Drop a review's bucket rows (caller commits)."""
+    ReviewLSHBucket.query.filter_by(review_id=review_id).delete()
+
+
+def rebuild_index(batch_size: int = 1000) -> int:
+    """Recompute every signature and bucket from the reviews table, committing per batch."""
+    ReviewLSHBucket.query.delete()
+    db.session.commit()
+
+    indexed = 0
+    last_id = None
+    while True:
+        query = db.session.query(Review.id, Review.clean_review_text).order_by(Review.id)
+        if last_id is not None:
+            query = query.filter(Review.id > last_id)
+        batch = query.limit(batch_size).all()
+        if not batch:
+            break
+
+        signatures = []
+        buckets = []
+        for review_id, clean in batch:
+            signature = compute_signature(clean)
+            signatures.append({
+                "id": review_id,
+                "minhash_signature": signature.tobytes() if signature is not None else None,
+            })
+            if signature is not None:
+                buckets.extend(bucket_rows(review_id, index_keys(clean, signature)))
+
+        db.session.execute(update(Review), signatures)
+        if buckets:
+            db.session.execute(insert(ReviewLSHBucket), buckets)
+        db.session.commit()
+
+        indexed += len(batch)
+        last_id = batch[-1][0]
+
+    return indexed
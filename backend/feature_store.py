@@ -0,0 +1,97 @@
+# feature_store.py
+"""
+TF-IDF feature vectors persisted on each review (reviews.feature_vector).
+
+Vectors are computed once when a review is posted or edited and tagged with
+the vectorizer version that produced them (see ml_layer.encode_feature_rows
+for the format). Analysis hands them to ml_model_predict_batch, which only
+re-tokenizes reviews whose vector is missing or from another vectorizer.
+After a vectorizer change, `flask rebuild-feature-vectors` regenerates the
+stale ones.
+"""
+from sqlalchemy import or_, update
+
+import ml_layer
+from extensions import db
+from models import Review
+
+
+def set_review_features(review):
+    """Compute and attach the vector for one review (no-op without a model)."""
+    blobs, version = ml_layer.compute_feature_vectors([review.review_text])
+    review.feature_vector = blobs[0] if blobs else None
+    review.feature_vectorizer_version = version
+
+
+def stored_features(reviews):
+    """(feature_vector, feature_vectorizer_version) per review or projected row."""
+    return [(r.feature_vector, r.feature_vectorizer_version) for r in reviews]
+
+
+def rebuild_feature_vectors(batch_size: int = 1000, stale_only: bool = True) -> int:
+    """
+    Recompute vectors in id order, committing per batch. With stale_only,
+    reviews that already have a vector from the current vectorizer are skipped.
+    Returns the number of reviews updated.
+    """
+    current = ml_layer.registry.get()
+    if current is None:
+        raise RuntimeError("No model loaded; cannot compute feature vectors")
+
+    rebuilt = 0
+    last_id = None
+    while True:
+        query = db.session.query(Review.id, Review.review_text).order_by(Review.id)
+        if stale_only:
+            query = query.filter(or_(
+                Review.feature_vector.is_(None),
+                Review.feature_vectorizer_version.is_(None),
+                Review.feature_vectorizer_version != current.vectorizer_version,
+            ))
+        if last_id is not None:
+            query = query.filter(Review.id > last_id)
+        batch = query.limit(batch_size).all()
+        if not batch:
+            break
+
+        blobs, version = ml_layer.compute_feature_vectors([text for _, text in batch])
+        db.session.execute(update(Review), [
+            {"id": review_id, "feature_vector": blob, "feature_vectorizer_version": version}
+            for (review_id, _), blob in zip(batch, blobs)
+        ])
+        db.session.commit()
+
+        rebuilt += len(batch)
+        last_id = batch[-1][0]
+
+    return rebuilt
+
+
+def load_feature_matrix(query=None, batch_size: int = 10000):
+    """
+    (review_ids, CSR matrix) of the stored vectors for retraining, read in
+    keyset batches. `query` optionally narrows the reviews (a Review query).
+    Only vectors of the current vectorizer are returned; rebuild first if
+    some are stale.
+    """
+    current = ml_layer.registry.get()
+    if current is None:
+        raise RuntimeError("No model loaded")
+
+    base = query if query is not None else Review.query
+    base = base.with_entities(Review.id, Review.feature_vector).filter(
+        Review.feature_vectorizer_version == current.vectorizer_version
+    ).order_by(Review.id)
+
+    ids, blobs = [], []
+    last_id = None
+    while True:
+        page = (base.filter(Review.id > last_id) if last_id is not None else base).limit(batch_size).all()
+        if not page:
+            break
+        for review_id, blob in page:
+            ids.append(review_id)
+            blobs.append(blob)
+        last_id = page[-1][0]
+
+    return ids, ml_layer.decode_feature_rows(blobs, ml_layer.feature_count(current))
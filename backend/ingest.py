@@ -0,0 +1,300 @@
+# ingest.py
+"""
+Bulk review ingestion (POST /api/reviews/bulk and `flask import-reviews`).
+
+Input is JSON lines or CSV with the add_review fields (user_id, product_id,
+review_text, rating) plus optional user_ip, user_agent, device_fingerprint
+and timestamp (ISO 8601, for backfills). Rows are processed in chunks. For
+each chunk, the context every rule needs (users, products, recent
+user/product activity, device owners, LSH duplicate candidates) is loaded
+with a handful of set-based queries. Rows earlier in the same chunk count
+too, so duplicates, bursts and shared devices inside an import are caught.
+Each chunk is written with multi-row INSERTs and committed once.
+"""
+import csv
+import hashlib
+import json
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import dedup_index
+import ml_layer
+from collusion import graph
+from extensions import db
+from models import Product, Review, ReviewLSHBucket, User
+from product_stats import StatsDelta
+from response_cache import response_cache
+from rule_counters import counters
+from rules import (
+    BURST_MAX_REVIEWS,
+    BURST_WINDOW,
+    RATE_LIMIT_MAX_REVIEWS,
+    RATE_LIMIT_WINDOW,
+    clean_text,
+    compute_rules,
+    get_duplicate_score,
+)
+
+REQUIRED_FIELDS = ("user_id", "product_id", "review_text")
+MAX_REPORTED_ERRORS = 1000
+
+
+# -------------------------------
+# Parsing
+# -------------------------------
+def parse_jsonl(lines):
+    """Yield (row_number, record, error) for each non-blank JSON line."""
+    for row_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "expected a JSON object"
+            continue
+        yield row_number, record, None
+
+
+def parse_csv(lines):
+    """Yield (row_number, record, error) for each CSV data row (header excluded)."""
+    for row_number, record in enumerate(csv.DictReader(lines), 1):
+        yield row_number, {k: v for k, v in record.items() if v not in (None, "")}, None
+
+
+def _prepare(record, default_ip, default_user_agent):
+    """Validate one record and derive its cleaned text and fingerprint."""
+    missing = [f for f in REQUIRED_FIELDS if not record.get(f)]
+    if missing:
+        raise ValueError(f"missing field(s): {', '.join(missing)}")
+
+    rating = record.get("rating", 0)
+    try:
+        rating = float(rating)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid rating: {rating!r}")
+    if not 0 <= rating <= 5:
+        raise ValueError(f"rating out of range: {rating}")
+
+    timestamp = record.get("timestamp")
+    if timestamp is not None:
+        try:
+            timestamp = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            raise ValueError(f"invalid timestamp: {timestamp!r}")
+
+    user_ip = str(record.get("user_ip") or default_ip or "")
+    device_fingerprint = record.get("device_fingerprint") or hashlib.md5(
+        (user_ip + str(record.get("user_agent", default_user_agent))).encode()
+    ).hexdigest()
+
+    return {
+        "user_id": str(record["user_id"]),
+        "product_id": str(record["product_id"]),
+        "review_text": str(record["review_text"]),
+        "clean_review_text": clean_text(str(record["review_text"])),
+        "rating": rating,
+        "user_ip": user_ip,
+        "device_fingerprint": device_fingerprint,
+        "timestamp": timestamp,
+    }
+
+
+# -------------------------------
+# Batch rule context
+# -------------------------------
+def _window_index(key_column, keys, start, end):
+    """key -> sorted review timestamps in [start, end] for the given keys."""
+    index = defaultdict(list)
+    rows = db.session.query(key_column, Review.timestamp).filter(
+        key_column.in_(keys), Review.timestamp >= start, Review.timestamp <= end
+    )
+    for key, timestamp in rows:
+        index[key].append(timestamp)
+    for timestamps in index.values():
+        timestamps.sort()
+    return index
+
+
+def _count_in_window(db_index, batch_index, key, start, end):
+    timestamps = db_index.get(key, [])
+    in_db = bisect_right(timestamps, end) - bisect_left(timestamps, start)
+    in_batch = sum(1 for t in batch_index.get(key, []) if start <= t <= end)
+    return in_db + in_batch
+
+
+def _ingest_chunk(rows, report):
+    """rows: list of (row_number, prepared). Inserts the valid ones and commits."""
+    now = datetime.utcnow()
+    users = {u.id: u for u in User.query.filter(User.id.in_({r["user_id"] for _, r in rows}))}
+    products = {
+        pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_({r["product_id"] for _, r in rows}))
+    }
+
+    valid = []
+    for row_number, row in rows:
+        if row["user_id"] not in users:
+            report["errors"].append({"row": row_number, "error": f"unknown user_id {row['user_id']}"})
+        elif row["product_id"] not in products:
+            report["errors"].append({"row": row_number, "error": f"unknown product_id {row['product_id']}"})
+        else:
+            row["ref_time"] = row["timestamp"] or now
+            valid.append((row_number, row))
+    if not valid:
+        return
+
+    first = min(r["ref_time"] for _, r in valid)
+    last = max(r["ref_time"] for _, r in valid)
+    user_times = _window_index(Review.user_id, {r["user_id"] for _, r in valid}, first - RATE_LIMIT_WINDOW, last)
+    product_times = _window_index(Review.product_id, {r["product_id"] for _, r in valid}, first - BURST_WINDOW, last)
+
+    device_users = defaultdict(set)
+    for device, user_id in db.session.query(Review.device_fingerprint, Review.user_id).filter(
+        Review.device_fingerprint.in_({r["device_fingerprint"] for _, r in valid})
+    ).distinct():
+        if user_id is not None:
+            device_users[device].add(user_id)
+
+    signatures = [dedup_index.compute_signature(r["clean_review_text"]) for _, r in valid]
+    feature_vectors, vectorizer_version = ml_layer.compute_feature_vectors([r["review_text"] for _, r in valid])
+    db_candidates = dedup_index.find_candidate_texts_batch([r["clean_review_text"] for _, r in valid], signatures)
+
+    # State of the rows already accepted in this chunk
+    batch_user_times = defaultdict(list)
+    batch_product_times = defaultdict(list)
+    batch_buckets = defaultdict(list)  # (band, bucket) -> clean texts
+
+    review_rows, bucket_rows = [], []
+    for i, ((row_number, row), signature, candidates) in enumerate(zip(valid, signatures, db_candidates)):
+        ref = row["ref_time"]
+        if signature is not None:
+            keys = dedup_index.index_keys(row["clean_review_text"], signature)
+            lookup = dedup_index.lookup_keys(row["clean_review_text"], signature)
+        else:
+            keys = lookup = []
+        batch_candidates = {text for key in lookup for text in batch_buckets.get(key, ())}
+        duplicate_score = get_duplicate_score(row["clean_review_text"], list(candidates) + list(batch_candidates))
+
+        checks = {
+            "rule_rate_limit": _count_in_window(
+                user_times, batch_user_times, row["user_id"], ref - RATE_LIMIT_WINDOW, ref
+            ) > RATE_LIMIT_MAX_REVIEWS,
+            "rule_burst_activity": _count_in_window(
+                product_times, batch_product_times, row["product_id"], ref - BURST_WINDOW, ref
+            ) > BURST_MAX_REVIEWS,
+            "rule_same_device": bool(device_users[row["device_fingerprint"]] - {row["user_id"]}),
+        }
+        rules, flag_reasons = compute_rules(
+            users[row["user_id"]], row["clean_review_text"], row["rating"], row["user_ip"],
+            row["device_fingerprint"], duplicate_score, row["product_id"], checks=checks,
+        )
+
+        review_id = str(uuid.uuid4())
+        review = {
+            "id": review_id,
+            "product_id": row["product_id"],
+            "user_id": row["user_id"],
+            "review_text": row["review_text"],
+            "rating": row["rating"],
+            "user_ip": row["user_ip"],
+            "device_fingerprint": row["device_fingerprint"],
+            "clean_review_text": row["clean_review_text"],
+            "minhash_signature": signature.tobytes() if signature is not None else None,
+            "feature_vector": feature_vectors[i] if feature_vectors else None,
+            "feature_vectorizer_version": vectorizer_version,
+            "duplicate_review_score": duplicate_score,
+            "flag_reasons": flag_reasons,
+            "is_fake_rule_based": int(any(rules.values())),
+            "label_source": "rule_engine",
+            **{name: int(value) for name, value in rules.items()},
+        }
+        if row["timestamp"] is not None:
+            review["timestamp"] = review["updated_at"] = row["timestamp"]
+        review_rows.append(review)
+        if signature is not None:
+            bucket_rows.extend(dedup_index.bucket_rows(review_id, keys))
+
+        batch_user_times[row["user_id"]].append(ref)
+        batch_product_times[row["product_id"]].append(ref)
+        device_users[row["device_fingerprint"]].add(row["user_id"])
+        for key in keys:
+            batch_buckets[key].append(row["clean_review_text"])
+
+    # executemany: SQLAlchemy batches these into multi-row INSERT ... VALUES
+    # Rows with and without an explicit timestamp go in separate statements.
+    for has_timestamp in (False, True):
+        group = [r for r in review_rows if ("timestamp" in r) == has_timestamp]
+        if group:
+            db.session.execute(insert(Review), group)
+    if bucket_rows:
+        db.session.execute(insert(ReviewLSHBucket), bucket_rows)
+    stats = StatsDelta()
+    for r in review_rows:
+        stats.add(r["product_id"], r["rating"], r["is_fake_rule_based"])
+    stats.apply()
+    db.session.commit()
+    response_cache.invalidate_reviews(r["product_id"] for r in review_rows)
+    response_cache.invalidate("catalog")
+
+    report["inserted"] += len(review_rows)
+    report["flagged"] += sum(r["is_fake_rule_based"] for r in review_rows)
+    report["backfilled"] += sum(1 for r in review_rows if "timestamp" in r)
+    for r in review_rows:
+        if "timestamp" not in r:
+            counters.record_review(r["id"], r["user_id"], r["product_id"], r["device_fingerprint"], now)
+        graph.record_review(r["user_id"], r["device_fingerprint"], r["user_ip"], r["is_fake_rule_based"])
+
+
+def ingest_records(records, chunk_size=1000, default_ip=None, default_user_agent=""):
+    """
+    Ingest (row_number, record, parse_error) tuples as produced by
+    parse_jsonl/parse_csv. Returns a report with inserted/failed counts and
+    per-row errors. A chunk that fails to write is rolled back and all its
+    rows are reported as failed; other chunks are unaffected.
+    """
+    report = {"inserted": 0, "flagged": 0, "failed": 0, "backfilled": 0, "errors": []}
+
+    def flush(chunk):
+        errors_before = len(report["errors"])
+        try:
+            _ingest_chunk(chunk, report)
+        except Exception as e:
+            db.session.rollback()
+            error = f"write failed: {e}"
+            # Rows rejected before the write already have their own error
+            rejected = {entry["row"] for entry in report["errors"][errors_before:]}
+            report["errors"].extend(
+                {"row": row_number, "error": error} for row_number, _ in chunk if row_number not in rejected
+            )
+
+    chunk = []
+    for row_number, record, error in records:
+        if error is None:
+            try:
+                chunk.append((row_number, _prepare(record, default_ip, default_user_agent)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report["errors"].append({"row": row_number, "error": error})
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if report["backfilled"]:
+        # Historical timestamps arrive out of order; let the counters re-warm.
+        counters.reset()
+
+    report["failed"] = len(report["errors"])
+    report["errors"].sort(key=lambda e: e["row"])
+    if len(report["errors"]) > MAX_REPORTED_ERRORS:
+        report["errors"] = report["errors"][:MAX_REPORTED_ERRORS]
+        report["errors_truncated"] = True
+    return report
@@ -0,0 +1,355 @@
+# jobs.py
+"""
+Background execution of the analysis pipeline.
+
+A job runs analysis.iter_analysis_chunks on a local thread pool. After each
+committed chunk it stores the chunk's results, its progress and a checkpoint
+(the last fully scored user) in the same transaction as the review updates.
+A job interrupted by a worker restart is picked up again by
+resume_interrupted_jobs() and continues after its checkpoint.
+
+While a job runs, a side thread refreshes its heartbeat every
+ANALYSIS_JOB_HEARTBEAT_SECONDS, so a long precompute step or a slow chunk
+never makes a live job look orphaned to other processes. Each process also
+runs a recovery thread on the same interval: it refreshes the heartbeat of
+the jobs still waiting in its own pool and resumes jobs whose heartbeat went
+stale, so a job orphaned shortly before a restart is still picked up once
+its heartbeat ages past ANALYSIS_JOB_STALE_SECONDS.
+
+A job is only executed by the process recorded as its worker: _execute claims
+it with a conditional UPDATE and gives up when another process took it over.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_, update
+
+import metrics
+from analysis import iter_analysis_chunks
+from extensions import db
+from models import AnalysisJob, AnalysisJobResult, Review
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_executor = None
+_recovery_lock = threading.Lock()
+_recovery_thread = None
+# Jobs submitted to this process's pool and not finished yet
+_local_jobs = set()
+_local_jobs_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config.get("ANALYSIS_JOB_WORKERS", 2),
+            thread_name_prefix="analysis-job",
+        )
+    return _executor
+
+
+def submit_job(app, chunk_size=None):
+    """Create a queued job and start it on the worker pool. Returns the job."""
+    job = AnalysisJob(
+        id=str(uuid.uuid4()),
+        status="queued",
+        stage="queued",
+        chunk_size=chunk_size or app.config.get("ANALYSIS_JOB_CHUNK_SIZE", 1000),
+        worker=WORKER_ID,
+        heartbeat_at=datetime.utcnow(),
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _submit(app, job.id)
+    return job
+
+
+def _submit(app, job_id):
+    with _local_jobs_lock:
+        _local_jobs.add(job_id)
+    _get_executor(app).submit(_run_job, app, job_id)
+
+
+def request_cancel(job):
+    """Cancel a job: queued jobs stop at once, running ones after the current chunk."""
+    if job.status not in ACTIVE_STATUSES:
+        return False
+    job.cancel_requested = True
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.stage = "cancelled"
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def job_progress(job) -> dict:
+    eta_seconds = None
+    if job.status == "running" and job.started_at and job.total:
+        done_this_run = job.processed - (job.resumed_from or 0)
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        if done_this_run > 0 and elapsed > 0:
+            eta_seconds = round((job.total - job.processed) * elapsed / done_this_run, 1)
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "processed": job.processed,
+        "total": job.total,
+        "fake_count": job.fake_count,
+        "eta_seconds": eta_seconds,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def job_results_page(job_id, cursor=None, limit=100, flagged_only=False):
+    """Keyset page of a job's results. Returns (results, next_cursor)."""
+    query = AnalysisJobResult.query.filter(AnalysisJobResult.job_id == job_id).order_by(AnalysisJobResult.id)
+    if cursor is not None:
+        query = query.filter(AnalysisJobResult.id > cursor)
+    if flagged_only:
+        query = query.filter(AnalysisJobResult.is_fake.is_(True))
+
+    rows = query.limit(limit).all()
+    next_cursor = rows[-1].id if len(rows) == limit else None
+    return [json.loads(r.result) for r in rows], next_cursor
+
+
+def _set(job_id, **values):
+    db.session.execute(update(AnalysisJob).where(AnalysisJob.id == job_id).values(**values))
+
+
+@contextmanager
+def _heartbeat(app, job_id):
+    """Refresh the job's heartbeat_at from a side thread until the block exits."""
+    interval = app.config.get("ANALYSIS_JOB_HEARTBEAT_SECONDS", 30)
+    engine = db.engine
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        update(AnalysisJob)
+                        .where(AnalysisJob.id == job_id, AnalysisJob.worker == WORKER_ID,
+                               AnalysisJob.status.in_(ACTIVE_STATUSES))
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+            except Exception:
+                logger.warning("Heartbeat of analysis job %s failed", job_id, exc_info=True)
+
+    thread = threading.Thread(target=beat, name=f"analysis-job-heartbeat-{job_id[:8]}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _run_job(app, job_id):
+    metrics.analysis_jobs_active.inc()
+    with app.app_context():
+        try:
+            with _heartbeat(app, job_id):
+                _execute(job_id)
+            metrics.analysis_jobs_finished.inc(status="completed")
+        except JobCancelled:
+            db.session.rollback()
+            _set(job_id, status="cancelled", stage="cancelled", finished_at=datetime.utcnow())
+            db.session.commit()
+            metrics.analysis_jobs_finished.inc(status="cancelled")
+        except Exception as e:
+            logger.exception("Analysis job %s failed", job_id)
+            db.session.rollback()
+            _set(job_id, status="failed", stage="failed", error=str(e), finished_at=datetime.utcnow())
+            db.session.commit()
+            metrics.analysis_jobs_finished.inc(status="failed")
+        finally:
+            db.session.remove()
+            metrics.analysis_jobs_active.dec()
+            with _local_jobs_lock:
+                _local_jobs.discard(job_id)
+
+
+def _claim(job_id) -> bool:
+    """Mark the job running on this process, unless another process owns it."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(AnalysisJob)
+        .where(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status.in_(ACTIVE_STATUSES),
+            AnalysisJob.cancel_requested.is_(False),
+            or_(AnalysisJob.worker.is_(None), AnalysisJob.worker == WORKER_ID),
+        )
+        .values(status="running", stage="precompute", worker=WORKER_ID, started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def _execute(job_id):
+    if not _claim(job_id):
+        logger.info("Analysis job %s is finished, cancelled or owned by another worker; not running it", job_id)
+        return
+    job = AnalysisJob.query.get(job_id)
+
+    checkpoint = job.checkpoint_user_id
+    total = db.session.query(func.count(Review.id)).scalar()
+    if checkpoint is not None:
+        # Reviews are scored in user order; everything up to the checkpoint is done.
+        job.processed = db.session.query(func.count(Review.id)).filter(Review.user_id <= checkpoint).scalar()
+    job.total = total
+    job.resumed_from = job.processed
+    db.session.commit()
+
+    def before_commit(results, last_user_id):
+        if results:
+            db.session.execute(insert(AnalysisJobResult), [
+                {
+                    "job_id": job_id,
+                    "review_id": r["review_id"],
+                    "is_fake": r["is_fake_final"],
+                    "result": json.dumps(r),
+                }
+                for r in results
+            ])
+        values = {
+            "stage": "scoring",
+            "processed": AnalysisJob.processed + len(results),
+            "fake_count": AnalysisJob.fake_count + sum(1 for r in results if r["is_fake_final"]),
+            "heartbeat_at": datetime.utcnow(),
+        }
+        if last_user_id is not None:
+            values["checkpoint_user_id"] = last_user_id
+        _set(job_id, **values)
+        metrics.analysis_job_reviews.inc(len(results))
+        metrics.analysis_job_chunks.inc()
+
+    for _ in iter_analysis_chunks(
+        chunk_size=job.chunk_size, after_user_id=checkpoint, before_commit=before_commit
+    ):
+        cancel_requested = db.session.query(AnalysisJob.cancel_requested).filter_by(id=job_id).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+    _set(job_id, status="completed", stage="done", finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+    db.session.commit()
+
+
+def resume_interrupted_jobs(app):
+    """
+    Re-submit jobs left queued/running by a worker that went away (heartbeat
+    older than ANALYSIS_JOB_STALE_SECONDS). The claim is a conditional UPDATE,
+    so with several worker processes only one of them resumes each job.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=app.config.get("ANALYSIS_JOB_STALE_SECONDS", 120))
+    with _local_jobs_lock:
+        local = set(_local_jobs)
+    with app.app_context():
+        try:
+            candidates = [
+                job_id for (job_id,) in db.session.query(AnalysisJob.id).filter(
+                    AnalysisJob.status.in_(ACTIVE_STATUSES),
+                    AnalysisJob.cancel_requested.is_(False),
+                    or_(AnalysisJob.heartbeat_at.is_(None), AnalysisJob.heartbeat_at < stale_before),
+                )
+                if job_id not in local
+            ]
+            resumed = []
+            for job_id in candidates:
+                claimed = db.session.execute(
+                    update(AnalysisJob)
+                    .where(
+                        AnalysisJob.id == job_id,
+                        or_(AnalysisJob.heartbeat_at.is_(None), AnalysisJob.heartbeat_at < stale_before),
+                    )
+                    .values(worker=WORKER_ID, heartbeat_at=datetime.utcnow())
+                ).rowcount
+                db.session.commit()
+                if claimed:
+                    resumed.append(job_id)
+        except Exception:
+            # Tables not migrated yet, DB unreachable at startup, ...
+            logger.warning("Could not check for interrupted analysis jobs", exc_info=True)
+            db.session.rollback()
+            return []
+        finally:
+            db.session.remove()
+
+    for job_id in resumed:
+        logger.info("Resuming analysis job %s", job_id)
+        _submit(app, job_id)
+    return resumed
+
+
+def _beat_waiting_jobs(app):
+    """Refresh the heartbeat of jobs queued in this process's pool but not started yet."""
+    with _local_jobs_lock:
+        local = list(_local_jobs)
+    if not local:
+        return
+    with app.app_context():
+        try:
+            db.session.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id.in_(local), AnalysisJob.worker == WORKER_ID,
+                       AnalysisJob.status == "queued")
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            db.session.commit()
+        except Exception:
+            logger.warning("Heartbeat of queued analysis jobs failed", exc_info=True)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def _recover_periodically(app):
+    interval = app.config.get("ANALYSIS_JOB_HEARTBEAT_SECONDS", 30)
+    while True:
+        _beat_waiting_jobs(app)
+        resume_interrupted_jobs(app)
+        time.sleep(interval)
+
+
+def init_app(app):
+    """
+    Start the recovery thread on the first request this process serves (not
+    at import, so CLI commands such as `flask db upgrade` never start jobs).
+    """
+    @app.before_request
+    def _start_job_recovery():
+        global _recovery_thread
+        if _recovery_thread is not None:
+            return
+        with _recovery_lock:
+            if _recovery_thread is not None:
+                return
+            _recovery_thread = threading.Thread(
+                target=_recover_periodically, args=(app,), name="analysis-job-recovery", daemon=True
+            )
+            _recovery_thread.start()
@@ -1,10 +1,14 @@
-from app import app, db
-from flask_migrate import Migrate
+import sys
 
-migrate = Migrate(app, db)
+from flask.cli import FlaskGroup
 
-# Import models so Flask-Migrate knows them
-from models import User, Product, Review, Detection
+from app import app
+
+# Flask CLI with this app, e.g. `python manage.py analyze --dry-run` or `python manage.py db upgrade`
+cli = FlaskGroup(create_app=lambda: app)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    if len(sys.argv) > 1:
+        cli()
+    else:
+        app.run(debug=True)
@@ -0,0 +1,375 @@
+# metrics.py
+"""
+In-process metrics exposed in Prometheus text format on GET /metrics.
+
+  - http_request_duration_seconds{endpoint,method,status}
+  - http_request_db_queries / http_request_db_seconds{endpoint}: per-request
+    query count and total query time (SQLAlchemy cursor events)
+  - db_query_duration_seconds: every query, in or outside requests
+  - request_stage_seconds{endpoint,stage}: add_review stages
+  - rule_check_seconds{rule}: each Layer 1 rule check
+  - ml_inference_batch_size, ml_inference_seconds, ml_scored_texts_total{source}
+  - analysis_stage_seconds{mode,stage}: analysis pipeline stages
+  - analysis_job_*: job progress and outcomes
+  - prediction and response cache counters (read at scrape time)
+
+Recording is a lock plus a few additions per observation, cheap enough to
+leave on (METRICS_ENABLED=0 turns it off). Values are per process; with
+several workers, scrape each one or aggregate in Prometheus.
+
+The opt-in sampling profiler (PROFILE_REQUESTS=1) samples the stack of a
+fraction of requests and writes folded stacks (flamegraph.pl / speedscope
+format) for those slower than PROFILE_MIN_DURATION_MS.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BATCH_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+# -------------------------------
+# Metric types
+# -------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self._metrics = []
+        self._collectors = []  # callables returning extra exposition lines at scrape time
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                logger.warning("Metrics collector failed", exc_info=True)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# -------------------------------
+# Metrics
+# -------------------------------
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency.", ("endpoint", "method", "status")))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Database queries issued per request.", ("endpoint",), COUNT_BUCKETS))
+http_request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in database queries per request.", ("endpoint",)))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of individual database queries."))
+request_stage_seconds = registry.register(Histogram(
+    "request_stage_seconds", "Time spent in each stage of a request handler.", ("endpoint", "stage")))
+rule_check_seconds = registry.register(Histogram(
+    "rule_check_seconds", "Time spent evaluating each Layer 1 rule.", ("rule",)))
+ml_inference_batch_size = registry.register(Histogram(
+    "ml_inference_batch_size", "Texts per ml_model_predict_batch call.", buckets=BATCH_BUCKETS))
+ml_inference_seconds = registry.register(Histogram(
+    "ml_inference_seconds", "Duration of ml_model_predict_batch calls."))
+ml_scored_texts = registry.register(Counter(
+    "ml_scored_texts_total", "Texts scored, by where the score came from (cache, stored vector, tokenized text).",
+    ("source",)))
+analysis_stage_seconds = registry.register(Histogram(
+    "analysis_stage_seconds", "Time spent in each analysis stage.", ("mode", "stage")))
+analysis_reviews = registry.register(Counter(
+    "analysis_reviews_total", "Reviews given a final verdict by the analysis pipeline.", ("mode",)))
+analysis_jobs_active = registry.register(Gauge(
+    "analysis_jobs_active", "Analysis jobs currently running in this process."))
+analysis_jobs_finished = registry.register(Counter(
+    "analysis_jobs_finished_total", "Analysis jobs that ended, by final status.", ("status",)))
+analysis_job_reviews = registry.register(Counter(
+    "analysis_job_reviews_processed_total", "Reviews scored by background analysis jobs."))
+analysis_job_chunks = registry.register(Counter(
+    "analysis_job_chunks_total", "Chunks committed by background analysis jobs."))
+review_queue_depth = registry.register(Gauge(
+    "review_queue_depth", "Async review submissions waiting for or being scored in this process."))
+review_queue_rejected = registry.register(Counter(
+    "review_queue_rejected_total", "Async review submissions refused because the queue was full."))
+review_queue_wait_seconds = registry.register(Histogram(
+    "review_queue_wait_seconds", "Time async reviews spent queued before scoring started."))
+review_scoring_seconds = registry.register(Histogram(
+    "review_scoring_seconds", "Time to score one async review (rules, ML, behavioral, commit)."))
+review_scoring_finished = registry.register(Counter(
+    "review_scoring_finished_total", "Async reviews that finished scoring, by outcome.", ("status",)))
+
+
+@contextmanager
+def stage(endpoint, name):
+    """Time one stage of a request handler."""
+    with request_stage_seconds.time(endpoint=endpoint, stage=name):
+        yield
+
+
+# -------------------------------
+# Database query instrumentation
+# -------------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_query_duration.observe(elapsed)
+    if has_request_context() and "db_queries" in g:
+        g.db_queries += 1
+        g.db_seconds += elapsed
+
+
+# -------------------------------
+# Sampling profiler
+# -------------------------------
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack every `interval` seconds until stopped."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name="request-profiler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = _Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_profile(app, endpoint, duration, stacks):
+    directory = app.config.get("PROFILE_DIR") or os.path.join(os.getcwd(), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, f"{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{endpoint.replace('/', '_').strip('_') or 'root'}.folded"
+    )
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    logger.warning("Slow request %s took %.0f ms; profile written to %s", endpoint, duration * 1000, path)
+
+
+# -------------------------------
+# Flask integration
+# -------------------------------
+def _endpoint():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _prediction_cache_lines():
+    import ml_layer
+
+    stats = ml_layer.prediction_cache.stats()
+    lines = ["# TYPE prediction_cache_entries gauge", f"prediction_cache_entries {stats['entries']}"]
+    for key in ("hits", "persistent_hits", "misses", "evictions"):
+        name = f"prediction_cache_{key}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {stats[key]}"]
+    return lines
+
+
+def _response_cache_lines():
+    from response_cache import response_cache
+
+    stats = response_cache.stats()
+    lines = []
+    for key in ("hits", "misses", "not_modified"):
+        name = f"response_cache_{key}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {stats[key]}"]
+    return lines
+
+
+def init_app(app):
+    registry.enabled = app.config.get("METRICS_ENABLED", True)
+    registry.add_collector(_prediction_cache_lines)
+    registry.add_collector(_response_cache_lines)
+
+    profile = app.config.get("PROFILE_REQUESTS", False)
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.01)
+    min_duration = app.config.get("PROFILE_MIN_DURATION_MS", 500) / 1000
+    interval = app.config.get("PROFILE_INTERVAL_MS", 5) / 1000
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+        if profile and random.random() < sample_rate:
+            g.profiler = _StackSampler(threading.get_ident(), interval)
+            g.profiler.start()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        if "request_start" not in g:
+            return response
+        duration = time.perf_counter() - g.request_start
+        endpoint = _endpoint()
+        http_request_duration.observe(duration, endpoint=endpoint, method=request.method, status=response.status_code)
+        http_request_db_queries.observe(g.db_queries, endpoint=endpoint)
+        http_request_db_seconds.observe(g.db_seconds, endpoint=endpoint)
+
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            if duration >= min_duration and profiler.stacks:
+                try:
+                    _write_profile(app, endpoint, duration, profiler.stacks)
+                except OSError:
+                    logger.warning("Could not write request profile", exc_info=True)
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        profiler = g.pop("profiler", None)  # left over when the handler raised
+        if profiler is not None:
+            profiler.stop()
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
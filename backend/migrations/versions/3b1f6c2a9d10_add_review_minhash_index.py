@@ -0,0 +1,42 @@
+"""Add MinHash signature column and LSH bucket table for near-duplicate lookup
+
+Revision ID: 3b1f6c2a9d10
+Revises: 9feb5481632c
+Create Date: 2025-10-20 10:12:41.508112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f6c2a9d10'
+down_revision = '9feb5481632c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('minhash_signature', sa.LargeBinary(), nullable=True))
+
+    op.create_table('review_lsh_buckets',
+    sa.Column('band', sa.SmallInteger(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('review_id', sa.String(length=255), nullable=False),
+    sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('band', 'bucket', 'review_id')
+    )
+    with op.batch_alter_table('review_lsh_buckets', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_review_lsh_buckets_review_id'), ['review_id'], unique=False)
+
+    # Existing rows are indexed with `flask --app app rebuild-dedup-index`.
+
+
+def downgrade():
+    with op.batch_alter_table('review_lsh_buckets', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_review_lsh_buckets_review_id'))
+
+    op.drop_table('review_lsh_buckets')
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('minhash_signature')
@@ -0,0 +1,38 @@
+"""Add review updated_at and analysis_state watermark table
+
+Revision ID: 5c7e2d9a41b3
+Revises: 3b1f6c2a9d10
+Create Date: 2025-10-22 18:40:03.221947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c7e2d9a41b3'
+down_revision = '3b1f6c2a9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True))
+
+    # Existing reviews were last changed when they were posted.
+    op.execute('UPDATE reviews SET updated_at = "timestamp"')
+
+    op.create_table('analysis_state',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('last_updated_at', sa.DateTime(), nullable=True),
+    sa.Column('last_review_id', sa.String(length=255), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('analysis_state')
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,57 @@
+"""Add analysis_jobs and analysis_job_results tables
+
+Revision ID: 7a4d0e5f1c28
+Revises: 5c7e2d9a41b3
+Create Date: 2025-10-24 09:15:27.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4d0e5f1c28'
+down_revision = '5c7e2d9a41b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_jobs',
+    sa.Column('id', sa.String(length=255), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('stage', sa.String(length=50), nullable=True),
+    sa.Column('chunk_size', sa.Integer(), nullable=True),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('fake_count', sa.Integer(), nullable=False),
+    sa.Column('checkpoint_user_id', sa.String(length=255), nullable=True),
+    sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('worker', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('resumed_from', sa.Integer(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('analysis_job_results',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('job_id', sa.String(length=255), nullable=False),
+    sa.Column('review_id', sa.String(length=255), nullable=False),
+    sa.Column('is_fake', sa.Boolean(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['analysis_jobs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('analysis_job_results', schema=None) as batch_op:
+        batch_op.create_index('ix_analysis_job_results_job_id_id', ['job_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_job_results', schema=None) as batch_op:
+        batch_op.drop_index('ix_analysis_job_results_job_id_id')
+
+    op.drop_table('analysis_job_results')
+    op.drop_table('analysis_jobs')
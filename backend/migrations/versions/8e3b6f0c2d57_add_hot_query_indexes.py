@@ -0,0 +1,62 @@
+"""Add composite and partial indexes for the hot review/user queries
+
+Revision ID: 8e3b6f0c2d57
+Revises: 7a4d0e5f1c28
+Create Date: 2025-10-26 14:02:51.730915
+
+Build the indexes without locking writes on a live table with:
+
+    flask db upgrade -x concurrently=true
+
+(CREATE INDEX CONCURRENTLY cannot run inside a transaction, so each index is
+then created in its own autocommit block.)
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3b6f0c2d57'
+down_revision = '7a4d0e5f1c28'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # name, table, columns, extra kwargs
+    ('ix_reviews_user_id_timestamp', 'reviews', ['user_id', 'timestamp'], {}),
+    ('ix_reviews_product_id_timestamp', 'reviews', ['product_id', 'timestamp'], {}),
+    ('ix_reviews_product_id_id', 'reviews', ['product_id', 'id'], {}),
+    ('ix_reviews_device_fingerprint_user_id', 'reviews', ['device_fingerprint', 'user_id'], {}),
+    ('ix_reviews_user_ip', 'reviews', ['user_ip'], {}),
+    ('ix_reviews_timestamp', 'reviews', ['timestamp'], {}),
+    ('ix_reviews_updated_at_id', 'reviews', ['updated_at', 'id'], {}),
+    ('ix_reviews_unanalyzed', 'reviews', ['id'], {'postgresql_where': sa.text('is_fake IS NULL')}),
+    ('ix_users_email', 'users', ['email'], {}),
+]
+
+
+def _concurrently():
+    return context.get_x_argument(as_dictionary=True).get('concurrently', '').lower() in ('1', 'true', 'yes')
+
+
+def upgrade():
+    if _concurrently():
+        for name, table, columns, kwargs in INDEXES:
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True,
+                                if_not_exists=True, **kwargs)
+    else:
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, unique=False, **kwargs)
+
+
+def downgrade():
+    if _concurrently():
+        for name, table, _, _ in reversed(INDEXES):
+            with op.get_context().autocommit_block():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,26 @@
+"""Add reviews.ml_model_version
+
+Revision ID: 9c2f4a7b3e61
+Revises: 8e3b6f0c2d57
+Create Date: 2025-10-27 11:02:47.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2f4a7b3e61'
+down_revision = '8e3b6f0c2d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ml_model_version', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('ml_model_version')
@@ -0,0 +1,31 @@
+"""Add prediction_cache table
+
+Revision ID: a1d8e3c5f702
+Revises: 9c2f4a7b3e61
+Create Date: 2025-10-27 16:25:10.904132
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d8e3c5f702'
+down_revision = '9c2f4a7b3e61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('prediction_cache',
+    sa.Column('text_hash', sa.String(length=64), nullable=False),
+    sa.Column('model_version', sa.String(length=64), nullable=False),
+    sa.Column('is_fake_ml', sa.Boolean(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('text_hash', 'model_version')
+    )
+
+
+def downgrade():
+    op.drop_table('prediction_cache')
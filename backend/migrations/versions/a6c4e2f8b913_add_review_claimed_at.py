@@ -0,0 +1,26 @@
+"""Add reviews.claimed_at for the async scoring queue
+
+Revision ID: a6c4e2f8b913
+Revises: f3b8d1c6a294
+Create Date: 2025-10-31 14:05:19.274836
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c4e2f8b913'
+down_revision = 'f3b8d1c6a294'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
@@ -0,0 +1,29 @@
+"""Add reviews.feature_vector and feature_vectorizer_version
+
+Revision ID: b4e9f1a6c833
+Revises: a1d8e3c5f702
+Create Date: 2025-10-28 10:14:36.582019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e9f1a6c833'
+down_revision = 'a1d8e3c5f702'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feature_vector', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('feature_vectorizer_version', sa.String(length=64), nullable=True))
+    # Existing reviews are vectorized by `flask rebuild-feature-vectors`.
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_column('feature_vectorizer_version')
+        batch_op.drop_column('feature_vector')
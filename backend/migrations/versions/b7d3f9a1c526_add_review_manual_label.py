@@ -0,0 +1,32 @@
+"""Add human labels to reviews (manual_label, manual_label_source, labeled_at)
+
+Revision ID: b7d3f9a1c526
+Revises: a6c4e2f8b913
+Create Date: 2025-10-31 16:48:02.913574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3f9a1c526'
+down_revision = 'a6c4e2f8b913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('manual_label', sa.Numeric(), nullable=True))
+        batch_op.add_column(sa.Column('manual_label_source', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('labeled_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_reviews_labeled_at_id', ['labeled_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_labeled_at_id')
+        batch_op.drop_column('labeled_at')
+        batch_op.drop_column('manual_label_source')
+        batch_op.drop_column('manual_label')
@@ -0,0 +1,57 @@
+"""Add product_stats table
+
+Revision ID: c7a2d5e8f914
+Revises: b4e9f1a6c833
+Create Date: 2025-10-29 09:41:52.318406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a2d5e8f914'
+down_revision = 'b4e9f1a6c833'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_stats',
+    sa.Column('product_id', sa.String(length=255), nullable=False),
+    sa.Column('total_reviews', sa.Integer(), nullable=False),
+    sa.Column('flagged_reviews', sa.Integer(), nullable=False),
+    sa.Column('unflagged_rating_sum', sa.Float(), nullable=False),
+    sa.Column('unflagged_rated_reviews', sa.Integer(), nullable=False),
+    sa.Column('fake_ratio', sa.Float(), nullable=True),
+    sa.Column('adjusted_rating', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    # Backfill; same definition as product_stats.rebuild_product_stats
+    op.execute("""
+        INSERT INTO product_stats
+            (product_id, total_reviews, flagged_reviews, unflagged_rating_sum, unflagged_rated_reviews)
+        SELECT p.id,
+               COUNT(r.id),
+               COALESCE(SUM(CASE WHEN COALESCE(r.is_fake, r.is_fake_rule_based, 0) = 1 THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN COALESCE(r.is_fake, r.is_fake_rule_based, 0) != 1
+                                  AND r.rating IS NOT NULL THEN r.rating ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN COALESCE(r.is_fake, r.is_fake_rule_based, 0) != 1
+                                  AND r.rating IS NOT NULL THEN 1 ELSE 0 END), 0)
+        FROM products p
+        LEFT JOIN reviews r ON r.product_id = p.id
+        GROUP BY p.id
+    """)
+    op.execute("""
+        UPDATE product_stats SET
+            fake_ratio = CASE WHEN total_reviews > 0 THEN flagged_reviews * 1.0 / total_reviews END,
+            adjusted_rating = CASE WHEN unflagged_rated_reviews > 0
+                                   THEN unflagged_rating_sum / unflagged_rated_reviews END,
+            updated_at = now()
+    """)
+
+
+def downgrade():
+    op.drop_table('product_stats')
@@ -0,0 +1,28 @@
+"""Add reviews.results_updated_at (last verdict or label write, for incremental exports)
+
+Revision ID: c8e4a2d6f137
+Revises: b7d3f9a1c526
+Create Date: 2025-11-07 10:21:44.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4a2d6f137'
+down_revision = 'b7d3f9a1c526'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('results_updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_reviews_results_updated_at_id', ['results_updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_results_updated_at_id')
+        batch_op.drop_column('results_updated_at')
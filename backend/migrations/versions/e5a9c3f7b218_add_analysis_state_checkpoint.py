@@ -0,0 +1,26 @@
+"""Add analysis_state checkpoint for offline analysis runs
+
+Revision ID: e5a9c3f7b218
+Revises: c7a2d5e8f914
+Create Date: 2025-10-30 15:12:37.508211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3f7b218'
+down_revision = 'c7a2d5e8f914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('analysis_state', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('checkpoint_user_id', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_state', schema=None) as batch_op:
+        batch_op.drop_column('checkpoint_user_id')
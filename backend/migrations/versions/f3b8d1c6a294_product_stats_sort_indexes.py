@@ -0,0 +1,47 @@
+"""Make product_stats sort columns NOT NULL and index them
+
+Revision ID: f3b8d1c6a294
+Revises: e5a9c3f7b218
+Create Date: 2025-10-31 10:27:44.615930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1c6a294'
+down_revision = 'e5a9c3f7b218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every product gets a row, so sorted listings can read product_stats alone
+    op.execute("""
+        INSERT INTO product_stats
+            (product_id, total_reviews, flagged_reviews, unflagged_rating_sum, unflagged_rated_reviews)
+        SELECT p.id, 0, 0, 0, 0
+        FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM product_stats s WHERE s.product_id = p.id)
+    """)
+    # NULL ("no reviews") becomes the sentinel product_stats.NO_VALUE
+    op.execute("UPDATE product_stats SET fake_ratio = -1 WHERE fake_ratio IS NULL")
+    op.execute("UPDATE product_stats SET adjusted_rating = -1 WHERE adjusted_rating IS NULL")
+    with op.batch_alter_table('product_stats', schema=None) as batch_op:
+        batch_op.alter_column('fake_ratio', existing_type=sa.Float(), nullable=False, server_default='-1')
+        batch_op.alter_column('adjusted_rating', existing_type=sa.Float(), nullable=False, server_default='-1')
+        batch_op.create_index('ix_product_stats_fake_ratio', ['fake_ratio', 'product_id'], unique=False)
+        batch_op.create_index('ix_product_stats_adjusted_rating', ['adjusted_rating', 'product_id'], unique=False)
+        batch_op.create_index('ix_product_stats_total_reviews', ['total_reviews', 'product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_stats_total_reviews')
+        batch_op.drop_index('ix_product_stats_adjusted_rating')
+        batch_op.drop_index('ix_product_stats_fake_ratio')
+        batch_op.alter_column('adjusted_rating', existing_type=sa.Float(), nullable=True, server_default=None)
+        batch_op.alter_column('fake_ratio', existing_type=sa.Float(), nullable=True, server_default=None)
+    op.execute("UPDATE product_stats SET fake_ratio = NULL WHERE fake_ratio = -1")
+    op.execute("UPDATE product_stats SET adjusted_rating = NULL WHERE adjusted_rating = -1")
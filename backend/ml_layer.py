@@ -3,6 +3,12 @@ import joblib
 import re
 import os
 import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
 from collections import Counter
 from typing import Dict, Any
 from statistics import mean
@@ -10,37 +16,514 @@ from statistics import mean
 from collections import defaultdict
 from datetime import timedelta
 
-MODEL_PATH = "/ml_model.pkl"
-VECTORIZER_PATH = "/vectorizer.pkl"
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import metrics
+from compiled_model import CompiledModel, load_compiled_model
+from prediction_cache import PredictionCache, text_key
+
+logger = logging.getLogger(__name__)
+
+# Defaults; the app overrides them from ML_MODEL_PATH / ML_VECTORIZER_PATH (see init_app)
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routes")
+MODEL_PATH = os.path.join(MODEL_DIR, "ml_model.pkl")
+VECTORIZER_PATH = os.path.join(MODEL_DIR, "vectorizer.pkl")
+HASHING_MODEL_PATH = os.path.join(MODEL_DIR, "hashing_model.npz")
+COMPILED_MODEL_DIR = os.path.join(MODEL_DIR, "compiled_model")
+
+# Behavioral rule thresholds
+BURST_WINDOW = timedelta(minutes=5)
+SHARED_DEVICE_MAX_USERS = 2   # flagged when more users than this share a device
+SHARED_IP_MAX_USERS = 3       # flagged when more users than this share an IP
+REPEAT_OFFENDER_MIN_FLAGS = 3
+# Score weight per behavioral rule, in flag order. collusion_ring only fires
+# when rings (collusion.py) are passed in. A review is behaviorally fake when
+# any rule fires (so also whenever its score reaches BEHAVIORAL_FAKE_SCORE).
+BEHAVIORAL_WEIGHTS = {
+    "burst_activity": 0.4,
+    "shared_device": 0.5,
+    "shared_ip": 0.5,
+    "repeat_offender": 0.7,
+    "collusion_ring": 0.6,
+}
+BEHAVIORAL_FLAGS = tuple(BEHAVIORAL_WEIGHTS)
+BEHAVIORAL_FAKE_SCORE = 0.7
 
 def clean_text(text: str) -> str:
     return re.sub(r"[^a-zA-Z0-9\s]", "", text.lower()).strip()
 
-def load_ml_model():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(VECTORIZER_PATH):
-        print("⚠️ Model files missing. Please train in Colab first.")
+# -------------------------------
+# Model registry
+# -------------------------------
+LoadedModel = namedtuple("LoadedModel", ["model", "vectorizer", "version", "vectorizer_version", "n_features"])
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_ml_model(model_path=MODEL_PATH, vectorizer_path=VECTORIZER_PATH, mmap_mode="r"):
+    """
+    Load a (model, vectorizer) pair. Returns a LoadedModel, or None when the
+    files are missing.
+
+    With mmap_mode="r" the numpy arrays inside the pickles (LR coefficients,
+    IDF weights) are memory-mapped read-only instead of copied, so processes
+    loading the same files share those pages through the OS page cache.
+    Python objects such as the vocabulary dict are still unpickled per process.
+
+    The version is a digest of both files, so it changes whenever either does.
+    vectorizer_version only covers the vectorizer (stored feature vectors stay
+    valid across model-only updates).
+    """
+    if not os.path.exists(model_path) or not os.path.exists(vectorizer_path):
+        return None
+    vectorizer_digest = _file_digest(vectorizer_path)
+    version = hashlib.sha256((_file_digest(model_path) + vectorizer_digest).encode()).hexdigest()[:12]
+    vectorizer = joblib.load(vectorizer_path, mmap_mode=mmap_mode)
+    return LoadedModel(
+        model=joblib.load(model_path, mmap_mode=mmap_mode),
+        vectorizer=vectorizer,
+        version=version,
+        vectorizer_version=vectorizer_digest[:12],
+        n_features=len(vectorizer.vocabulary_),
+    )
+
+
+# -------------------------------
+# Hashing backend (ML_BACKEND=hashing)
+# -------------------------------
+# A stateless HashingVectorizer (no vocabulary to load) plus an SGD logistic
+# regression that can keep learning with partial_fit (see online_training.py).
+# Both are stored in one .npz: the hashing parameters, the coefficients and
+# the SGD step counter, plus the (updated_at, id) of the last training row.
+HASHING_N_FEATURES = 2 ** 18
+HASHING_NGRAM_RANGE = (1, 2)
+SGD_ALPHA = 1e-5
+
+
+def _hashing_vectorizer(n_features, ngram_range):
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(n_features=n_features, ngram_range=tuple(ngram_range),
+                             alternate_sign=False, norm="l2")
+
+
+def _sgd_classifier(alpha):
+    from sklearn.linear_model import SGDClassifier
+
+    return SGDClassifier(loss="log_loss", alpha=alpha, random_state=0)
+
+
+def new_hashing_model(n_features=HASHING_N_FEATURES, ngram_range=HASHING_NGRAM_RANGE, alpha=SGD_ALPHA):
+    """An untrained (model, vectorizer, params) triple for online_training."""
+    params = {"n_features": n_features, "ngram_range": list(ngram_range), "alpha": alpha}
+    return _sgd_classifier(alpha), _hashing_vectorizer(n_features, ngram_range), params
+
+
+def save_hashing_model(path, model, params, trained_through=None, n_samples=0):
+    """Write the model atomically (temp file + os.replace), so a load never sees half a file."""
+    meta = {**params, "trained_through": trained_through, "n_samples": n_samples}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            coef=model.coef_,
+            intercept=model.intercept_,
+            classes=model.classes_,
+            t=np.float64(model.t_),
+            meta=np.array(json.dumps(meta)),
+        )
+    os.replace(tmp_path, path)
+
+
+def read_hashing_model(path):
+    """(model, vectorizer, meta) from a file written by save_hashing_model."""
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        model = _sgd_classifier(meta["alpha"])
+        model.coef_ = data["coef"]
+        model.intercept_ = data["intercept"]
+        model.classes_ = data["classes"]
+        model.t_ = float(data["t"])
+        model.n_features_in_ = model.coef_.shape[1]
+    return model, _hashing_vectorizer(meta["n_features"], meta["ngram_range"]), meta
+
+
+def load_hashing_model(path=HASHING_MODEL_PATH):
+    """LoadedModel for the hashing backend, or None when the file is missing."""
+    if not os.path.exists(path):
+        return None
+    model, vectorizer, meta = read_hashing_model(path)
+    # Vectors only depend on the hashing parameters, not on what was learned
+    vectorizer_params = json.dumps({"n_features": meta["n_features"], "ngram_range": meta["ngram_range"]})
+    return LoadedModel(
+        model=model,
+        vectorizer=vectorizer,
+        version=_file_digest(path)[:12],
+        vectorizer_version="hash-" + hashlib.sha256(vectorizer_params.encode()).hexdigest()[:7],
+        n_features=meta["n_features"],
+    )
+
+
+# -------------------------------
+# Compiled backend (ML_BACKEND=compiled)
+# -------------------------------
+def load_compiled(model_dir=COMPILED_MODEL_DIR, mmap_mode="r"):
+    """
+    LoadedModel for a `flask compile-model` directory (see compiled_model.py),
+    or None when it is missing. It keeps the versions of the pickled files it
+    was compiled from, since it scores them identically.
+    """
+    compiled = load_compiled_model(model_dir, mmap_mode=mmap_mode)
+    if compiled is None:
+        return None
+    return LoadedModel(
+        model=compiled,
+        vectorizer=compiled,
+        version=compiled.meta["version"],
+        vectorizer_version=compiled.meta["vectorizer_version"],
+        n_features=compiled.n_features,
+    )
+
+
+class ModelRegistry:
+    """
+    Holds the serving model. Loads lazily on first use; reload() swaps in a
+    new version atomically.
+
+    Callers take one snapshot with get() and use it for a whole batch, so a
+    reload in the middle of a batch never mixes one model with another
+    version's vectorizer. Replace model files with os.replace (write a temp
+    file, then rename) so a load never sees a half-written file.
+
+    POST /model/reload reloads the serving process and records the request
+    in analysis_state (MODEL_RELOAD_STATE); every other worker process sees
+    the new request within ML_RELOAD_CHECK_SECONDS and reloads too
+    (follow_reload_requests, run before requests).
+    """
+
+    def __init__(self, model_path=MODEL_PATH, vectorizer_path=VECTORIZER_PATH, mmap_mode="r",
+                 backend="pickle", hashing_model_path=HASHING_MODEL_PATH, compiled_model_dir=COMPILED_MODEL_DIR):
+        self.model_path = model_path
+        self.vectorizer_path = vectorizer_path
+        self.mmap_mode = mmap_mode
+        self.backend = backend
+        self.hashing_model_path = hashing_model_path
+        self.compiled_model_dir = compiled_model_dir
+        self._current = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._seen_reload = _UNSEEN
+        self._next_reload_check = 0.0
+
+    def configure(self, model_path=None, vectorizer_path=None, mmap_mode="r", backend=None,
+                  hashing_model_path=None, compiled_model_dir=None):
+        """Point the registry at new files; they are loaded on next use."""
+        if backend not in (None, "pickle", "hashing", "compiled"):
+            raise ValueError(f"Unknown ML backend: {backend}")
+        with self._lock:
+            self.model_path = model_path or self.model_path
+            self.vectorizer_path = vectorizer_path or self.vectorizer_path
+            self.mmap_mode = mmap_mode
+            self.backend = backend or self.backend
+            self.hashing_model_path = hashing_model_path or self.hashing_model_path
+            self.compiled_model_dir = compiled_model_dir or self.compiled_model_dir
+            self._current = None
+            self._loaded = False
+
+    @property
+    def paths(self):
+        """The files the configured backend loads."""
+        if self.backend == "hashing":
+            return (self.hashing_model_path,)
+        if self.backend == "compiled":
+            return (self.compiled_model_dir,)
+        return (self.model_path, self.vectorizer_path)
+
+    def _load(self):
+        if self.backend == "hashing":
+            return load_hashing_model(self.hashing_model_path)
+        if self.backend == "compiled":
+            return load_compiled(self.compiled_model_dir, self.mmap_mode)
+        return load_ml_model(self.model_path, self.vectorizer_path, self.mmap_mode)
+
+    def get(self):
+        """The current LoadedModel, or None when no model files exist."""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._current = self._load()
+                    self._loaded = True
+                    if self._current is None:
+                        logger.warning("⚠️ Model files missing (%s). Please train in Colab first "
+                                       "(then `flask compile-model` for ML_BACKEND=compiled; "
+                                       "`flask train-online-model` for ML_BACKEND=hashing).",
+                                       ", ".join(self.paths))
+        return self._current
+
+    def reload(self):
+        """
+        Load the configured files again and swap them in. The old model keeps
+        serving until the new one is fully loaded; if loading fails it stays
+        in place and the error propagates. Returns the new LoadedModel.
+        """
+        loaded = self._load()
+        if loaded is None:
+            raise FileNotFoundError(f"Model files missing: {', '.join(self.paths)}")
+        with self._lock:
+            self._current = loaded
+            self._loaded = True
+        prediction_cache.invalidate(keep_version=loaded.version)
+        logger.info("Loaded model version %s", loaded.version)
+        return loaded
+
+    @property
+    def version(self):
+        current = self.get()
+        return current.version if current else None
+
+    def request_reload_everywhere(self):
+        """Record a reload request for the other worker processes (this one already reloaded)."""
+        self._seen_reload = _record_reload_request()
+
+    def follow_reload_requests(self, interval):
+        """
+        Reload when a reload was requested (by any process) since this one last
+        looked; checks the database at most every `interval` seconds.
+        """
+        now = time.monotonic()
+        if now < self._next_reload_check:
+            return
+        self._next_reload_check = now + interval
+        try:
+            requested = _reload_requested_at()
+        except Exception:
+            logger.warning("Could not check for model reload requests", exc_info=True)
+            return
+        if requested == self._seen_reload:
+            return
+        first_check = self._seen_reload is _UNSEEN
+        self._seen_reload = requested
+        # A model loaded after this process started already is the newest one
+        if first_check or not self._loaded:
+            return
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("Reload requested by another worker failed; keeping version %s", self.version)
+
+
+# -------------------------------
+# Reload requests shared by worker processes
+# -------------------------------
+MODEL_RELOAD_STATE = "model:reload"
+_UNSEEN = object()
+
+
+def _reload_requested_at():
+    from extensions import db
+    from models import AnalysisState
+
+    try:
+        return db.session.query(AnalysisState.updated_at).filter_by(name=MODEL_RELOAD_STATE).scalar()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _record_reload_request():
+    from extensions import db
+    from models import AnalysisState
+
+    state = db.session.get(AnalysisState, MODEL_RELOAD_STATE)
+    if state is None:
+        state = AnalysisState(name=MODEL_RELOAD_STATE)
+        db.session.add(state)
+    state.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+    return state.updated_at
+
+
+registry = ModelRegistry()
+prediction_cache = PredictionCache()
+
+
+def init_app(app):
+    registry.configure(
+        model_path=app.config.get("ML_MODEL_PATH"),
+        vectorizer_path=app.config.get("ML_VECTORIZER_PATH"),
+        mmap_mode=app.config.get("ML_MODEL_MMAP_MODE") or None,
+        backend=app.config.get("ML_BACKEND", "pickle"),
+        hashing_model_path=app.config.get("ML_HASHING_MODEL_PATH"),
+        compiled_model_dir=app.config.get("ML_COMPILED_MODEL_DIR"),
+    )
+    prediction_cache.configure(
+        max_entries=app.config.get("PREDICTION_CACHE_SIZE"),
+        ttl_seconds=app.config.get("PREDICTION_CACHE_TTL_SECONDS"),
+        persistent=app.config.get("PREDICTION_CACHE_PERSIST"),
+    )
+    reload_check_seconds = app.config.get("ML_RELOAD_CHECK_SECONDS", 10)
+
+    @app.before_request
+    def _follow_model_reloads():
+        registry.follow_reload_requests(reload_check_seconds)
+
+
+# -------------------------------
+# Persisted feature vectors
+# -------------------------------
+# One review's TF-IDF row is stored as its nnz column indices (little-endian
+# uint32) followed by its nnz values (little-endian float64), in CSR order.
+# Keeping float64 and the original index order makes a decoded row score
+# exactly like a freshly transformed one.
+def encode_feature_rows(X) -> list:
+    """One blob per row of a CSR matrix."""
+    X = X.tocsr()
+    return [
+        X.indices[X.indptr[i]:X.indptr[i + 1]].astype("<u4").tobytes()
+        + X.data[X.indptr[i]:X.indptr[i + 1]].astype("<f8").tobytes()
+        for i in range(X.shape[0])
+    ]
+
+
+def decode_feature_rows(blobs, n_features):
+    """Stack encoded rows back into one CSR matrix."""
+    indices, data, indptr = [], [], [0]
+    for blob in blobs:
+        nnz = len(blob) // 12
+        indices.append(np.frombuffer(blob, dtype="<u4", count=nnz))
+        data.append(np.frombuffer(blob, dtype="<f8", count=nnz, offset=4 * nnz))
+        indptr.append(indptr[-1] + nnz)
+    return csr_matrix(
+        (
+            np.concatenate(data) if data else np.empty(0),
+            np.concatenate(indices) if indices else np.empty(0, dtype="<u4"),
+            np.asarray(indptr),
+        ),
+        shape=(len(blobs), n_features),
+    )
+
+
+def compute_feature_vectors(texts: list):
+    """(blobs, vectorizer_version) for raw review texts, or (None, None) without a model."""
+    current = registry.get()
+    if current is None:
         return None, None
-    model = joblib.load(MODEL_PATH)
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    return model, vectorizer
+    X = current.vectorizer.transform([clean_text(t) for t in texts])
+    return encode_feature_rows(X), current.vectorizer_version
+
+
+def feature_count(current):
+    return current.n_features
+
+
+# -------------------------------
+# Layer 2: ML prediction
+# -------------------------------
+def _no_model_result():
+    return {"is_fake_ml": False, "confidence": 0.0, "model_version": None}
 
-ml_model, vectorizer = load_ml_model()
 
 def ml_model_predict(review_text: str) -> dict:
-    if ml_model is None or vectorizer is None:
-        return {"is_fake_ml": False, "confidence": 0.0}
+    return ml_model_predict_batch([review_text])[0]
+
+
+def batch_probabilities(current, batch):
+    """Fake probabilities for one ("vectors", blobs) or ("texts", cleaned texts) batch."""
+    kind, payload = batch
+    if kind == "texts" and len(payload) == 1 and isinstance(current.model, CompiledModel):
+        return np.array([current.model.probability(payload[0])])  # single review: skip the matrix
+    if kind == "vectors":
+        X = decode_feature_rows(payload, feature_count(current))
+    else:
+        X = current.vectorizer.transform(payload)
+    return current.model.predict_proba(X)[:, 1]
+
+
+def ml_model_predict_batch(texts: list, batch_size: int = 1000, features: list = None, map_batches=None,
+                           cleaned_texts: list = None) -> list:
+    """
+    Vectorized version of ml_model_predict.
+
+    Cleans every text (or takes its stored clean_review_text from
+    `cleaned_texts`, where not None) and looks its hash up in the prediction cache. The
+    remaining distinct texts are scored `batch_size` at a time as one sparse
+    matrix, then cached. `features` optionally gives each text's stored
+    (feature_vector, feature_vectorizer_version); vectors of the current
+    vectorizer are decoded instead of re-tokenizing the text.
+
+    map_batches(current, batches) optionally replaces the serial
+    [batch_probabilities(current, b) for b in batches] (parallel_scoring
+    hands the batches to a process pool); cache lookups stay in the caller.
+
+    Returns one {"is_fake_ml", "confidence", "model_version"} dict per input
+    text, in order, with the same values ml_model_predict gives for each
+    text. The whole call is scored by a single model version.
+    """
+    current = registry.get()
+    if current is None:
+        return [_no_model_result() for _ in texts]
+
+    started = time.perf_counter()
+    if cleaned_texts is None:
+        cleaned = [clean_text(t) for t in texts]
+    else:
+        cleaned = [c if c is not None else clean_text(t) for t, c in zip(texts, cleaned_texts)]
+    keys = [text_key(t) for t in cleaned]
+    scores = prediction_cache.get_many(list(dict.fromkeys(keys)), current.version) if prediction_cache.enabled else {}
 
-    text_clean = clean_text(review_text)
-    X = vectorizer.transform([text_clean])
-    prob = ml_model.predict_proba(X)[0][1]
+    # Score each distinct uncached text once, from its stored vector if it has one
+    pending, stored = {}, {}
+    for i, (key, text) in enumerate(zip(keys, cleaned)):
+        if key in scores:
+            continue
+        pending.setdefault(key, text)
+        if features is not None and key not in stored:
+            blob, vectorizer_version = features[i]
+            if blob is not None and vectorizer_version == current.vectorizer_version:
+                stored[key] = blob
 
-    return {
-        "is_fake_ml": prob > 0.5,
-        "confidence": float(prob)
-    }
+    from_vectors = [k for k in pending if k in stored]
+    from_text = [k for k in pending if k not in stored]
+    batch_keys, batches = [], []
+    for start in range(0, len(from_vectors), batch_size):
+        chunk = from_vectors[start:start + batch_size]
+        batch_keys.append(chunk)
+        batches.append(("vectors", [stored[k] for k in chunk]))
+    for start in range(0, len(from_text), batch_size):
+        chunk = from_text[start:start + batch_size]
+        batch_keys.append(chunk)
+        batches.append(("texts", [pending[k] for k in chunk]))
+    if map_batches is None:
+        batch_probs = [batch_probabilities(current, batch) for batch in batches]
+    else:
+        batch_probs = map_batches(current, batches)
+    new_scores = {}
+    for chunk, probs in zip(batch_keys, batch_probs):
+        new_scores.update((k, (bool(prob > 0.5), float(prob))) for k, prob in zip(chunk, probs))
+    if new_scores and prediction_cache.enabled:
+        prediction_cache.put_many(new_scores, current.version)
+    scores.update(new_scores)
 
+    metrics.ml_inference_batch_size.observe(len(texts))
+    metrics.ml_inference_seconds.observe(time.perf_counter() - started)
+    metrics.ml_scored_texts.inc(len(texts) - len(pending), source="cache")  # cached or repeated in the batch
+    metrics.ml_scored_texts.inc(len(from_vectors), source="stored_vector")
+    metrics.ml_scored_texts.inc(len(from_text), source="tokenized")
 
-def behavioral_analysis(all_reviews: list) -> dict:
+    return [
+        {"is_fake_ml": scores[k][0], "confidence": scores[k][1], "model_version": current.version}
+        for k in keys
+    ]
+
+
+def behavioral_analysis(all_reviews: list, rings: dict = None) -> dict:
     """
     Analyze reviews across all users/devices for suspicious behavior.
 
@@ -56,6 +539,9 @@ def behavioral_analysis(all_reviews: list) -> dict:
         "clean_review_text": str
       }
 
+    rings: optional {user_id: ring info} from collusion.graph.ring_members();
+    members' reviews get the "collusion_ring" flag and a "ring" entry.
+
     Output: dict { review_id: { "is_fake_behavioral": bool, "flags": [...], "suspicious_score": float } }
     """
     results = {}
@@ -76,43 +562,214 @@ def behavioral_analysis(all_reviews: list) -> dict:
         user_reviews_sorted = sorted(user_reviews, key=lambda x: x["timestamp"])
         for i in range(1, len(user_reviews_sorted)):
             delta = user_reviews_sorted[i]["timestamp"] - user_reviews_sorted[i - 1]["timestamp"]
-            if delta < timedelta(minutes=5):  # reviews within 5 minutes
+            if delta < BURST_WINDOW:  # reviews within 5 minutes
                 rid = user_reviews_sorted[i]["id"]
                 flags_by_review[rid].append("burst_activity")
-                suspicious_score_by_review[rid] += 0.4
+                suspicious_score_by_review[rid] += BEHAVIORAL_WEIGHTS["burst_activity"]
 
     for device, reviews in reviews_by_device.items():
-        if len({r["user_id"] for r in reviews}) > 2:  # more than 2 users share device
+        if len({r["user_id"] for r in reviews}) > SHARED_DEVICE_MAX_USERS:  # more than 2 users share device
             for r in reviews:
                 flags_by_review[r["id"]].append("shared_device")
-                suspicious_score_by_review[r["id"]] += 0.5
+                suspicious_score_by_review[r["id"]] += BEHAVIORAL_WEIGHTS["shared_device"]
 
     # --- Rule 3: Same IP used across multiple users ---
     for ip, reviews in reviews_by_ip.items():
-        if len({r["user_id"] for r in reviews}) > 3:  # more than 3 users share IP
+        if len({r["user_id"] for r in reviews}) > SHARED_IP_MAX_USERS:  # more than 3 users share IP
             for r in reviews:
                 flags_by_review[r["id"]].append("shared_ip")
-                suspicious_score_by_review[r["id"]] += 0.5
+                suspicious_score_by_review[r["id"]] += BEHAVIORAL_WEIGHTS["shared_ip"]
 
     # --- Rule 4: Users with many flagged reviews ---
     user_fake_counts = {uid: sum(1 for r in reviews if r.get("is_fake_rule_based") or r.get("is_fake_ml"))
                         for uid, reviews in reviews_by_user.items()}
     for uid, count in user_fake_counts.items():
-        if count >= 3:  # if a user already has 3+ fake signals
+        if count >= REPEAT_OFFENDER_MIN_FLAGS:  # if a user already has 3+ fake signals
             for r in reviews_by_user[uid]:
                 flags_by_review[r["id"]].append("repeat_offender")
-                suspicious_score_by_review[r["id"]] += 0.7
+                suspicious_score_by_review[r["id"]] += BEHAVIORAL_WEIGHTS["repeat_offender"]
+
+    # --- Rule 5: Users in a collusion ring ---
+    if rings is not None:
+        for r in all_reviews:
+            if r["user_id"] in rings:
+                flags_by_review[r["id"]].append("collusion_ring")
+                suspicious_score_by_review[r["id"]] += BEHAVIORAL_WEIGHTS["collusion_ring"]
 
     # --- Combine results ---
     for r in all_reviews:
         rid = r["id"]
         score = suspicious_score_by_review[rid]
-        is_fake_behavioral = score >= 0.7 or len(flags_by_review[rid]) > 0
+        is_fake_behavioral = score >= BEHAVIORAL_FAKE_SCORE or len(flags_by_review[rid]) > 0
 
         results[rid] = {
             "is_fake_behavioral": is_fake_behavioral,
             "flags": flags_by_review[rid],
             "suspicious_score": round(score, 2)
         }
+        if rings is not None:
+            results[rid]["ring"] = rings.get(r["user_id"])
+
+    return results
+
+
+def user_behavioral_analysis(user_reviews: list, shared_devices: set, shared_ips: set, rings: dict = None) -> dict:
+    """
+    behavioral_analysis for the reviews of ONE user, given the devices and IPs
+    already known to be shared (e.g. from a GROUP BY ... HAVING query).
+
+    Lets callers stream reviews ordered by user and evaluate each user's block
+    on its own. Uses the columnar rule code, so flags, their order and scores
+    match behavioral_analysis.
+    """
+    if not user_reviews:
+        return {}
+    ids, user_ids, timestamps, devices, ips, fake_signals = zip(*behavioral_rows_from_dicts(user_reviews))
+    user_codes, n_users = _factorize(user_ids)
+    masks = user_rule_masks(user_codes, n_users, timestamps, fake_signals) | shared_rule_masks(
+        devices, ips, shared_devices, shared_ips
+    )
+    return mask_results(ids, user_ids, masks, rings)
+
+
+# -------------------------------
+# Columnar behavioral analysis
+# -------------------------------
+# Rule bits follow BEHAVIORAL_FLAGS: burst 0, shared_device 1, shared_ip 2,
+# repeat_offender 3, collusion_ring 4.
+def _mask_result(mask):
+    """(flags, is_fake_behavioral, suspicious_score) for a bit mask of the rules."""
+    flags = tuple(name for bit, name in enumerate(BEHAVIORAL_FLAGS) if mask & (1 << bit))
+    score = 0.0
+    for name in flags:  # same addition order as behavioral_analysis
+        score += BEHAVIORAL_WEIGHTS[name]
+    return flags, score >= BEHAVIORAL_FAKE_SCORE or len(flags) > 0, round(score, 2)
+
+
+# A review's result depends only on which rules fired, so all 32 are precomputed
+_MASK_RESULTS = [_mask_result(mask) for mask in range(1 << len(BEHAVIORAL_FLAGS))]
+
 
+def _factorize(values):
+    """Integer codes for arbitrary hashable values (None included), plus the number of distinct values."""
+    index = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+    return codes, len(index)
+
+
+def _shared_by_more_than(group_codes, n_groups, user_codes, n_users, max_users):
+    """Per row: is the row's group (device/IP) used by more than max_users distinct users?"""
+    pairs = np.unique(group_codes * n_users + user_codes)
+    users_per_group = np.bincount(pairs // n_users, minlength=n_groups)
+    return users_per_group[group_codes] > max_users
+
+
+def user_rule_masks(user_codes, n_users, timestamps, fake_signals):
+    """
+    Per row: bits of the rules decided by the row's own user alone, burst
+    (bit 0) and repeat_offender (bit 3). Needs all of each user's rows.
+    """
+    n = len(user_codes)
+    ts = np.asarray(timestamps, dtype="datetime64[us]").astype(np.int64)
+    fake = np.asarray(fake_signals, dtype=bool)
+
+    # --- Rule 1: burst (previous review by the same user < BURST_WINDOW ago) ---
+    # Ties keep input order, like the stable per-user sort in behavioral_analysis.
+    order = np.lexsort((np.arange(n), ts, user_codes))
+    same_user = user_codes[order][1:] == user_codes[order][:-1]
+    close = np.diff(ts[order]) < BURST_WINDOW // timedelta(microseconds=1)
+    burst = np.zeros(n, dtype=bool)
+    burst[order[1:][same_user & close]] = True
+
+    # --- Rule 4: users with many flagged reviews ---
+    fake_per_user = np.bincount(user_codes, weights=fake, minlength=n_users)
+    repeat_offender = fake_per_user[user_codes] >= REPEAT_OFFENDER_MIN_FLAGS
+
+    return burst.astype(np.int64) | (repeat_offender.astype(np.int64) << 3)
+
+
+def shared_rule_masks(devices, ips, shared_devices: set, shared_ips: set):
+    """Per row: bits of the shared_device (bit 1) and shared_ip (bit 2) rules, given the shared sets."""
+    n = len(devices)
+    return (
+        (np.fromiter((d in shared_devices for d in devices), dtype=np.int64, count=n) << 1)
+        | (np.fromiter((ip in shared_ips for ip in ips), dtype=np.int64, count=n) << 2)
+    )
+
+
+def mask_results(ids, user_ids, masks, rings: dict = None) -> dict:
+    """behavioral_analysis output from per-row rule bit masks (bits 0-3); rings adds bit 4."""
+    if rings is not None:
+        ring_user = np.fromiter((u in rings for u in user_ids), dtype=bool, count=len(ids))
+        masks = masks | (ring_user.astype(np.int64) << 4)
+
+    results = {}
+    for rid, mask in zip(ids, masks.tolist()):
+        flags, is_fake_behavioral, score = _MASK_RESULTS[mask]
+        results[rid] = {
+            "is_fake_behavioral": is_fake_behavioral,
+            "flags": list(flags),
+            "suspicious_score": score
+        }
+    if rings is not None:
+        for rid, user_id in zip(ids, user_ids):
+            results[rid]["ring"] = rings.get(user_id)
     return results
+
+
+def behavioral_analysis_columnar(ids, user_ids, timestamps, device_fingerprints, user_ips, fake_signals,
+                                 rings: dict = None) -> dict:
+    """
+    Column-oriented behavioral_analysis.
+
+    Takes one sequence/array per field (same length, same row order) instead
+    of a list of dicts; `fake_signals` is the per-review
+    `is_fake_rule_based or is_fake_ml` truth value. Grouping is done with
+    integer codes, sorts and bincounts, so the per-review Python work is only
+    building the output. Output is identical to behavioral_analysis (rings included).
+    """
+    n = len(ids)
+    if n == 0:
+        return {}
+
+    user_codes, n_users = _factorize(user_ids)
+    device_codes, n_devices = _factorize(device_fingerprints)
+    ip_codes, n_ips = _factorize(user_ips)
+
+    # --- Rules 2/3: device / IP shared by too many users ---
+    shared_device = _shared_by_more_than(device_codes, n_devices, user_codes, n_users, SHARED_DEVICE_MAX_USERS)
+    shared_ip = _shared_by_more_than(ip_codes, n_ips, user_codes, n_users, SHARED_IP_MAX_USERS)
+
+    masks = (
+        user_rule_masks(user_codes, n_users, timestamps, fake_signals)
+        | (shared_device.astype(np.int64) << 1)
+        | (shared_ip.astype(np.int64) << 2)
+    )
+    # --- Rule 5: users in a collusion ring (in mask_results) ---
+    return mask_results(ids, user_ids, masks, rings)
+
+
+def behavioral_analysis_rows(rows, rings: dict = None) -> dict:
+    """
+    behavioral_analysis_columnar over a projected tuple stream of
+    (id, user_id, timestamp, device_fingerprint, user_ip, fake_signal).
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    return behavioral_analysis_columnar(*zip(*rows), rings=rings)
+
+
+def behavioral_rows_from_dicts(all_reviews: list) -> list:
+    """The dict input of behavioral_analysis as projected tuples (for parity checks)."""
+    return [
+        (
+            r["id"],
+            r["user_id"],
+            r["timestamp"],
+            r["device_fingerprint"],
+            r["user_ip"],
+            bool(r.get("is_fake_rule_based") or r.get("is_fake_ml")),
+        )
+        for r in all_reviews
+    ]
@@ -4,7 +4,7 @@ class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.String(255), primary_key=True)
     user_name = db.Column(db.String(255))
-    email = db.Column(db.String(255))
+    email = db.Column(db.String(255), index=True)
     password = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
@@ -29,11 +29,15 @@ class Review(db.Model):
     rating = db.Column(db.Numeric)
     review_text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now())  # last content change (not analysis writes)
 
     # --- Metadata fields ---
     user_ip = db.Column(db.String(100))
     device_fingerprint = db.Column(db.String(100))
     clean_review_text = db.Column(db.Text)  # preprocessed version
+    minhash_signature = db.Column(db.LargeBinary)  # near-duplicate index (see dedup_index.py)
+    feature_vector = db.Column(db.LargeBinary)  # TF-IDF row (see feature_store.py)
+    feature_vectorizer_version = db.Column(db.String(64))
 
     duplicate_review_score = db.Column(db.Float)
     suspicion_score_weighted = db.Column(db.Float)
@@ -51,6 +55,7 @@ class Review(db.Model):
     # --- Layer 2 (ML results) ---
     is_fake_ml = db.Column(db.Numeric)       # 0 or 1
     ml_confidence = db.Column(db.Float)      # confidence score
+    ml_model_version = db.Column(db.String(64))  # ml_layer.registry version that scored it
 
     # --- Layer 3 (Behavioral results) ---
     is_fake_behavioral = db.Column(db.Numeric)   # 0 or 1
@@ -61,3 +66,100 @@ class Review(db.Model):
     is_fake = db.Column(db.Numeric)          # final decision
     is_fake_rule_based = db.Column(db.Numeric)
     label_source = db.Column(db.String(100))
+    results_updated_at = db.Column(db.DateTime)  # last write of the verdict columns or the human label
+    claimed_at = db.Column(db.DateTime)      # when an async scoring worker claimed it (review_queue.py)
+
+    # --- Human label (PUT /api/reviews/<id>/label); never written by the pipeline ---
+    manual_label = db.Column(db.Numeric)                 # 0 or 1; training target of online_training.py
+    manual_label_source = db.Column(db.String(100))      # who labelled it, e.g. "manual"
+    labeled_at = db.Column(db.DateTime)
+
+    # Indexes for the hot queries (verified by check_query_plans.py)
+    __table_args__ = (
+        db.Index("ix_reviews_user_id_timestamp", "user_id", "timestamp"),
+        db.Index("ix_reviews_product_id_timestamp", "product_id", "timestamp"),
+        db.Index("ix_reviews_product_id_id", "product_id", "id"),
+        db.Index("ix_reviews_results_updated_at_id", "results_updated_at", "id"),
+        db.Index("ix_reviews_device_fingerprint_user_id", "device_fingerprint", "user_id"),
+        db.Index("ix_reviews_user_ip", "user_ip"),
+        db.Index("ix_reviews_timestamp", "timestamp"),
+        db.Index("ix_reviews_updated_at_id", "updated_at", "id"),
+        db.Index("ix_reviews_labeled_at_id", "labeled_at", "id"),
+        db.Index("ix_reviews_unanalyzed", "id", postgresql_where=db.text("is_fake IS NULL")),
+    )
+
+class ReviewLSHBucket(db.Model):
+    """One LSH band bucket of a review's MinHash signature."""
+    __tablename__ = "review_lsh_buckets"
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    review_id = db.Column(db.String(255), db.ForeignKey("reviews.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class AnalysisState(db.Model):
+    """Persisted watermark of the last analyzed review, one row per pipeline."""
+    __tablename__ = "analysis_state"
+    name = db.Column(db.String(100), primary_key=True)
+    last_updated_at = db.Column(db.DateTime)
+    last_review_id = db.Column(db.String(255))
+    checkpoint_user_id = db.Column(db.String(255))  # last user committed by an interrupted `flask analyze`
+    updated_at = db.Column(db.DateTime, server_default=db.func.now())
+
+class AnalysisJob(db.Model):
+    """Background analysis run (see jobs.py)."""
+    __tablename__ = "analysis_jobs"
+    id = db.Column(db.String(255), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued/running/completed/failed/cancelled
+    stage = db.Column(db.String(50))
+    chunk_size = db.Column(db.Integer)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    fake_count = db.Column(db.Integer, nullable=False, default=0)
+    checkpoint_user_id = db.Column(db.String(255))  # last user whose results are committed
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    started_at = db.Column(db.DateTime)       # start of the current run (reset on resume)
+    resumed_from = db.Column(db.Integer)      # `processed` when the current run started
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class AnalysisJobResult(db.Model):
+    """One review verdict produced by an analysis job, in commit order."""
+    __tablename__ = "analysis_job_results"
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(255), db.ForeignKey("analysis_jobs.id", ondelete="CASCADE"), nullable=False)
+    review_id = db.Column(db.String(255), nullable=False)
+    is_fake = db.Column(db.Boolean)
+    result = db.Column(db.Text)  # JSON, same shape as an /analyze_all all_reviews entry
+
+    __table_args__ = (db.Index("ix_analysis_job_results_job_id_id", "job_id", "id"),)
+
+class PredictionCacheEntry(db.Model):
+    """Persistent tier of the ML prediction cache (see prediction_cache.py)."""
+    __tablename__ = "prediction_cache"
+    text_hash = db.Column(db.String(64), primary_key=True)  # sha256 of the cleaned review text
+    model_version = db.Column(db.String(64), primary_key=True)
+    is_fake_ml = db.Column(db.Boolean, nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+class ProductStats(db.Model):
+    """Per-product review aggregates, kept current by product_stats.py."""
+    __tablename__ = "product_stats"
+    product_id = db.Column(db.String(255), db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    total_reviews = db.Column(db.Integer, nullable=False, default=0)
+    flagged_reviews = db.Column(db.Integer, nullable=False, default=0)   # final verdict, else rule-based flag
+    unflagged_rating_sum = db.Column(db.Float, nullable=False, default=0)
+    unflagged_rated_reviews = db.Column(db.Integer, nullable=False, default=0)
+    # flagged / total and mean rating of unflagged reviews; -1 (product_stats.NO_VALUE) without reviews
+    fake_ratio = db.Column(db.Float, nullable=False, default=-1.0, server_default="-1")
+    adjusted_rating = db.Column(db.Float, nullable=False, default=-1.0, server_default="-1")
+    updated_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    # Sorted product listings (routes/products.py) walk these in order
+    __table_args__ = (
+        db.Index("ix_product_stats_fake_ratio", "fake_ratio", "product_id"),
+        db.Index("ix_product_stats_adjusted_rating", "adjusted_rating", "product_id"),
+        db.Index("ix_product_stats_total_reviews", "total_reviews", "product_id"),
+    )
@@ -0,0 +1,118 @@
+# online_training.py
+"""
+In-repo training of the hashing backend (ML_BACKEND=hashing, see ml_layer.py)
+via `flask train-online-model`.
+
+The targets are human labels (manual_label, set with PUT
+/api/reviews/<id>/label), never the pipeline's own is_fake verdicts. Reviews
+whose manual_label_source is in ML_TRAINING_LABEL_SOURCES are streamed from
+the database in keyset batches on (labeled_at, id) and fed to
+SGDClassifier.partial_fit, so memory stays at one batch whatever the table
+size. The HashingVectorizer has no vocabulary, so nothing needs a first pass.
+
+The model file records the newest (labeled_at, id) it was trained on. A later
+run continues from the saved model and only learns from reviews labelled
+after that point (relabelling moves labeled_at forward); --full starts a fresh
+model over all labelled rows.
+The file is replaced atomically at the end, so serving processes pick the new
+model up on POST /api/reviews/model/reload (or restart) and never read a
+partial file.
+"""
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, or_
+
+import ml_layer
+from extensions import db
+from models import Review
+
+logger = logging.getLogger(__name__)
+
+TRAINING_BATCH_SIZE = 5000
+CLASSES = np.array([0, 1])
+
+
+def _labelled_query(label_sources, after=None):
+    query = db.session.query(
+        Review.id, Review.labeled_at, Review.review_text, Review.clean_review_text, Review.manual_label
+    ).filter(
+        Review.manual_label_source.in_(label_sources),
+        Review.manual_label.isnot(None),
+        Review.labeled_at.isnot(None),
+    )
+    if after is not None:
+        after_labeled_at, after_id = after
+        query = query.filter(or_(
+            Review.labeled_at > after_labeled_at,
+            and_(Review.labeled_at == after_labeled_at, Review.id > after_id),
+        ))
+    return query.order_by(Review.labeled_at, Review.id)
+
+
+def iter_labelled_batches(label_sources, after=None, batch_size=TRAINING_BATCH_SIZE):
+    """Lists of at most batch_size labelled rows after the (labeled_at, id) `after`."""
+    while True:
+        batch = _labelled_query(label_sources, after).limit(batch_size).all()
+        db.session.commit()  # do not hold a transaction open between batches
+        if not batch:
+            return
+        yield batch
+        after = (batch[-1].labeled_at, batch[-1].id)
+
+
+def _texts(rows):
+    return [row.clean_review_text or ml_layer.clean_text(row.review_text) for row in rows]
+
+
+def _parse_trained_through(value):
+    if not value:
+        return None
+    labeled_at, review_id = value
+    return datetime.fromisoformat(labeled_at), review_id
+
+
+def train_online_model(path=ml_layer.HASHING_MODEL_PATH, label_sources=("manual",), full=False, epochs=1,
+                       batch_size=TRAINING_BATCH_SIZE, on_batch=None):
+    """
+    Train (or keep training) the hashing model at `path` on labelled reviews.
+    on_batch(epoch, rows_so_far) is called after every batch.
+    Returns {"path", "resumed", "epochs", "rows", "new_rows", "n_samples", "trained_through", "saved"}.
+    """
+    label_sources = list(label_sources)
+    if full or not os.path.exists(path):
+        model, vectorizer, params = ml_layer.new_hashing_model()
+        after, n_samples, resumed = None, 0, False
+    else:
+        model, vectorizer, meta = ml_layer.read_hashing_model(path)
+        params = {key: meta[key] for key in ("n_features", "ngram_range", "alpha")}
+        after, n_samples, resumed = _parse_trained_through(meta["trained_through"]), meta["n_samples"], True
+
+    report = {"path": path, "resumed": resumed, "epochs": epochs, "rows": 0, "new_rows": 0,
+              "n_samples": n_samples, "trained_through": None, "saved": False}
+    newest = after
+    for epoch in range(epochs):
+        for batch in iter_labelled_batches(label_sources, after=after, batch_size=batch_size):
+            X = vectorizer.transform(_texts(batch))
+            y = np.array([int(row.manual_label) for row in batch])
+            model.partial_fit(X, y, classes=CLASSES)
+            report["rows"] += len(batch)
+            if epoch == 0:
+                report["new_rows"] += len(batch)
+                newest = (batch[-1].labeled_at, batch[-1].id)
+            if on_batch is not None:
+                on_batch(epoch, report["rows"])
+
+    if report["new_rows"]:
+        report["n_samples"] = n_samples + report["new_rows"]
+        trained_through = [newest[0].isoformat(), newest[1]]
+        ml_layer.save_hashing_model(path, model, params, trained_through=trained_through,
+                                    n_samples=report["n_samples"])
+        report["trained_through"] = trained_through[0]
+        report["saved"] = True
+        logger.info("Saved hashing model %s (%d new rows, %d total)", path, report["new_rows"], report["n_samples"])
+    elif newest is not None:
+        report["trained_through"] = newest[0].isoformat()
+    return report
@@ -0,0 +1,205 @@
+# parallel_scoring.py
+"""
+Multi-core scoring for analysis runs (?workers=N on /analyze_all, ANALYSIS_WORKERS).
+
+Drop-in replacements for ml_model_predict_batch and behavioral_analysis_rows
+that spread the CPU-bound work over a pool of forked processes:
+
+  - ML: the parent still cleans the texts and consults the prediction cache;
+    the uncached batches (TF-IDF transform / stored-vector decode + predict)
+    are scored by the pool.
+  - Behavioral: rows are partitioned by user. Each partition computes its
+    user-local rules (burst, repeat offender) and a partial aggregate, the
+    number of distinct users per device and per IP. A user lives in exactly
+    one partition, so the parent merges the aggregates by adding them up, in
+    partition order, and decides the shared device/IP rules from the totals.
+
+Inputs reach the workers by inheritance: they are put in module globals and
+the pool is forked afterwards, so neither the model nor the rows are pickled;
+only the results travel back. The model's numpy arrays are memory-mapped
+(ML_MODEL_MMAP_MODE), so every worker reads the same pages. A pool lives for
+one stage of one run; chunked callers (flask analyze) instead keep one
+scoring_pool() forked with the model for the whole run and send it the
+batches.
+
+Results are identical to the serial path: the same functions score the same
+batches, and the rules are computed from the same complete per-user and
+per-identifier data. Workers never touch the database, metrics or caches.
+Without the fork start method (or with workers <= 1, or fewer than
+PARALLEL_MIN_ROWS rows) everything runs serially in the calling process.
+A pool never has more processes than CPUs or tasks, whatever `workers` says.
+"""
+import functools
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+from ml_layer import (
+    SHARED_DEVICE_MAX_USERS,
+    SHARED_IP_MAX_USERS,
+    _factorize,
+    batch_probabilities,
+    behavioral_analysis_rows,
+    mask_results,
+    shared_rule_masks,
+    ml_model_predict_batch,
+    registry,
+    user_rule_masks,
+)
+
+logger = logging.getLogger(__name__)
+
+# Below this many rows a pool costs more than it saves
+PARALLEL_MIN_ROWS = 10_000
+# Tasks per worker, so one slow partition does not leave the others idle
+TASKS_PER_WORKER = 4
+ML_MIN_BATCH_SIZE = 250
+
+_inherited = None  # what the next forked pool's workers read
+
+
+def fork_available() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _pool_size(workers, n_tasks=None) -> int:
+    """Processes worth forking for `workers`: no more than CPUs or tasks."""
+    size = min(workers or 1, os.cpu_count() or 1)
+    return max(1, min(size, n_tasks) if n_tasks is not None else size)
+
+
+def _use_pool(workers, n_rows) -> bool:
+    if _pool_size(workers) <= 1 or n_rows < PARALLEL_MIN_ROWS:
+        return False
+    if not fork_available():
+        logger.warning("Parallel scoring needs the fork start method; scoring serially")
+        return False
+    return True
+
+
+@contextmanager
+def _forked_pool(workers, n_tasks=None, **inherited):
+    """A process pool (see _pool_size) whose workers see `inherited` as module state."""
+    global _inherited
+    _inherited = inherited
+    try:
+        with multiprocessing.get_context("fork").Pool(_pool_size(workers, n_tasks)) as pool:
+            yield pool
+    finally:
+        _inherited = None
+
+
+# -------------------------------
+# Layer 2: ML
+# -------------------------------
+def _score_batch(index):
+    return batch_probabilities(_inherited["model"], _inherited["batches"][index])
+
+
+def _score_sent_batch(batch):
+    return batch_probabilities(_inherited["model"], batch)
+
+
+@contextmanager
+def scoring_pool(workers):
+    """
+    A pool for many predict_batch(pool=...) calls, forked once with the
+    current model; None when scoring serially.
+    """
+    current = registry.get()
+    if current is None or not _use_pool(workers, PARALLEL_MIN_ROWS):
+        yield None
+        return
+    with _forked_pool(workers, model=current) as pool:
+        yield pool
+
+
+def _map_batches(workers, current, batches):
+    if len(batches) < 2:
+        return [batch_probabilities(current, batch) for batch in batches]
+    with _forked_pool(workers, len(batches), model=current, batches=batches) as pool:
+        return pool.map(_score_batch, range(len(batches)), chunksize=1)
+
+
+def _map_sent_batches(pool, current, batches):
+    if len(batches) < 2 or current is not _inherited["model"]:  # reloaded since the fork
+        return [batch_probabilities(current, batch) for batch in batches]
+    return pool.map(_score_sent_batch, batches, chunksize=1)
+
+
+def predict_batch(texts: list, features: list = None, workers=1, batch_size=1000, pool=None,
+                  cleaned_texts: list = None) -> list:
+    """
+    ml_model_predict_batch, with the uncached batches scored on `workers`
+    processes: on `pool` (from scoring_pool(workers)) if given, else on a pool
+    forked for this call.
+    """
+    if pool is not None:
+        map_batches = functools.partial(_map_sent_batches, pool)
+    elif _use_pool(workers, len(texts)):
+        map_batches = functools.partial(_map_batches, workers)
+    else:
+        return ml_model_predict_batch(texts, batch_size=batch_size, features=features, cleaned_texts=cleaned_texts)
+    # Smaller batches so every worker gets several; per-row scores do not depend on batching
+    per_task = -(-len(texts) // (_pool_size(workers) * TASKS_PER_WORKER))
+    return ml_model_predict_batch(
+        texts,
+        batch_size=max(ML_MIN_BATCH_SIZE, min(batch_size, per_task)),
+        features=features,
+        map_batches=map_batches,
+        cleaned_texts=cleaned_texts,
+    )
+
+
+# -------------------------------
+# Layer 3: behavioral
+# -------------------------------
+def _distinct_users(identifiers, user_ids) -> Counter:
+    """identifier -> number of distinct users among the given rows."""
+    return Counter(identifier for identifier, _ in set(zip(identifiers, user_ids)))
+
+
+def _partition_rules(index):
+    """(user-local rule masks, users per device, users per IP) for one partition."""
+    columns, rows = _inherited["columns"], _inherited["partitions"][index]
+    user_ids, timestamps, devices, ips, fake_signals = ([column[i] for i in rows] for column in columns)
+    user_codes, n_users = _factorize(user_ids)
+    return (
+        user_rule_masks(user_codes, n_users, timestamps, fake_signals),
+        _distinct_users(devices, user_ids),
+        _distinct_users(ips, user_ids),
+    )
+
+
+def behavioral_rows(rows, rings: dict = None, workers=1) -> dict:
+    """behavioral_analysis_rows, with the per-user work done on `workers` processes."""
+    rows = list(rows)
+    if not _use_pool(workers, len(rows)):
+        return behavioral_analysis_rows(rows, rings=rings)
+
+    ids, user_ids, timestamps, devices, ips, fake_signals = zip(*rows)
+    user_codes, n_users = _factorize(user_ids)
+    n_partitions = min(n_users, _pool_size(workers) * TASKS_PER_WORKER)
+    # Row indices per partition, in input order (burst ties keep input order)
+    partition_of_row = user_codes % n_partitions
+    partitions = [np.flatnonzero(partition_of_row == p) for p in range(n_partitions)]
+
+    with _forked_pool(workers, n_partitions, columns=(user_ids, timestamps, devices, ips, fake_signals),
+                      partitions=partitions) as pool:
+        partials = pool.map(_partition_rules, range(n_partitions), chunksize=1)
+
+    masks = np.zeros(len(rows), dtype=np.int64)
+    users_per_device, users_per_ip = Counter(), Counter()
+    for rows_in_partition, (partition_masks, partition_devices, partition_ips) in zip(partitions, partials):
+        masks[rows_in_partition] = partition_masks
+        users_per_device.update(partition_devices)
+        users_per_ip.update(partition_ips)
+
+    shared_devices = {d for d, users in users_per_device.items() if users > SHARED_DEVICE_MAX_USERS}
+    shared_ips = {ip for ip, users in users_per_ip.items() if users > SHARED_IP_MAX_USERS}
+    masks |= shared_rule_masks(devices, ips, shared_devices, shared_ips)
+    return mask_results(ids, user_ids, masks, rings)
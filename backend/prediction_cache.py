@@ -0,0 +1,187 @@
+# prediction_cache.py
+"""
+Cache of ML predictions keyed by (sha256 of the cleaned text, model version).
+
+Spam campaigns repeat the same text (up to case and punctuation, which
+clean_text strips), so most of their copies are answered without running
+the vectorizer. There are two tiers:
+  - memory: bounded LRU with a TTL, per process;
+  - persistent (optional, PREDICTION_CACHE_PERSIST=1): the prediction_cache
+    table, so scores survive restarts and are shared between workers.
+
+The model version is part of the key, so a new model never sees the old
+model's scores. On reload the memory tier is cleared and persistent rows of
+other versions are deleted.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def text_key(clean_text: str) -> str:
+    return hashlib.sha256(clean_text.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=100_000, ttl_seconds=86_400, persistent=False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self._entries = OrderedDict()  # (text_hash, version) -> (is_fake_ml, confidence, expires_at)
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_entries=None, ttl_seconds=None, persistent=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            if persistent is not None:
+                self.persistent = persistent
+            self._entries.clear()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.persistent
+
+    # -------------------------------
+    # Lookups
+    # -------------------------------
+    def get_many(self, text_hashes, version) -> dict:
+        """text_hash -> (is_fake_ml, confidence) for every cached hash."""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for text_hash in text_hashes:
+                key = (text_hash, version)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[text_hash] = entry[:2]
+            self.hits += len(found)
+
+        missing = [h for h in text_hashes if h not in found]
+        if missing and self.persistent:
+            stored = self._load_persistent(missing, version)
+            if stored:
+                self._remember(stored, version)
+                found.update(stored)
+                with self._lock:
+                    self.persistent_hits += len(stored)
+
+        with self._lock:
+            self.misses += len(text_hashes) - len(found)
+        return found
+
+    def put_many(self, predictions, version):
+        """Store text_hash -> (is_fake_ml, confidence) in both tiers."""
+        if not predictions:
+            return
+        self._remember(predictions, version)
+        if self.persistent:
+            self._store_persistent(predictions, version)
+
+    def _remember(self, predictions, version):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for text_hash, (is_fake_ml, confidence) in predictions.items():
+                key = (text_hash, version)
+                self._entries[key] = (is_fake_ml, confidence, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # -------------------------------
+    # Persistent tier
+    # -------------------------------
+    def _load_persistent(self, text_hashes, version):
+        from extensions import db
+        from models import PredictionCacheEntry
+
+        # In a savepoint: a failed lookup must not abort the caller's transaction
+        try:
+            with db.session.begin_nested():
+                rows = db.session.query(
+                    PredictionCacheEntry.text_hash, PredictionCacheEntry.is_fake_ml, PredictionCacheEntry.confidence
+                ).filter(
+                    PredictionCacheEntry.model_version == version,
+                    PredictionCacheEntry.text_hash.in_(text_hashes),
+                ).all()
+            return {text_hash: (bool(is_fake_ml), confidence) for text_hash, is_fake_ml, confidence in rows}
+        except Exception:
+            logger.warning("Prediction cache table unavailable", exc_info=True)
+            return {}
+
+    def _store_persistent(self, predictions, version):
+        """Insert rows in the caller's transaction; they are committed with the analysis results."""
+        from extensions import db
+        from models import PredictionCacheEntry
+
+        rows = [
+            {"text_hash": text_hash, "model_version": version, "is_fake_ml": is_fake_ml, "confidence": confidence}
+            for text_hash, (is_fake_ml, confidence) in predictions.items()
+        ]
+        dialect = db.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return
+        # Another worker may have cached the same text in the meantime
+        db.session.execute(insert(PredictionCacheEntry).on_conflict_do_nothing(), rows)
+
+    # -------------------------------
+    # Invalidation / stats
+    # -------------------------------
+    def invalidate(self, keep_version=None):
+        """Drop every entry (persistent rows too, except those of keep_version)."""
+        with self._lock:
+            self._entries.clear()
+        if not self.persistent:
+            return
+        from extensions import db
+        from models import PredictionCacheEntry
+
+        try:
+            query = PredictionCacheEntry.query
+            if keep_version is not None:
+                query = query.filter(PredictionCacheEntry.model_version != keep_version)
+            query.delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            logger.warning("Could not prune the prediction cache table", exc_info=True)
+            db.session.rollback()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.persistent,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,158 @@
+# product_stats.py
+"""
+Per-product trust figures (product_stats table) served by the product routes.
+
+A review counts as flagged when its final verdict says so, or, before it has
+been analyzed, when the rule engine flagged it:
+    COALESCE(is_fake, is_fake_rule_based, 0) = 1
+The adjusted rating is the mean rating of the reviews that are not flagged.
+
+The table is maintained with deltas. Every write path (add/update/delete,
+bulk ingest, analysis relabels) collects them in a StatsDelta and applies it
+in its own transaction, so the figures commit atomically with the reviews:
+  1. one executemany'd upsert adds the deltas to the stored sums
+  2. one UPDATE recomputes fake_ratio/adjusted_rating for the touched rows
+`flask rebuild-product-stats` recomputes everything from the reviews.
+
+fake_ratio and adjusted_rating are NOT NULL: a product without (unflagged,
+rated) reviews stores NO_VALUE, which sorts below every real value. Every
+product should have a row (the migrations backfill them, the rebuild
+recreates them); run the rebuild after importing products. Until then the
+product listings treat a missing row as NO_VALUE and 0 reviews.
+"""
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert, select, update
+
+from extensions import db
+from models import Product, ProductStats, Review
+from response_cache import response_cache
+
+APPLY_CHUNK_SIZE = 1000
+NO_VALUE = -1.0  # fake_ratio / adjusted_rating without reviews to compute them from
+
+
+def is_flagged(is_fake, is_fake_rule_based) -> int:
+    """Python side of FLAGGED (1 or 0)."""
+    value = is_fake if is_fake is not None else is_fake_rule_based
+    return 1 if value else 0
+
+
+FLAGGED = func.coalesce(Review.is_fake, Review.is_fake_rule_based, 0) == 1
+
+
+def _derived_values():
+    return {
+        "fake_ratio": case(
+            (ProductStats.total_reviews > 0, ProductStats.flagged_reviews * 1.0 / ProductStats.total_reviews),
+            else_=NO_VALUE,
+        ),
+        "adjusted_rating": case(
+            (ProductStats.unflagged_rated_reviews > 0,
+             ProductStats.unflagged_rating_sum / ProductStats.unflagged_rated_reviews),
+            else_=NO_VALUE,
+        ),
+        "updated_at": func.now(),
+    }
+
+
+def _upsert_statement():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"product_stats does not support {dialect}")
+    stmt = dialect_insert(ProductStats)
+    return stmt.on_conflict_do_update(
+        index_elements=[ProductStats.product_id],
+        set_={
+            column: getattr(ProductStats, column) + getattr(stmt.excluded, column)
+            for column in ("total_reviews", "flagged_reviews", "unflagged_rating_sum", "unflagged_rated_reviews")
+        },
+    )
+
+
+class StatsDelta:
+    """Changes to the per-product sums, applied with apply() before the caller commits."""
+
+    def __init__(self):
+        # product_id -> [total, flagged, unflagged rating sum, unflagged rated reviews]
+        self._deltas = defaultdict(lambda: [0, 0, 0.0, 0])
+
+    def add(self, product_id, rating, flagged, sign=1):
+        if product_id is None:
+            return
+        delta = self._deltas[product_id]
+        delta[0] += sign
+        if flagged:
+            delta[1] += sign
+        elif rating is not None:
+            delta[2] += sign * float(rating)
+            delta[3] += sign
+
+    def remove(self, product_id, rating, flagged):
+        self.add(product_id, rating, flagged, sign=-1)
+
+    def change(self, old, new):
+        """A review moved from old to new (product_id, rating, flagged)."""
+        if old != new:
+            self.remove(*old)
+            self.add(*new)
+
+    def apply(self):
+        """Write the deltas; returns the number of products touched."""
+        rows = [
+            {
+                "product_id": product_id,
+                "total_reviews": total,
+                "flagged_reviews": flagged,
+                "unflagged_rating_sum": rating_sum,
+                "unflagged_rated_reviews": rated,
+            }
+            for product_id, (total, flagged, rating_sum, rated) in self._deltas.items()
+            if total or flagged or rating_sum or rated
+        ]
+        if not rows:
+            return 0
+        upsert = _upsert_statement()
+        for start in range(0, len(rows), APPLY_CHUNK_SIZE):
+            chunk = rows[start:start + APPLY_CHUNK_SIZE]
+            db.session.execute(upsert, chunk)
+            db.session.execute(
+                update(ProductStats)
+                .where(ProductStats.product_id.in_([r["product_id"] for r in chunk]))
+                .values(**_derived_values())
+                .execution_options(synchronize_session=False)
+            )
+        self._deltas.clear()
+        return len(rows)
+
+
+def rebuild_product_stats() -> int:
+    """Recompute every product's row from the reviews and commit; returns the row count."""
+    unflagged_rated = (~FLAGGED) & Review.rating.isnot(None)
+    aggregates = (
+        select(
+            Product.id,
+            func.count(Review.id),
+            func.coalesce(func.sum(case((FLAGGED, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((unflagged_rated, Review.rating), else_=0)), 0),
+            func.coalesce(func.sum(case((unflagged_rated, 1), else_=0)), 0),
+        )
+        .select_from(Product)
+        .outerjoin(Review, Review.product_id == Product.id)
+        .group_by(Product.id)
+    )
+    db.session.execute(delete(ProductStats))
+    result = db.session.execute(
+        insert(ProductStats).from_select(
+            ["product_id", "total_reviews", "flagged_reviews", "unflagged_rating_sum", "unflagged_rated_reviews"],
+            aggregates,
+        )
+    )
+    db.session.execute(update(ProductStats).values(**_derived_values()))
+    db.session.commit()
+    response_cache.invalidate("catalog")
+    return result.rowcount
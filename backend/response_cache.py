@@ -0,0 +1,228 @@
+# response_cache.py
+"""
+Read-through cache and strong ETags for the product and review read routes.
+
+Cached routes are decorated with @cached(...), which names the
+*generations* the response depends on:
+  - "catalog":          product rows and product_stats as a whole (bumped by
+                        bulk review imports and rebuild-product-stats)
+  - "reviews":          any review insert/update/delete (the product list
+                        depends on it too: every write moves a product's stats)
+  - "product:<id>":     reviews of one product
+  - "analysis":         verdicts written by an analysis run
+The cache key includes the current number of every generation it depends on.
+Invalidation therefore bumps a counter (O(1)) instead of searching for keys,
+and entries under old numbers are never read again and age out by TTL/LRU.
+
+Backends:
+  - "memory" (default): per-process LRU with TTL. Other worker processes
+    would only see invalidations after CACHE_TTL_SECONDS, so with
+    WEB_CONCURRENCY > 1 it is replaced by "none" (with a warning); use
+    redis with several workers.
+  - "redis": any Redis-compatible server at CACHE_REDIS_URL (needs the redis
+    package). Generations live in the server, so all workers share them.
+  - "none": no server-side caching; ETags/304 still apply.
+
+Every response from a cached route carries a strong ETag (sha256 of the
+body) and `Cache-Control: no-cache`, and a matching If-None-Match gets 304.
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class MemoryBackend:
+    def __init__(self, max_entries=10_000, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generations(self, names):
+        with self._lock:
+            return [self._generations.get(n, 0) for n in names]
+
+    def bump(self, names):
+        with self._lock:
+            for n in names:
+                self._generations[n] = self._generations.get(n, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    PREFIX = "rcache:"
+
+    def __init__(self, url, ttl_seconds=300):
+        import redis  # optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def generations(self, names):
+        values = self.client.mget([f"{self.PREFIX}gen:{n}" for n in names])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump(self, names):
+        pipe = self.client.pipeline(transaction=False)
+        for n in names:
+            pipe.incr(f"{self.PREFIX}gen:{n}")
+        pipe.execute()
+
+    def get(self, key):
+        return self.client.get(self.PREFIX + key)
+
+    def set(self, key, value):
+        self.client.set(self.PREFIX + key, value, ex=self.ttl_seconds)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.PREFIX + "*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def _safe(self, fn, *args, default=None):
+        """Backend errors (e.g. Redis down) degrade to an uncached response."""
+        if self.backend is None:
+            return default
+        try:
+            return fn(*args)
+        except Exception:
+            logger.warning("Response cache backend error", exc_info=True)
+            return default
+
+    def invalidate(self, *names):
+        self._safe(lambda: self.backend.bump(names))
+
+    def invalidate_reviews(self, product_ids):
+        """After a committed review insert/update/delete on these products."""
+        self.invalidate("reviews", *(f"product:{p}" for p in set(product_ids) if p is not None))
+
+    def lookup(self, key):
+        return self._safe(self.backend.get, key)
+
+    def store(self, key, value):
+        self._safe(self.backend.set, key, value)
+
+    def generations(self, names):
+        return self._safe(self.backend.generations, names, default=None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache()
+
+
+# -------------------------------
+# Decorator
+# -------------------------------
+def _etag(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def _conditional(response, etag):
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    response.cache_control.public = True
+    return response.make_conditional(request)
+
+
+def cached(depends_on):
+    """
+    Cache a GET view's 200 responses. `depends_on(**view_args)` returns the
+    generation names the response depends on, or None to skip the
+    server-side cache for this request (ETags still apply).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            names = depends_on(**kwargs)
+            key = None
+            if names is not None:
+                generations = response_cache.generations(names)
+                if generations is not None:
+                    args_key = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+                    versions = ",".join(f"{n}@{g}" for n, g in zip(names, generations))
+                    key = f"{request.path}?{args_key}|{versions}"
+
+            if key is not None:
+                body = response_cache.lookup(key)
+                if body is not None:
+                    response_cache.hits += 1
+                    response = make_response(body, 200, {"Content-Type": "application/json"})
+                    response = _conditional(response, _etag(body))
+                    if response.status_code == 304:
+                        response_cache.not_modified += 1
+                    return response
+                response_cache.misses += 1
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            if key is not None:
+                response_cache.store(key, body)
+            response = _conditional(response, _etag(body))
+            if response.status_code == 304:
+                response_cache.not_modified += 1
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    backend = app.config.get("CACHE_BACKEND", "memory")
+    ttl = app.config.get("CACHE_TTL_SECONDS", 300)
+    if backend == "redis":
+        response_cache.configure(RedisBackend(app.config["CACHE_REDIS_URL"], ttl_seconds=ttl))
+    elif backend == "memory" and app.config.get("WEB_CONCURRENCY", 1) > 1:
+        logger.warning("CACHE_BACKEND=memory is per process and WEB_CONCURRENCY=%s; "
+                       "server-side response caching is off (use CACHE_BACKEND=redis)",
+                       app.config["WEB_CONCURRENCY"])
+        response_cache.configure(None)
+    elif backend == "memory":
+        response_cache.configure(MemoryBackend(max_entries=app.config.get("CACHE_MAX_ENTRIES", 10_000),
+                                               ttl_seconds=ttl))
+    else:
+        response_cache.configure(None)
@@ -0,0 +1,344 @@
+# review_export.py
+"""
+Columnar export of reviews and their detection results (POST /api/reviews/export
+and `flask export-reviews`), for retraining and flag-rate audits.
+
+One row per review: ids, product category, rating, timestamps, text, rule
+flags, ML prediction, behavioral flags and the final label (optionally the
+stored TF-IDF vector). Output is Parquet or Arrow IPC, written in row groups of
+row_group_size rows. Rows come from a server-side cursor and at most one row
+group is buffered, so memory stays constant however large the table is.
+
+Partitioning (files only) uses hive-style directories, e.g.
+    <dir>/date=2024-05-01/category=Electronics/part-<run>.parquet
+Rows are ordered by the partition keys, so only one file is open at a time.
+
+Incremental exports keep a watermark per export name in analysis_state
+("export:<name>"), the newest (changed_at, id) exported, where changed_at is
+the later of updated_at (content edits) and results_updated_at (verdicts
+written by analysis, human labels). The next incremental run writes only
+reviews created, edited, re-scored or labelled after it, into new files. A
+changed review therefore appears again; readers keep the row with the newest
+changed_at per id. The watermark only moves when an export completes.
+
+Needs pyarrow (optional dependency, only imported here).
+"""
+import os
+import uuid
+from datetime import datetime
+from urllib.parse import quote
+
+from sqlalchemy import Float, Integer, and_, case, cast, func, or_, select
+
+from extensions import db
+from models import AnalysisState, Product, Review
+
+EXPORT_ROW_GROUP_SIZE = 50_000
+FORMATS = ("parquet", "arrow")
+PARTITION_KEYS = ("date", "category")
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+WATERMARK_PREFIX = "export:"
+
+RULE_COLUMNS = (
+    "rule_rate_limit",
+    "rule_new_account_extreme",
+    "rule_duplicate_text",
+    "rule_vpn_ip",
+    "rule_same_device",
+    "rule_low_quality",
+    "rule_burst_activity",
+)
+FLAG_COLUMNS = RULE_COLUMNS + ("is_fake_rule_based", "is_fake_ml", "is_fake_behavioral", "is_fake")
+
+# GREATEST(updated_at, results_updated_at) ignoring NULLs, also on SQLite
+CHANGED_AT = case(
+    (Review.results_updated_at.is_(None), Review.updated_at),
+    (Review.updated_at.is_(None), Review.results_updated_at),
+    (Review.results_updated_at > Review.updated_at, Review.results_updated_at),
+    else_=Review.updated_at,
+)
+
+
+def _pyarrow():
+    try:
+        # The submodules are not loaded by `import pyarrow` alone
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Review export needs pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+# -------------------------------
+# Columns
+# -------------------------------
+def _columns(include_vectors=False):
+    """(name, SQL expression, arrow type name) per exported column."""
+    columns = [
+        ("id", Review.id, "string"),
+        ("user_id", Review.user_id, "string"),
+        ("product_id", Review.product_id, "string"),
+        ("category", Product.category, "string"),
+        ("rating", cast(Review.rating, Float), "float64"),
+        ("timestamp", Review.timestamp, "timestamp"),
+        ("updated_at", Review.updated_at, "timestamp"),
+        ("review_text", Review.review_text, "string"),
+        ("clean_review_text", Review.clean_review_text, "string"),
+        ("user_ip", Review.user_ip, "string"),
+        ("device_fingerprint", Review.device_fingerprint, "string"),
+        ("duplicate_review_score", Review.duplicate_review_score, "float64"),
+        ("flag_reasons", Review.flag_reasons, "string"),
+    ]
+    # Numeric 0/1 columns (Decimal on PostgreSQL) are exported as small ints
+    columns += [(name, cast(getattr(Review, name), Integer), "int8") for name in FLAG_COLUMNS]
+    columns += [
+        ("ml_confidence", Review.ml_confidence, "float64"),
+        ("ml_model_version", Review.ml_model_version, "string"),
+        ("behavioral_flags", Review.behavioral_flags, "string"),
+        ("behavioral_score", Review.behavioral_score, "float64"),
+        ("label_source", Review.label_source, "string"),
+        ("manual_label", cast(Review.manual_label, Integer), "int8"),
+        ("manual_label_source", Review.manual_label_source, "string"),
+        ("labeled_at", Review.labeled_at, "timestamp"),
+        ("results_updated_at", Review.results_updated_at, "timestamp"),
+        ("changed_at", CHANGED_AT, "timestamp"),
+    ]
+    if include_vectors:
+        columns += [
+            ("feature_vector", Review.feature_vector, "binary"),
+            ("feature_vectorizer_version", Review.feature_vectorizer_version, "string"),
+        ]
+    return columns
+
+
+def _schema(pa, columns):
+    types = {
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "int8": pa.int8(),
+        "timestamp": pa.timestamp("us"),
+        "binary": pa.binary(),
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in columns])
+
+
+def _record_batch(pa, schema, rows):
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for field, values in zip(schema, zip(*rows))],
+        schema=schema,
+    )
+
+
+# -------------------------------
+# Query and watermark
+# -------------------------------
+def watermark_name(name):
+    return WATERMARK_PREFIX + name
+
+
+def _query(columns, since=None, watermark=None, partition_by=()):
+    query = select(*(expr.label(name) for name, expr, _ in columns)).select_from(Review).outerjoin(
+        Product, Product.id == Review.product_id
+    )
+    if since is not None:
+        query = query.where(Review.updated_at >= since)
+    if watermark is not None and watermark.last_updated_at is not None:
+        # (CHANGED_AT, id) > watermark, spelled per column so both (column, id) indexes serve it
+        last_at, last_id = watermark.last_updated_at, watermark.last_review_id
+        query = query.where(or_(*(
+            or_(column > last_at, and_(column == last_at, Review.id > last_id))
+            for column in (Review.updated_at, Review.results_updated_at)
+        )))
+    order = {"date": func.date(Review.timestamp), "category": Product.category}
+    return query.order_by(*(order[key] for key in partition_by), Review.id)
+
+
+def _iter_row_groups(query, row_group_size, partition_of=None):
+    """
+    (partition, rows) lists of at most row_group_size rows, from a server-side
+    cursor; a group never spans two partitions.
+    """
+    group, group_partition = [], None
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=row_group_size).execute(query)
+        for rows in result.partitions():
+            for row in rows:
+                partition = partition_of(row) if partition_of is not None else None
+                if group and (partition != group_partition or len(group) >= row_group_size):
+                    yield group_partition, group
+                    group = []
+                group_partition = partition
+                group.append(row)
+    if group:
+        yield group_partition, group
+
+
+def _newest(current, rows):
+    for row in rows:
+        if row.changed_at is not None and (current is None or (row.changed_at, row.id) > current):
+            current = (row.changed_at, row.id)
+    return current
+
+
+def _load_watermark(name):
+    return AnalysisState.query.get(watermark_name(name)) if name is not None else None
+
+
+def _save_watermark(name, newest):
+    if newest is None:
+        return
+    state = _load_watermark(name)
+    if state is None:
+        state = AnalysisState(name=watermark_name(name))
+        db.session.add(state)
+    state.last_updated_at, state.last_review_id = newest
+    state.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+# -------------------------------
+# Files
+# -------------------------------
+def _partition_path(partition_by, values):
+    return os.path.join(*(
+        f"{key}={NULL_PARTITION if value is None else quote(str(value), safe='')}"
+        for key, value in zip(partition_by, values)
+    ))
+
+
+def _partition_of(partition_by):
+    def partition(row):
+        values = []
+        for key in partition_by:
+            if key == "date":
+                values.append(row.timestamp.date().isoformat() if row.timestamp is not None else None)
+            else:
+                values.append(row.category)
+        return tuple(values)
+    return partition
+
+
+def _open_writer(pa, fmt, sink, schema):
+    if fmt == "parquet":
+        return pa.parquet.ParquetWriter(sink, schema)
+    return pa.ipc.new_file(sink, schema)
+
+
+def export_reviews(out_dir, fmt="parquet", partition_by=(), since=None, incremental_name=None,
+                   row_group_size=EXPORT_ROW_GROUP_SIZE, include_vectors=False):
+    """
+    Write reviews under out_dir; one file, or one per partition.
+    since: only reviews created/edited at or after it. incremental_name:
+    only reviews after that export's watermark, which then moves forward.
+    Returns {"rows", "row_groups", "files", "watermark"}.
+    """
+    pa = _pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    unknown = set(partition_by) - set(PARTITION_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown partition keys: {', '.join(sorted(unknown))}")
+
+    columns = _columns(include_vectors)
+    schema = _schema(pa, columns)
+    watermark = _load_watermark(incremental_name)
+    query = _query(columns, since=since, watermark=watermark, partition_by=partition_by)
+    db.session.commit()  # do not keep the watermark read open during the export
+
+    # A run id keeps files of later incremental runs apart from earlier ones
+    run = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    extension = "parquet" if fmt == "parquet" else "arrow"
+    report = {"rows": 0, "row_groups": 0, "files": [], "watermark": None}
+    newest = None
+    writer, writer_partition = None, None
+    try:
+        for partition, rows in _iter_row_groups(query, row_group_size,
+                                                _partition_of(partition_by) if partition_by else None):
+            if writer is None or partition != writer_partition:
+                if writer is not None:
+                    writer.close()
+                directory = os.path.join(out_dir, _partition_path(partition_by, partition)) if partition_by else out_dir
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"part-{run}.{extension}" if partition_by else f"reviews-{run}.{extension}")
+                writer, writer_partition = _open_writer(pa, fmt, path, schema), partition
+                report["files"].append(path)
+            writer.write_batch(_record_batch(pa, schema, rows))
+            report["rows"] += len(rows)
+            report["row_groups"] += 1
+            newest = _newest(newest, rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if incremental_name is not None:
+        _save_watermark(incremental_name, newest)
+        state = _load_watermark(incremental_name)
+        report["watermark"] = state.last_updated_at.isoformat() if state and state.last_updated_at else None
+    return report
+
+
+# -------------------------------
+# HTTP stream
+# -------------------------------
+class _DrainedSink:
+    """Write-only file object whose buffered bytes are taken after every row group."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_export(fmt="parquet", since=None, incremental_name=None, row_group_size=EXPORT_ROW_GROUP_SIZE,
+                  include_vectors=False):
+    """
+    Yield the export as one Parquet file or Arrow IPC stream, a row group at
+    a time. The watermark of incremental_name only moves after the last byte
+    was produced, so an aborted download is exported again next time.
+    """
+    pa = _pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    columns = _columns(include_vectors)
+    schema = _schema(pa, columns)
+    query = _query(columns, since=since, watermark=_load_watermark(incremental_name))
+    db.session.commit()
+
+    def generate():
+        sink = _DrainedSink()
+        if fmt == "parquet":
+            writer = pa.parquet.ParquetWriter(sink, schema)
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+        newest = None
+        for _, rows in _iter_row_groups(query, row_group_size):
+            writer.write_batch(_record_batch(pa, schema, rows))
+            newest = _newest(newest, rows)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+        if incremental_name is not None:
+            _save_watermark(incremental_name, newest)
+
+    return generate()
@@ -0,0 +1,242 @@
+# review_queue.py
+"""
+Asynchronous review ingestion (POST /api/reviews/?async=1).
+
+The request thread only validates the review, stores it with
+label_source="pending" and queues its id; it answers 202 right away. A local
+thread pool then runs what add_review does inline (duplicate scan, rules,
+feature vector, LSH index) plus the ML, behavioral and final verdict
+(analysis.score_review), and updates the row. GET /api/reviews/<id>/status
+reports the state: pending -> scoring -> scored (or failed).
+
+Backpressure: at most REVIEW_QUEUE_MAX_DEPTH reviews per process may be
+queued or in progress. Beyond that, submissions are refused with 503 and a
+Retry-After header instead of piling up.
+
+A worker claims a review with a conditional UPDATE (pending -> scoring, and
+claimed_at = now), so one review is scored once even when several processes
+see it. Every process runs a recovery thread that calls
+requeue_pending_reviews() every REVIEW_QUEUE_RECOVERY_SECONDS: reviews not in
+its own queue that were submitted, or claimed for scoring, more than
+REVIEW_QUEUE_STALE_SECONDS ago (by a process that went away or fell far
+behind) are queued again.
+
+The rules are evaluated as of the review's submission time (its timestamp),
+so a review that waited in the queue gets the verdict add_review would have
+given it.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+
+import dedup_index
+import feature_store
+import metrics
+from analysis import score_review
+from collusion import graph
+from extensions import db
+from models import Review, User
+from product_stats import StatsDelta, is_flagged
+from response_cache import response_cache
+from rules import compute_rules, get_duplicate_score
+
+logger = logging.getLogger(__name__)
+
+PENDING, SCORING, FAILED = "pending", "scoring", "failed"
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+_recovery_lock = threading.Lock()
+_recovery_thread = None
+# Reviews submitted to this process's pool and not finished yet
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            _slots = threading.BoundedSemaphore(app.config.get("REVIEW_QUEUE_MAX_DEPTH", 1000))
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get("REVIEW_QUEUE_WORKERS", 2),
+                thread_name_prefix="review-scoring",
+            )
+    return _executor
+
+
+def reserve(app) -> bool:
+    """Take a queue slot for a new submission; False when the queue is full."""
+    _get_executor(app)
+    if not _slots.acquire(blocking=False):
+        metrics.review_queue_rejected.inc()
+        return False
+    metrics.review_queue_depth.inc()
+    return True
+
+
+def release():
+    _slots.release()
+    metrics.review_queue_depth.dec()
+
+
+def submit(app, review_id):
+    """Queue a stored pending review (a slot must have been reserved)."""
+    with _inflight_lock:
+        _inflight.add(review_id)
+    _get_executor(app).submit(_run, app, review_id, time.perf_counter())
+
+
+def status(review) -> str:
+    if review.label_source in (PENDING, SCORING, FAILED):
+        return review.label_source
+    return "scored"
+
+
+# -------------------------------
+# Worker
+# -------------------------------
+def _stale_before(app):
+    return datetime.utcnow() - timedelta(seconds=app.config.get("REVIEW_QUEUE_STALE_SECONDS", 300))
+
+
+def _stale_claim(stale_before):
+    return and_(Review.label_source == SCORING, or_(Review.claimed_at.is_(None), Review.claimed_at < stale_before))
+
+
+def _claimable(app):
+    """Pending, or claimed for scoring longer than REVIEW_QUEUE_STALE_SECONDS ago."""
+    return or_(Review.label_source == PENDING, _stale_claim(_stale_before(app)))
+
+
+def _orphaned(app):
+    """Pending since longer than REVIEW_QUEUE_STALE_SECONDS, or a stale claim."""
+    stale_before = _stale_before(app)
+    return or_(and_(Review.label_source == PENDING, Review.timestamp < stale_before), _stale_claim(stale_before))
+
+
+def _claim(app, review_id) -> bool:
+    """pending -> scoring (or re-claim one stuck in scoring); True if this worker got it."""
+    claimed = db.session.execute(
+        update(Review)
+        .where(Review.id == review_id, _claimable(app))
+        .values(label_source=SCORING, claimed_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def _score(review_id):
+    review = Review.query.get(review_id)
+    before = (review.product_id, review.rating, is_flagged(review.is_fake, review.is_fake_rule_based))
+
+    # Layer 1, as add_review would have run it at submission time; the stored
+    # row itself is not counted
+    candidate_texts = dedup_index.find_candidate_texts(review.clean_review_text)
+    duplicate_score = get_duplicate_score(review.clean_review_text, candidate_texts)
+    user = User.query.get(review.user_id)
+    rules, flag_reasons = compute_rules(
+        user, review.clean_review_text, review.rating, review.user_ip, review.device_fingerprint,
+        duplicate_score, review.product_id, exclude_id=review.id, at=review.timestamp,
+    )
+    for rule, fired in rules.items():
+        setattr(review, rule, int(fired))
+    review.duplicate_review_score = duplicate_score
+    review.flag_reasons = flag_reasons
+    review.is_fake_rule_based = int(any(rules.values()))
+    review.label_source = "rule_engine"
+    feature_store.set_review_features(review)
+    dedup_index.index_review(review)
+
+    # Layers 2 and 3
+    score_review(review)
+
+    stats = StatsDelta()
+    stats.change(before, (review.product_id, review.rating, is_flagged(review.is_fake, review.is_fake_rule_based)))
+    stats.apply()
+    db.session.commit()
+
+    graph.record_review(review.user_id, review.device_fingerprint, review.user_ip, review.is_fake_rule_based)
+    response_cache.invalidate_reviews([review.product_id])
+
+
+def _run(app, review_id, queued_at):
+    metrics.review_queue_wait_seconds.observe(time.perf_counter() - queued_at)
+    with app.app_context():
+        try:
+            if not _claim(app, review_id):
+                return
+            with metrics.review_scoring_seconds.time():
+                _score(review_id)
+            metrics.review_scoring_finished.inc(status="scored")
+        except Exception:
+            logger.exception("Scoring review %s failed", review_id)
+            db.session.rollback()
+            db.session.execute(update(Review).where(Review.id == review_id).values(label_source=FAILED))
+            db.session.commit()
+            metrics.review_scoring_finished.inc(status="failed")
+        finally:
+            db.session.remove()
+            with _inflight_lock:
+                _inflight.discard(review_id)
+            release()
+
+
+# -------------------------------
+# Recovery
+# -------------------------------
+def requeue_pending_reviews(app):
+    """Queue reviews left pending (or stuck in scoring) by a process that went away."""
+    with _inflight_lock:
+        local = set(_inflight)
+    with app.app_context():
+        try:
+            review_ids = [
+                review_id for (review_id,) in db.session.query(Review.id).filter(_orphaned(app))
+                .order_by(Review.timestamp)
+                if review_id not in local
+            ]
+        except Exception:
+            logger.warning("Could not check for pending reviews", exc_info=True)
+            db.session.rollback()
+            return []
+        finally:
+            db.session.remove()
+
+    queued = []
+    for review_id in review_ids:
+        if not reserve(app):
+            logger.warning("Review queue full; %d pending reviews wait for the next recovery pass",
+                           len(review_ids) - len(queued))
+            break
+        submit(app, review_id)
+        queued.append(review_id)
+    return queued
+
+
+def _recover_periodically(app):
+    interval = app.config.get("REVIEW_QUEUE_RECOVERY_SECONDS", 60)
+    while True:
+        requeue_pending_reviews(app)
+        time.sleep(interval)
+
+
+def init_app(app):
+    """Start the recovery thread on the first request this process serves."""
+    @app.before_request
+    def _start_review_recovery():
+        global _recovery_thread
+        if _recovery_thread is not None:
+            return
+        with _recovery_lock:
+            if _recovery_thread is not None:
+                return
+            _recovery_thread = threading.Thread(
+                target=_recover_periodically, args=(app,), name="review-queue-recovery", daemon=True
+            )
+            _recovery_thread.start()
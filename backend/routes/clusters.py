@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+from collusion import COLLUSION_MIN_USERS, graph
+
+clusters_bp = Blueprint("clusters", __name__)
+
+
+def _unavailable():
+    return jsonify({"success": False, "error": "Collusion graph is disabled or unavailable"}), 503
+
+
+@clusters_bp.route("/", methods=["GET"])
+def get_clusters():
+    """Clusters with at least `min_users` users, most suspicious first (`?rings_only=1` for rings)."""
+    if not graph.ensure_warm():
+        return _unavailable()
+    min_users = request.args.get("min_users", COLLUSION_MIN_USERS, type=int)
+    limit = request.args.get("limit", 50, type=int)
+    rings_only = request.args.get("rings_only", "0") in ("1", "true")
+    return jsonify({"success": True, "data": graph.clusters(min_users, rings_only, limit)}), 200
+
+
+@clusters_bp.route("/<string:cluster_id>", methods=["GET"])
+def get_cluster(cluster_id):
+    if not graph.ensure_warm():
+        return _unavailable()
+    cluster = graph.cluster(cluster_id, member_limit=request.args.get("member_limit", 1000, type=int))
+    if cluster is None:
+        return jsonify({"success": False, "error": "Cluster not found"}), 404
+    return jsonify({"success": True, "data": cluster}), 200
+
+
+@clusters_bp.route("/user/<string:user_id>", methods=["GET"])
+def get_user_cluster(user_id):
+    if not graph.ensure_warm():
+        return _unavailable()
+    cluster_id = graph.user_cluster_id(user_id)
+    if cluster_id is None:
+        return jsonify({"success": False, "error": "User has no reviews in the graph"}), 404
+    cluster = graph.cluster(cluster_id, member_limit=request.args.get("member_limit", 1000, type=int))
+    return jsonify({"success": True, "data": cluster}), 200
+
+
+@clusters_bp.route("/rebuild", methods=["POST"])
+def rebuild_clusters():
+    """Re-read the graph from the database (drops edges of deleted reviews)."""
+    if not graph.rebuild():
+        return _unavailable()
+    return jsonify({"success": True, "message": "Collusion graph rebuilt"}), 200
@@ -1,59 +1,148 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select, tuple_
 from extensions import db
-from models import Product
+from models import Product, ProductStats
+from product_stats import NO_VALUE
+from response_cache import cached
+from serialization import decode_cursor, encode_cursor, json_response, projection
 
 products_bp = Blueprint("products", __name__)
 
+# Columns the list endpoint can return (?fields=id,name,...)
+PRODUCT_LIST_FIELDS = {
+    "id": Product.id,
+    "name": Product.name,
+    "category": Product.category,
+    "about_product": Product.about_product,
+    "rating": Product.rating,
+    "rating_count": Product.rating_count,
+    "discount_percentage": Product.discount_percentage,
+    "actual_price": Product.actual_price,
+    # trust figures from product_stats (NO_VALUE is returned as null)
+    "total_reviews": func.coalesce(ProductStats.total_reviews, 0),
+    "flagged_reviews": func.coalesce(ProductStats.flagged_reviews, 0),
+    "fake_ratio": func.nullif(ProductStats.fake_ratio, NO_VALUE),
+    "adjusted_rating": func.nullif(ProductStats.adjusted_rating, NO_VALUE),
+    "stats_updated_at": ProductStats.updated_at,
+}
+# In the default compact view (?view=full disables it) long text is cut to a preview
+# and flagged with <field>_truncated
+PRODUCT_LIST_PREVIEWS = {"about_product": 300}
+# ?sort= keys. Products without a product_stats row (imported since the last
+# `flask rebuild-product-stats`) sort as NO_VALUE / 0 reviews instead of
+# dropping out, so the listing joins from products and cannot read the
+# product_stats indexes in order: a page is a top-N sort over the products.
+PRODUCT_SORT_KEYS = {
+    "fake_ratio": func.coalesce(ProductStats.fake_ratio, NO_VALUE),
+    "adjusted_rating": func.coalesce(ProductStats.adjusted_rating, NO_VALUE),
+    "total_reviews": func.coalesce(ProductStats.total_reviews, 0),
+}
+# ?min_<name>= / ?max_<name>= filters (bounds must not be negative, so
+# products holding NO_VALUE never match)
+PRODUCT_FILTERS = {
+    "fake_ratio": PRODUCT_SORT_KEYS["fake_ratio"],
+    "adjusted_rating": PRODUCT_SORT_KEYS["adjusted_rating"],
+    "reviews": PRODUCT_SORT_KEYS["total_reviews"],
+}
+
+
+def _product_filters():
+    conditions = []
+    for name, column in PRODUCT_FILTERS.items():
+        for bound in ("min", "max"):
+            value = request.args.get(f"{bound}_{name}")
+            if value is None:
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"{bound}_{name} must be a number")
+            if value < 0:
+                raise ValueError(f"{bound}_{name} must not be negative")
+            # The lower bound of max_ keeps NO_VALUE out, as NULL was before
+            conditions.append(column >= value if bound == "min" else column.between(0, value))
+    return conditions
+
+# Generations each cached response depends on (see response_cache.py)
 @products_bp.route("/", methods=["GET"])
+@cached(lambda: ["catalog", "reviews", "analysis"])
 def get_all_products():
     try:
         cursor = request.args.get("cursor", None)
         limit = request.args.get("limit", 20, type=int)
+        sort = request.args.get("sort", "id")
+        order = request.args.get("order", "asc")
 
-        query = Product.query.order_by(Product.id)
-
-        if cursor:
-        
-            query = query.filter(Product.id > cursor)
+        try:
+            columns = projection(PRODUCT_LIST_FIELDS, list(PRODUCT_LIST_FIELDS), PRODUCT_LIST_PREVIEWS)
+            if sort != "id" and sort not in PRODUCT_SORT_KEYS:
+                raise ValueError(f"sort must be one of: id, {', '.join(PRODUCT_SORT_KEYS)}")
+            if order not in ("asc", "desc"):
+                raise ValueError("order must be 'asc' or 'desc'")
+            conditions = _product_filters()
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
 
-        products = query.limit(limit).all()
+        query = (
+            select(*columns)
+            .select_from(Product)
+            .outerjoin(ProductStats, ProductStats.product_id == Product.id)
+            .where(*conditions)
+        )
+        if sort == "id":
+            query = query.order_by(Product.id.desc() if order == "desc" else Product.id)
+            if cursor:
+                query = query.where(Product.id < cursor if order == "desc" else Product.id > cursor)
+        else:
+            # Keyset pagination on (sort key, id); the cursor carries both
+            key = PRODUCT_SORT_KEYS[sort]
+            query = query.add_columns(key.label("_sort_key")).order_by(
+                *((key.desc(), Product.id.desc()) if order == "desc" else (key, Product.id))
+            )
+            if cursor:
+                try:
+                    last_key, last_id = decode_cursor(cursor)
+                except (TypeError, ValueError):
+                    return jsonify({"success": False, "error": "invalid cursor"}), 400
+                position = tuple_(key, Product.id)
+                query = query.where(position < (last_key, last_id) if order == "desc" else position > (last_key, last_id))
 
-        products_list = []
-        for p in products:
-            products_list.append({
-                "id": p.id,
-                "name": p.name,
-                "category": p.category,
-                "about_product": p.about_product,
-                "rating": float(p.rating) if p.rating is not None else None,
-                "rating_count": float(p.rating_count) if p.rating_count is not None else None,
-                "discount_percentage": p.discount_percentage,
-                "actual_price": p.actual_price
-            })
+        products_list = [dict(row) for row in db.session.execute(query.limit(limit)).mappings()]
 
         # Determine next cursor
-        next_cursor = products[-1].id if products else None
+        next_cursor = None
+        if products_list:
+            last = products_list[-1]
+            next_cursor = last["id"] if sort == "id" else encode_cursor(last["_sort_key"], last["id"])
+        for product in products_list:
+            product.pop("_sort_key", None)
 
-        return jsonify({
+        return json_response({
             "success": True,
             "data": products_list,
             "next_cursor": next_cursor,
             "limit": limit
-        }), 200
+        }, 200)
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @products_bp.route("/<string:product_id>", methods=["GET"])
+@cached(lambda product_id: ["catalog", f"product:{product_id}", "analysis"])
 def get_product(product_id):
     try:
-        product = Product.query.get(product_id)
+        row = db.session.execute(
+            select(Product, ProductStats)
+            .outerjoin(ProductStats, ProductStats.product_id == Product.id)
+            .where(Product.id == product_id)
+        ).first()
 
-        if not product:
+        if not row:
             return jsonify({
                 "success": False,
                 "error": "Product not found"
             }), 404
+        product, stats = row
 
         product_data = {
             "id": product.id,
@@ -63,7 +152,12 @@ def get_product(product_id):
             "rating": float(product.rating) if product.rating is not None else None,
             "rating_count": float(product.rating_count) if product.rating_count is not None else None,
             "discount_percentage": product.discount_percentage,
-            "actual_price": product.actual_price
+            "actual_price": product.actual_price,
+            "total_reviews": stats.total_reviews if stats else 0,
+            "flagged_reviews": stats.flagged_reviews if stats else 0,
+            "fake_ratio": stats.fake_ratio if stats and stats.fake_ratio != NO_VALUE else None,
+            "adjusted_rating": stats.adjusted_rating if stats and stats.adjusted_rating != NO_VALUE else None,
+            "stats_updated_at": stats.updated_at.isoformat() if stats and stats.updated_at else None,
         }
 
         return jsonify({"success": True, "data": product_data}), 200
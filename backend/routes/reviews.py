@@ -1,140 +1,86 @@
-from flask import Blueprint, request, jsonify
-from ml_layer import behavioral_analysis, ml_model_predict
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from analysis import run_analysis, stream_analysis
 from extensions import db
-from models import Review, User
-from difflib import SequenceMatcher
-from datetime import datetime, timedelta
-from faker import Faker
-import re
+from collusion import graph
+import dedup_index
+import feature_store
+import jobs
+from rule_counters import counters
+from rules import clean_text, get_duplicate_score, compute_rules
+from models import AnalysisJob, Review, User
 import hashlib
+import io
+import ingest
+import json
+import metrics
+import ml_layer
+import product_stats
 import random
+import review_export
+import review_queue
 import uuid
+from datetime import datetime
+from response_cache import cached, response_cache
+from serialization import json_response, projection
+from sqlalchemy import select
 
 reviews_bp = Blueprint("reviews", __name__)
-fake = Faker()
-
-def clean_text(text: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9\s]", "", text.lower()).strip()
-
-def get_duplicate_score(text, existing_texts):
-    """Check similarity against past reviews (simple duplicate detector)."""
-    max_score = 0
-    for t in existing_texts:
-        score = SequenceMatcher(None, text, t).ratio()
-        max_score = max(max_score, score)
-    return max_score
-
-# --- Rule Helpers ---
-def check_rate_limit(user_id):
-    """Too many reviews from the same user in the last 5 minutes."""
-    five_min_ago = datetime.utcnow() - timedelta(minutes=5)
-    recent_reviews = Review.query.filter(
-        Review.user_id == user_id,
-        Review.timestamp >= five_min_ago
-    ).count()
-    return recent_reviews > 3  # arbitrary threshold
-
-def check_burst_activity(product_id):
-    """Too many reviews on the same product in the last 10 minutes."""
-    ten_min_ago = datetime.utcnow() - timedelta(minutes=10)
-    recent_reviews = Review.query.filter(
-        Review.product_id == product_id,
-        Review.timestamp >= ten_min_ago
-    ).count()
-    return recent_reviews > 10
-
-def is_vpn_ip(ip):
-    """Stub for VPN/proxy detection (replace with external API)."""
-    suspicious_ranges = ["10.", "192.168", "172.16"]  # private IP ranges as example
-    return any(ip.startswith(r) for r in suspicious_ranges)
-
-def check_same_device(device_fp, user_id):
-    """If same device fingerprint is linked to multiple users."""
-    other_reviews = Review.query.filter(
-        Review.device_fingerprint == device_fp,
-        Review.user_id != user_id
-    ).count()
-    return other_reviews > 0
 
-# -------------------------------
-# Compute Rules
-# -------------------------------
-def compute_rules(user, review_text, rating, ip, device_fp, duplicate_score, product_id):
-    rules = {
-        "rule_rate_limit": check_rate_limit(user.id),
-        "rule_new_account_extreme": False,
-        "rule_duplicate_text": False,
-        "rule_vpn_ip": is_vpn_ip(ip),
-        "rule_same_device": check_same_device(device_fp, user.id),
-        "rule_low_quality": False,
-        "rule_burst_activity": check_burst_activity(product_id),
-    }
-    flag_reasons = []
-
-    # Rule: new account extreme ratings
-    if user.created_at:
-        account_age_days = (datetime.utcnow() - user.created_at).days
-        if account_age_days < 7 and int(rating) in [1, 5]:
-            rules["rule_new_account_extreme"] = True
-            flag_reasons.append("new_account_extreme")
-
-    # Rule: low quality review
-    if len(review_text.split()) < 3:
-        rules["rule_low_quality"] = True
-        flag_reasons.append("low_quality")
-
-    # Rule: duplicate review
-    if duplicate_score > 0.8:
-        rules["rule_duplicate_text"] = True
-        flag_reasons.append("duplicate_text")
-
-    # Collect reasons
-    for k, v in rules.items():
-        if v:
-            flag_reasons.append(k)
-
-    return rules, ", ".join(set(flag_reasons))
+# Columns the list endpoint can return (?fields=...). IPs, fingerprints and
+# binary index columns are never listed.
+REVIEW_LIST_FIELDS = {
+    name: getattr(Review, name)
+    for name in (
+        "id", "product_id", "user_id", "rating", "review_text", "timestamp", "updated_at",
+        "flag_reasons", "duplicate_review_score", "is_fake_rule_based", "is_fake_ml", "ml_confidence",
+        "ml_model_version", "is_fake_behavioral", "behavioral_flags", "behavioral_score", "is_fake",
+        "label_source", "manual_label", "manual_label_source", "labeled_at",
+    )
+}
+REVIEW_LIST_DEFAULT_FIELDS = ["id", "product_id", "user_id", "rating", "review_text", "timestamp"]
+# In the default compact view (?view=full disables it) long text is cut to a preview
+# and flagged with <field>_truncated
+REVIEW_LIST_PREVIEWS = {"review_text": 1000}
 
+def _review_page_generations():
+    # Only per-product pages are cached server-side; the others still get ETags
+    product_id = request.args.get("product_id")
+    return [f"product:{product_id}", "analysis"] if product_id else None
 
 @reviews_bp.route("/", methods=["GET"])
+@cached(_review_page_generations)
 def get_reviews():
     try:
         cursor = request.args.get("cursor", None)
         limit = request.args.get("limit", 20, type=int)
         product_id = request.args.get("product_id", None)  # optional filter
 
-        query = Review.query.order_by(Review.id)
+        try:
+            columns = projection(REVIEW_LIST_FIELDS, REVIEW_LIST_DEFAULT_FIELDS, REVIEW_LIST_PREVIEWS)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        query = select(*columns).order_by(Review.id)
 
         # Filter by product if provided
         if product_id:
-            query = query.filter(Review.product_id == product_id)
+            query = query.where(Review.product_id == product_id)
 
         # Cursor-based pagination
         if cursor:
-            query = query.filter(Review.id > cursor)
-
-        reviews = query.limit(limit).all()
+            query = query.where(Review.id > cursor)
 
-        reviews_list = []
-        for r in reviews:
-            reviews_list.append({
-                "id": r.id,
-                "product_id": r.product_id,
-                "user_id": r.user_id,
-                "rating": float(r.rating) if r.rating is not None else None,
-                "review_text": r.review_text,
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None
-            })
+        reviews_list = [dict(row) for row in db.session.execute(query.limit(limit)).mappings()]
 
         # Determine next cursor
-        next_cursor = reviews[-1].id if reviews else None
+        next_cursor = reviews_list[-1]["id"] if reviews_list else None
 
-        return jsonify({
+        return json_response({
             "success": True,
             "data": reviews_list,
             "next_cursor": next_cursor,
             "limit": limit
-        }), 200
+        }, 200)
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -151,10 +97,59 @@ def get_review(review_id):
         "timestamp": r.timestamp
     })
 
+def _add_review_async(data, rating, clean_review_text, user_ip, device_fingerprint):
+    """Store the review as pending and queue it for scoring (see review_queue.py)."""
+    app = current_app._get_current_object()
+    if not review_queue.reserve(app):
+        response = jsonify({"success": False, "error": "Review queue is full, retry later"})
+        response.headers["Retry-After"] = str(app.config.get("REVIEW_QUEUE_RETRY_AFTER_SECONDS", 5))
+        return response, 503
+
+    try:
+        review = Review(
+            id=str(uuid.uuid4()),
+            product_id=data["product_id"],
+            user_id=data["user_id"],
+            review_text=data["review_text"],
+            rating=rating,
+            user_ip=user_ip,
+            device_fingerprint=device_fingerprint,
+            clean_review_text=clean_review_text,
+            label_source=review_queue.PENDING,
+        )
+        db.session.add(review)
+        # Counted as unflagged until scored
+        stats = product_stats.StatsDelta()
+        stats.add(review.product_id, rating, False)
+        stats.apply()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        review_queue.release()
+        raise
+    counters.record_review(review.id, review.user_id, review.product_id, device_fingerprint)
+    response_cache.invalidate_reviews([review.product_id])
+    review_queue.submit(app, review.id)
+
+    return jsonify({
+        "success": True,
+        "message": "Review accepted",
+        "id": review.id,
+        "status": review_queue.PENDING,
+        "status_url": f"/api/reviews/{review.id}/status",
+    }), 202
+
 @reviews_bp.route("/", methods=["POST"])
 def add_review():
+    """
+    Add a review. With `?async=1` it is stored and queued, and the response is
+    202 with its id; GET /<id>/status returns the verdict once it is scored.
+    """
     data = request.json
     rating = data.get("rating", 0)
+    missing = [f for f in ("user_id", "product_id", "review_text") if not data.get(f)]
+    if missing:
+        return jsonify({"success": False, "error": f"Missing required fields: {', '.join(missing)}"}), 400
 
     # Clean text
     clean_review_text = clean_text(data["review_text"])
@@ -165,18 +160,24 @@ def add_review():
         (str(user_ip) + request.headers.get("User-Agent", "")).encode()
     ).hexdigest()
 
-    # Duplicate check
-    existing_texts = [r.clean_review_text for r in Review.query.all() if r.clean_review_text]
-    duplicate_score = get_duplicate_score(clean_review_text, existing_texts)
+    if request.args.get("async", "0") in ("1", "true"):
+        return _add_review_async(data, rating, clean_review_text, user_ip, device_fingerprint)
+
+    # Duplicate check (only LSH candidates are compared exactly)
+    with metrics.stage("add_review", "duplicate_candidates"):
+        candidate_texts = dedup_index.find_candidate_texts(clean_review_text)
+    with metrics.stage("add_review", "duplicate_score"):
+        duplicate_score = get_duplicate_score(clean_review_text, candidate_texts)
 
     # Get user
-    
-    user = User.query.get(data["user_id"])
+    with metrics.stage("add_review", "user_lookup"):
+        user = User.query.get(data["user_id"])
 
     # Compute rules
-    rules, flag_reasons = compute_rules(
-        user, clean_review_text, rating, user_ip, device_fingerprint, duplicate_score, data["product_id"]
-    )
+    with metrics.stage("add_review", "rules"):
+        rules, flag_reasons = compute_rules(
+            user, clean_review_text, rating, user_ip, device_fingerprint, duplicate_score, data["product_id"]
+        )
 
     # Weighted score (weights can be tuned)
     weights = {
@@ -216,8 +217,20 @@ def add_review():
         label_source="rule_engine"
     )
 
+    with metrics.stage("add_review", "feature_vector"):
+        feature_store.set_review_features(new_review)
     db.session.add(new_review)
-    db.session.commit()
+    with metrics.stage("add_review", "dedup_index"):
+        dedup_index.index_review(new_review)
+    with metrics.stage("add_review", "product_stats"):
+        stats = product_stats.StatsDelta()
+        stats.add(data["product_id"], rating, is_fake_rule_based)
+        stats.apply()
+    with metrics.stage("add_review", "commit"):
+        db.session.commit()
+    counters.record_review(new_review.id, data["user_id"], data["product_id"], device_fingerprint)
+    graph.record_review(data["user_id"], device_fingerprint, user_ip, is_fake_rule_based)
+    response_cache.invalidate_reviews([data["product_id"]])
 
     return jsonify({
         "message": "Review added",
@@ -226,15 +239,147 @@ def add_review():
         "flag_reasons": flag_reasons
     }), 201
 
-@reviews_bp.route("/<int:review_id>", methods=["PUT"])
+@reviews_bp.route("/<string:review_id>/status", methods=["GET"])
+def get_review_status(review_id):
+    """Scoring state of a review and, once scored, every layer's verdict."""
+    review = Review.query.get(review_id)
+    if not review:
+        return jsonify({"success": False, "error": "Review not found"}), 404
+    state = review_queue.status(review)
+    data = {"id": review.id, "status": state}
+    if state == "scored":
+        flag = lambda value: int(value) if value is not None else None  # Numeric columns
+        data.update({
+            "is_fake_rule_based": flag(review.is_fake_rule_based),
+            "flag_reasons": review.flag_reasons,
+            "is_fake_ml": flag(review.is_fake_ml),
+            "ml_confidence": review.ml_confidence,
+            "ml_model_version": review.ml_model_version,
+            "is_fake_behavioral": flag(review.is_fake_behavioral),
+            "behavioral_flags": review.behavioral_flags,
+            "behavioral_score": review.behavioral_score,
+            "is_fake": flag(review.is_fake),
+        })
+    return jsonify({"success": True, "data": data}), 200
+
+@reviews_bp.route("/export", methods=["POST"])
+def export_reviews():
+    """
+    Stream reviews with their rule, ML and behavioral results as one Parquet
+    file (?format=parquet, default) or Arrow IPC stream (?format=arrow).
+
+    ?since=<ISO date> keeps reviews created/edited since then;
+    ?incremental=<name> only exports what changed since that export's
+    watermark, and moves the watermark once the whole body was sent.
+    ?vectors=1 adds the stored TF-IDF vectors.
+    """
+    fmt = request.args.get("format", "parquet")
+    if fmt not in review_export.FORMATS:
+        return jsonify({"success": False, "error": "format must be 'parquet' or 'arrow'"}), 400
+    row_group_size = request.args.get("row_group_size", review_export.EXPORT_ROW_GROUP_SIZE, type=int)
+    if row_group_size <= 0:
+        return jsonify({"success": False, "error": "row_group_size must be a positive integer"}), 400
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"success": False, "error": "since must be an ISO 8601 date or time"}), 400
+
+    try:
+        body = review_export.stream_export(
+            fmt=fmt,
+            since=since,
+            incremental_name=request.args.get("incremental"),
+            row_group_size=row_group_size,
+            include_vectors=request.args.get("vectors") == "1",
+        )
+    except RuntimeError as e:  # pyarrow missing
+        return jsonify({"success": False, "error": str(e)}), 501
+
+    mimetype, extension = (
+        ("application/vnd.apache.parquet", "parquet") if fmt == "parquet"
+        else ("application/vnd.apache.arrow.stream", "arrows")
+    )
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=reviews.{extension}"},
+    )
+
+@reviews_bp.route("/bulk", methods=["POST"])
+def add_reviews_bulk():
+    """
+    Import many reviews at once. The body is JSON lines (default) or CSV
+    (`?format=csv` or Content-Type text/csv) with one review per line.
+    """
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "jsonl")
+    if fmt not in ("jsonl", "csv"):
+        return jsonify({"success": False, "error": "format must be 'jsonl' or 'csv'"}), 400
+    chunk_size = request.args.get("chunk_size", 1000, type=int)
+    if chunk_size <= 0:
+        return jsonify({"success": False, "error": "chunk_size must be a positive integer"}), 400
+
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    records = ingest.parse_csv(lines) if fmt == "csv" else ingest.parse_jsonl(lines)
+    report = ingest.ingest_records(
+        records,
+        chunk_size=chunk_size,
+        default_ip=request.headers.get("X-Forwarded-For", request.remote_addr),
+        default_user_agent=request.headers.get("User-Agent", ""),
+    )
+    return jsonify({"success": report["failed"] == 0, "data": report}), 200
+
+@reviews_bp.route("/<string:review_id>", methods=["PUT"])
 def update_review(review_id):
     review = Review.query.get_or_404(review_id)
     data = request.json
-    review.review_text = data.get("review_text", review.review_text)
+    before = (review.product_id, review.rating, product_stats.is_flagged(review.is_fake, review.is_fake_rule_based))
+    if "review_text" in data and data["review_text"] != review.review_text:
+        review.review_text = data["review_text"]
+        review.clean_review_text = clean_text(review.review_text)
+        review.updated_at = db.func.now()
+        review.is_fake = None  # verdict is stale until the next analysis run
+        feature_store.set_review_features(review)
+        dedup_index.index_review(review)
     review.rating = data.get("rating", review.rating)
+    stats = product_stats.StatsDelta()
+    stats.change(before, (review.product_id, review.rating,
+                          product_stats.is_flagged(review.is_fake, review.is_fake_rule_based)))
+    stats.apply()
     db.session.commit()
+    response_cache.invalidate_reviews([review.product_id])
     return jsonify({"message": "Review updated"})
 
+@reviews_bp.route("/<string:review_id>/label", methods=["PUT"])
+def label_review(review_id):
+    """
+    Record a human label: {"is_fake": true|false|null, "source": "manual"}.
+    Stored apart from the pipeline's verdict columns, which analysis runs
+    overwrite; train-online-model learns from these labels. null clears it.
+    """
+    review = Review.query.get(review_id)
+    if not review:
+        return jsonify({"success": False, "error": "Review not found"}), 404
+    data = request.get_json(silent=True) or {}
+    if "is_fake" not in data or data["is_fake"] not in (True, False, None):
+        return jsonify({"success": False, "error": "is_fake must be true, false or null"}), 400
+    source = data.get("source", "manual")
+    if not isinstance(source, str) or not source or len(source) > 100:
+        return jsonify({"success": False, "error": "source must be a non-empty string of at most 100 characters"}), 400
+
+    labelled = data["is_fake"] is not None
+    review.manual_label = int(data["is_fake"]) if labelled else None
+    review.manual_label_source = source if labelled else None
+    review.labeled_at = review.results_updated_at = db.func.now()
+    db.session.commit()
+    response_cache.invalidate_reviews([review.product_id])
+    return jsonify({"success": True, "data": {
+        "id": review.id,
+        "manual_label": int(review.manual_label) if review.manual_label is not None else None,
+        "manual_label_source": review.manual_label_source,
+    }}), 200
+
 @reviews_bp.route("/<string:review_id>", methods=["DELETE"])
 def delete_review(review_id):
     try:
@@ -242,8 +387,18 @@ def delete_review(review_id):
         if not review:
             return jsonify({"success": False, "error": "Review not found"}), 404
 
+        review_key = (review.id, review.user_id, review.product_id, review.device_fingerprint)
+        graph_key = (review.user_id, review.device_fingerprint, review.user_ip, review.is_fake_rule_based)
+        dedup_index.remove_review(review.id)
+        stats = product_stats.StatsDelta()
+        stats.remove(review.product_id, review.rating,
+                     product_stats.is_flagged(review.is_fake, review.is_fake_rule_based))
+        stats.apply()
         db.session.delete(review)
         db.session.commit()
+        counters.forget_review(*review_key)
+        graph.forget_review(*graph_key)
+        response_cache.invalidate_reviews([review_key[2]])
 
         return jsonify({"success": True, "message": "Review deleted"}), 200
     except Exception as e:
@@ -253,81 +408,127 @@ def delete_review(review_id):
 
 @reviews_bp.route("/analyze_all", methods=["POST"])
 def analyze_all_reviews():
-    
-    already_analyzed = Review.query.filter(Review.is_fake.isnot(None)).count()
-
-    # if already_analyzed == 0:
-    #     reviews = Review.query.all()
-    # else:
-    #     reviews = Review.query.filter(Review.is_fake.is_(None)).all()
+    """
+    Run the ML + behavioral pipeline.
+
+    ?mode=full re-scores every review, ?mode=incremental only what changed
+    since the last run. Without a mode the first run is full, later runs
+    are incremental. ?workers=N scores on N processes (default
+    ANALYSIS_WORKERS, at most ANALYSIS_MAX_WORKERS).
+    """
+    mode = request.args.get("mode")
+    if mode not in (None, "full", "incremental"):
+        return jsonify({"success": False, "error": "mode must be 'full' or 'incremental'"}), 400
+    workers = request.args.get("workers", current_app.config.get("ANALYSIS_WORKERS", 1), type=int)
+    if workers is None or workers <= 0:
+        return jsonify({"success": False, "error": "workers must be a positive integer"}), 400
+    workers = min(workers, current_app.config.get("ANALYSIS_MAX_WORKERS", 1))
+
+    payload = run_analysis(mode, workers=workers)
+    if payload is None:
+        return jsonify({"message": "No new reviews to analyze"}), 200
 
-    reviews = Review.query.order_by(Review.timestamp.desc()).all()  
+    return jsonify(payload)
 
-    if not reviews:
-        return jsonify({"message": "No new reviews to analyze"}), 200
 
-    # ----- Layer 2 (ML predictions per review) -----
-    ml_results_map = {}
-    for review in reviews:
-        ml_results_map[review.id] = ml_model_predict(review.review_text)
-
-    # ----- Layer 3 (Behavioral analysis across ALL reviews) -----
-    # Convert all reviews (including old ones for context)
-    all_reviews = Review.query.all()
-    all_reviews_dict = [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "timestamp": r.timestamp,
-            "device_fingerprint": r.device_fingerprint,
-            "user_ip": r.user_ip,
-            "is_fake_rule_based": r.is_fake_rule_based,
-            "is_fake_ml": ml_results_map.get(r.id, {}).get("is_fake_ml") if r.id in ml_results_map else None,
-            "clean_review_text": r.clean_review_text or r.review_text,
-        }
-        for r in all_reviews
-    ]
-
-    behavioral_results_map = behavioral_analysis(all_reviews_dict)
-   
-
-    # ----- Final Decision and DB Update -----
-    results = []
-    flagged_users = set()
-
-    for review in reviews:
-        ml_results = ml_results_map[review.id]
-        behavioral_results = behavioral_results_map.get(review.id, {})
-
-        is_fake_final = (
-            review.is_fake_rule_based
-            or ml_results["is_fake_ml"]
-            or behavioral_results.get("is_fake_behavioral", False)
-        )
+@reviews_bp.route("/analyze_all/stream", methods=["POST"])
+def analyze_all_reviews_stream():
+    """
+    Full analysis streamed back as newline-delimited JSON.
 
-        review.is_fake = 1 if is_fake_final else 0
+    One {"type": "review", ...} line per review (same fields as the
+    all_reviews entries of /analyze_all), then a {"type": "summary"} line.
+    Results are committed chunk by chunk, so memory stays bounded.
+    """
+    chunk_size = request.args.get("chunk_size", 1000, type=int)
+    if chunk_size <= 0:
+        return jsonify({"success": False, "error": "chunk_size must be positive"}), 400
 
-        if is_fake_final:
-            flagged_users.add(review.user_id)
+    def generate():
+        for item in stream_analysis(chunk_size=chunk_size):
+            yield json.dumps(item) + "\n"
 
-        results.append({
-            "review_id": review.id,
-            "user_id": review.user_id,
-            "timestamp": review.timestamp.isoformat(),
-            "rule_based": review.is_fake_rule_based,
-            "ml": ml_results,
-            "behavioral": behavioral_results,
-            "is_fake_final": is_fake_final,
-        })
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-    db.session.commit()
 
+# -------------------------------
+# Background analysis jobs
+# -------------------------------
+@reviews_bp.route("/analyze_all/jobs", methods=["POST"])
+def submit_analysis_job():
+    data = request.get_json(silent=True) or {}
+    chunk_size = data.get("chunk_size")
+    if chunk_size is not None and (not isinstance(chunk_size, int) or chunk_size <= 0):
+        return jsonify({"success": False, "error": "chunk_size must be a positive integer"}), 400
+
+    job = jobs.submit_job(current_app._get_current_object(), chunk_size=chunk_size)
+    return jsonify({"success": True, "job_id": job.id, "status": job.status}), 202
+
+@reviews_bp.route("/analyze_all/jobs/<string:job_id>", methods=["GET"])
+def get_analysis_job(job_id):
+    job = AnalysisJob.query.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, "data": jobs.job_progress(job)}), 200
+
+@reviews_bp.route("/analyze_all/jobs/<string:job_id>/results", methods=["GET"])
+def get_analysis_job_results(job_id):
+    if not AnalysisJob.query.get(job_id):
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    cursor = request.args.get("cursor", None, type=int)
+    limit = request.args.get("limit", 100, type=int)
+    flagged_only = request.args.get("flagged_only", "false").lower() in ("1", "true")
+
+    results, next_cursor = jobs.job_results_page(job_id, cursor=cursor, limit=limit, flagged_only=flagged_only)
     return jsonify({
-        "message": "Analysis complete",
-        # "mode": "full" if already_analyzed == 0 else "incremental",
-        "flagged_reviews": [r for r in results if r["is_fake_final"]],
-        "flagged_users": list(flagged_users),
-        "total_analyzed": len(reviews),
-        "fake_count": len([r for r in results if r["is_fake_final"]]),
-        "all_reviews": results
-    })
+        "success": True,
+        "data": results,
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
+
+@reviews_bp.route("/analyze_all/jobs/<string:job_id>/cancel", methods=["POST"])
+def cancel_analysis_job(job_id):
+    job = AnalysisJob.query.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    if not jobs.request_cancel(job):
+        return jsonify({"success": False, "error": f"Job is already {job.status}"}), 409
+    return jsonify({"success": True, "data": jobs.job_progress(job)}), 200
+
+
+# -------------------------------
+# ML model
+# -------------------------------
+def _model_info():
+    current = ml_layer.registry.get()
+    return {
+        "loaded": current is not None,
+        "version": current.version if current else None,
+        "backend": ml_layer.registry.backend,
+        "prediction_cache": ml_layer.prediction_cache.stats(),
+    }
+
+@reviews_bp.route("/model", methods=["GET"])
+def get_model():
+    return jsonify({"success": True, "data": _model_info()}), 200
+
+@reviews_bp.route("/model/cache", methods=["GET"])
+def get_prediction_cache_stats():
+    return jsonify({"success": True, "data": ml_layer.prediction_cache.stats()}), 200
+
+@reviews_bp.route("/model/reload", methods=["POST"])
+def reload_model():
+    """
+    Re-read the configured model files and swap them in without a restart.
+    This process reloads now; the other worker processes follow within
+    ML_RELOAD_CHECK_SECONDS (see ml_layer.ModelRegistry).
+    """
+    previous = ml_layer.registry.version
+    try:
+        ml_layer.registry.reload()
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Model reload failed: {e}"}), 500
+    ml_layer.registry.request_reload_everywhere()
+    return jsonify({"success": True, "previous_version": previous, "data": _model_info()}), 200
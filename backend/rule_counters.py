@@ -0,0 +1,218 @@
+# rule_counters.py
+"""
+In-process sliding-window counters for the per-request rule checks.
+
+add_review used to issue three COUNT queries per insert:
+  - rule_rate_limit:     reviews by the user in the last 5 minutes
+  - rule_burst_activity: reviews on the product in the last 10 minutes
+  - rule_same_device:    reviews on the device by any other user (all time)
+
+RuleCounters answers the same questions from memory. Windows keep the
+(review id -> timestamp) events of each key in insertion order and drop
+expired ones from the front, so a check is amortized O(1) and deletes are
+exact. Device ownership is a per-device Counter of users.
+
+The counters warm themselves from the database on the first request and are
+updated by add_review/delete_review. While cold (or disabled), every check returns
+None and the caller falls back to SQL. State is per process: with several
+worker processes each one only sees its own inserts after warm-up and the
+rule outcomes would drift from the SQL checks. RULE_COUNTERS_ENABLED is
+therefore only honoured when WEB_CONCURRENCY is 1; reviews imported by
+another process (`flask import-reviews`) are not seen until a restart.
+"""
+import logging
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Review
+
+logger = logging.getLogger(__name__)
+
+USER_WINDOW = timedelta(minutes=5)
+PRODUCT_WINDOW = timedelta(minutes=10)
+SWEEP_EVERY = 1000  # inserts between sweeps of keys whose windows have expired
+
+
+class SlidingWindowCounter:
+    """Events per key inside a trailing time window."""
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self._events = {}  # key -> OrderedDict(review_id -> timestamp)
+
+    def _prune(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        cutoff = now - self.window
+        while events and next(iter(events.values())) < cutoff:
+            events.popitem(last=False)
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def add(self, key, review_id, timestamp):
+        self._events.setdefault(key, OrderedDict())[review_id] = timestamp
+
+    def remove(self, key, review_id):
+        events = self._events.get(key)
+        if events is not None:
+            events.pop(review_id, None)
+            if not events:
+                del self._events[key]
+
+    def count(self, key, now, exclude_id=None) -> int:
+        """Events for `key` with timestamp >= now - window (not counting review exclude_id)."""
+        events = self._prune(key, now)
+        if not events:
+            return 0
+        return len(events) - (exclude_id in events)
+
+    def sweep(self, now):
+        for key in list(self._events):
+            self._prune(key, now)
+
+    def clear(self):
+        self._events.clear()
+
+
+class RuleCounters:
+    def __init__(self):
+        self.enabled = False
+        self.warm = False
+        self._lock = threading.Lock()
+        self._warm_failed = False
+        self._inserts = 0
+        self.by_user = SlidingWindowCounter(USER_WINDOW)
+        self.by_product = SlidingWindowCounter(PRODUCT_WINDOW)
+        self.device_users = {}  # device_fingerprint -> Counter(user_id -> review count)
+
+    # -------------------------------
+    # Warm-up
+    # -------------------------------
+    def _load(self):
+        now = datetime.utcnow()
+        self.by_user.clear()
+        self.by_product.clear()
+        self.device_users = {}
+
+        recent = (
+            db.session.query(Review.id, Review.user_id, Review.product_id, Review.timestamp)
+            .filter(Review.timestamp >= now - max(USER_WINDOW, PRODUCT_WINDOW))
+            .order_by(Review.timestamp)
+        )
+        for review_id, user_id, product_id, timestamp in recent:
+            self.by_user.add(user_id, review_id, timestamp)
+            self.by_product.add(product_id, review_id, timestamp)
+
+        pairs = (
+            db.session.query(Review.device_fingerprint, Review.user_id, func.count(Review.id))
+            .filter(Review.device_fingerprint.isnot(None))
+            .group_by(Review.device_fingerprint, Review.user_id)
+        )
+        for device, user_id, count in pairs:
+            self.device_users.setdefault(device, Counter())[user_id] = count
+
+    def ensure_warm(self) -> bool:
+        """Warm from the DB once (must be called inside an app context)."""
+        if self.warm or not self.enabled or self._warm_failed:
+            return self.warm
+        with self._lock:
+            if self.warm:
+                return True
+            try:
+                self._load()
+                self.warm = True
+            except Exception:
+                logger.warning("Rule counters could not be warmed; using SQL", exc_info=True)
+                db.session.rollback()
+                self._warm_failed = True
+        return self.warm
+
+    def reset(self):
+        """Drop all state; the next check warms again from the DB."""
+        with self._lock:
+            self.warm = False
+            self._warm_failed = False
+            self.by_user.clear()
+            self.by_product.clear()
+            self.device_users = {}
+
+    # -------------------------------
+    # Checks (None = cold, use SQL)
+    # -------------------------------
+    def recent_user_reviews(self, user_id, exclude_id=None):
+        if not self.ensure_warm():
+            return None
+        with self._lock:
+            return self.by_user.count(user_id, datetime.utcnow(), exclude_id)
+
+    def recent_product_reviews(self, product_id, exclude_id=None):
+        if not self.ensure_warm():
+            return None
+        with self._lock:
+            return self.by_product.count(product_id, datetime.utcnow(), exclude_id)
+
+    def device_used_by_other_user(self, device_fp, user_id):
+        if not self.ensure_warm():
+            return None
+        with self._lock:
+            users = self.device_users.get(device_fp)
+            if not users:
+                return False
+            # SQL `user_id != :uid` never matches NULL user ids
+            return any(u != user_id and u is not None for u in users)
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def record_review(self, review_id, user_id, product_id, device_fp, timestamp=None):
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:  # waits for an in-progress warm-up instead of dropping the event
+            if not self.warm:
+                return
+            self.by_user.add(user_id, review_id, timestamp)
+            self.by_product.add(product_id, review_id, timestamp)
+            if device_fp is not None:
+                self.device_users.setdefault(device_fp, Counter())[user_id] += 1
+
+            self._inserts += 1
+            if self._inserts % SWEEP_EVERY == 0:
+                now = datetime.utcnow()
+                self.by_user.sweep(now)
+                self.by_product.sweep(now)
+
+    def forget_review(self, review_id, user_id, product_id, device_fp):
+        with self._lock:
+            if not self.warm:
+                return
+            self.by_user.remove(user_id, review_id)
+            self.by_product.remove(product_id, review_id)
+            users = self.device_users.get(device_fp)
+            if users is not None and users.get(user_id):
+                users[user_id] -= 1
+                if users[user_id] <= 0:
+                    del users[user_id]
+                if not users:
+                    del self.device_users[device_fp]
+
+
+counters = RuleCounters()
+
+
+def init_app(app):
+    """Warm the counters when the process serves its first request."""
+    counters.enabled = app.config.get("RULE_COUNTERS_ENABLED", True)
+    if counters.enabled and app.config.get("WEB_CONCURRENCY", 1) > 1:
+        logger.warning("Rule counters are per process and WEB_CONCURRENCY=%s; "
+                       "the rule checks use SQL", app.config["WEB_CONCURRENCY"])
+        counters.enabled = False
+
+    @app.before_request
+    def _warm_rule_counters():
+        counters.ensure_warm()
@@ -0,0 +1,134 @@
+# rules.py
+"""Layer 1: per-review rule checks run when a review is ingested."""
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+import re
+
+import metrics
+from models import Review
+from rule_counters import counters
+
+RATE_LIMIT_WINDOW = timedelta(minutes=5)
+RATE_LIMIT_MAX_REVIEWS = 3
+BURST_WINDOW = timedelta(minutes=10)
+BURST_MAX_REVIEWS = 10
+
+def clean_text(text: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9\s]", "", text.lower()).strip()
+
+def get_duplicate_score(text, existing_texts):
+    """Check similarity against past reviews (simple duplicate detector)."""
+    max_score = 0
+    for t in existing_texts:
+        score = SequenceMatcher(None, text, t).ratio()
+        max_score = max(max_score, score)
+    return max_score
+
+# --- Rule Helpers ---
+def check_rate_limit(user_id, exclude_id=None, at=None):
+    """Too many reviews from the same user in the 5 minutes up to `at` (default: now)."""
+    # The counters only know the window ending now
+    recent_reviews = counters.recent_user_reviews(user_id, exclude_id) if at is None else None
+    if recent_reviews is None:  # counters cold or a past window -> SQL
+        five_min_ago = (at or datetime.utcnow()) - RATE_LIMIT_WINDOW
+        query = Review.query.filter(
+            Review.user_id == user_id,
+            Review.timestamp >= five_min_ago
+        )
+        if at is not None:
+            query = query.filter(Review.timestamp <= at)
+        if exclude_id is not None:
+            query = query.filter(Review.id != exclude_id)
+        recent_reviews = query.count()
+    return recent_reviews > RATE_LIMIT_MAX_REVIEWS  # arbitrary threshold
+
+def check_burst_activity(product_id, exclude_id=None, at=None):
+    """Too many reviews on the same product in the 10 minutes up to `at` (default: now)."""
+    recent_reviews = counters.recent_product_reviews(product_id, exclude_id) if at is None else None
+    if recent_reviews is None:  # counters cold or a past window -> SQL
+        ten_min_ago = (at or datetime.utcnow()) - BURST_WINDOW
+        query = Review.query.filter(
+            Review.product_id == product_id,
+            Review.timestamp >= ten_min_ago
+        )
+        if at is not None:
+            query = query.filter(Review.timestamp <= at)
+        if exclude_id is not None:
+            query = query.filter(Review.id != exclude_id)
+        recent_reviews = query.count()
+    return recent_reviews > BURST_MAX_REVIEWS
+
+def is_vpn_ip(ip):
+    """Stub for VPN/proxy detection (replace with external API)."""
+    suspicious_ranges = ["10.", "192.168", "172.16"]  # private IP ranges as example
+    return any(ip.startswith(r) for r in suspicious_ranges)
+
+def check_same_device(device_fp, user_id):
+    """If same device fingerprint is linked to multiple users."""
+    shared = counters.device_used_by_other_user(device_fp, user_id)
+    if shared is not None:
+        return shared
+    other_reviews = Review.query.filter(
+        Review.device_fingerprint == device_fp,
+        Review.user_id != user_id
+    ).count()
+    return other_reviews > 0
+
+# -------------------------------
+# Compute Rules
+# -------------------------------
+def compute_rules(user, review_text, rating, ip, device_fp, duplicate_score, product_id, checks=None,
+                  exclude_id=None, at=None):
+    """
+    Evaluate every rule for one review.
+
+    `checks` may carry precomputed rule_rate_limit / rule_same_device /
+    rule_burst_activity values (bulk ingestion computes them for a whole
+    batch at once); missing ones are looked up per review. `exclude_id` is
+    the review's own id when it is already stored (async ingestion), so the
+    window counts do not include it. `at` is the time the review was
+    submitted, when it is scored later; windows and account age are measured
+    up to it instead of now.
+    """
+    checks = checks or {}
+
+    def check(rule, fn, *args):
+        if rule in checks:
+            return checks[rule]
+        with metrics.rule_check_seconds.time(rule=rule):
+            return fn(*args)
+
+    rules = {
+        "rule_rate_limit": check("rule_rate_limit", check_rate_limit, user.id, exclude_id, at),
+        "rule_new_account_extreme": False,
+        "rule_duplicate_text": False,
+        "rule_vpn_ip": check("rule_vpn_ip", is_vpn_ip, ip),
+        "rule_same_device": check("rule_same_device", check_same_device, device_fp, user.id),
+        "rule_low_quality": False,
+        "rule_burst_activity": check("rule_burst_activity", check_burst_activity, product_id, exclude_id, at),
+    }
+    flag_reasons = []
+
+    # Rule: new account extreme ratings
+    if user.created_at:
+        account_age_days = ((at or datetime.utcnow()) - user.created_at).days
+        if account_age_days < 7 and int(rating) in [1, 5]:
+            rules["rule_new_account_extreme"] = True
+            flag_reasons.append("new_account_extreme")
+
+    # Rule: low quality review
+    if len(review_text.split()) < 3:
+        rules["rule_low_quality"] = True
+        flag_reasons.append("low_quality")
+
+    # Rule: duplicate review
+    if duplicate_score > 0.8:
+        rules["rule_duplicate_text"] = True
+        flag_reasons.append("duplicate_text")
+
+    # Collect reasons
+    for k, v in rules.items():
+        if v:
+            flag_reasons.append(k)
+
+    return rules, ", ".join(set(flag_reasons))
@@ -0,0 +1,100 @@
+"""behavioral_analysis (reference) vs the columnar rule-mask implementations."""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+import ml_layer
+
+
+def generate_reviews(seed, n_reviews=3000, n_users=120, n_devices=80, n_ips=60):
+    """
+    Reviews on a coarse time grid, so many of a user's reviews share a
+    timestamp or sit exactly BURST_WINDOW apart (the tie cases), with some
+    missing devices/IPs.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    reviews = []
+    for i in range(n_reviews):
+        reviews.append({
+            "id": f"r{i}",
+            "user_id": f"u{rng.randrange(n_users)}",
+            "timestamp": start + timedelta(minutes=5 * rng.randrange(400)),
+            "device_fingerprint": f"d{rng.randrange(n_devices)}" if rng.random() > 0.05 else None,
+            "user_ip": f"ip{rng.randrange(n_ips)}" if rng.random() > 0.05 else None,
+            "is_fake_rule_based": rng.random() < 0.2,
+            "is_fake_ml": rng.random() < 0.1 if rng.random() > 0.1 else None,
+            "clean_review_text": "text",
+        })
+    return reviews
+
+
+def generate_rings(seed, n_users=120):
+    rng = random.Random(seed)
+    members = rng.sample(range(n_users), 15)
+    return {f"u{u}": {"ring_id": f"ring-{u % 3}", "size": 5} for u in members}
+
+
+def _shared_sets(reviews):
+    users_per_device, users_per_ip = defaultdict(set), defaultdict(set)
+    for r in reviews:
+        users_per_device[r["device_fingerprint"]].add(r["user_id"])
+        users_per_ip[r["user_ip"]].add(r["user_id"])
+    return (
+        {d for d, users in users_per_device.items() if len(users) > ml_layer.SHARED_DEVICE_MAX_USERS},
+        {ip for ip, users in users_per_ip.items() if len(users) > ml_layer.SHARED_IP_MAX_USERS},
+    )
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("with_rings", ["none", "empty", "members"])
+def test_rows_match_reference(seed, with_rings):
+    reviews = generate_reviews(seed)
+    rings = {"none": None, "empty": {}, "members": generate_rings(seed)}[with_rings]
+
+    expected = ml_layer.behavioral_analysis(reviews, rings=rings)
+    got = ml_layer.behavioral_analysis_rows(ml_layer.behavioral_rows_from_dicts(reviews), rings=rings)
+
+    assert list(got) == list(expected)
+    assert got == expected
+
+
+def test_reference_covers_every_rule():
+    reviews = generate_reviews(1)
+    results = ml_layer.behavioral_analysis(reviews, rings=generate_rings(1))
+    fired = {flag for result in results.values() for flag in result["flags"]}
+    assert fired == set(ml_layer.BEHAVIORAL_FLAGS)
+
+
+def test_exact_window_is_not_a_burst():
+    start = datetime(2024, 1, 1)
+    reviews = [
+        {"id": "a", "user_id": "u", "timestamp": start, "device_fingerprint": "d", "user_ip": "ip"},
+        {"id": "b", "user_id": "u", "timestamp": start, "device_fingerprint": "d", "user_ip": "ip"},
+        {"id": "c", "user_id": "u", "timestamp": start + ml_layer.BURST_WINDOW, "device_fingerprint": "d",
+         "user_ip": "ip"},
+    ]
+    expected = ml_layer.behavioral_analysis(reviews)
+    # Same timestamp: the later one in input order is the burst
+    assert expected["a"]["flags"] == [] and expected["b"]["flags"] == ["burst_activity"]
+    assert expected["c"]["flags"] == []
+    assert ml_layer.behavioral_analysis_rows(ml_layer.behavioral_rows_from_dicts(reviews)) == expected
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_per_user_blocks_match_reference(seed):
+    reviews = generate_reviews(seed)
+    rings = generate_rings(seed)
+    shared_devices, shared_ips = _shared_sets(reviews)
+    expected = ml_layer.behavioral_analysis(reviews, rings=rings)
+
+    by_user = defaultdict(list)
+    for r in reviews:
+        by_user[r["user_id"]].append(r)
+    got = {}
+    for block in by_user.values():
+        got.update(ml_layer.user_behavioral_analysis(block, shared_devices, shared_ips, rings))
+
+    assert got == expected
@@ -0,0 +1,76 @@
+"""ml_model_predict with ML_BACKEND=compiled vs the pickled model it was compiled from."""
+import os
+
+import pytest
+
+import ml_layer
+from compiled_model import CompiledModel, check_parity, compile_model
+
+pytest.importorskip("sklearn")
+
+# Fixed corpus: ordinary reviews plus the tokenizer edge cases (empty text,
+# punctuation only, digits, non-ASCII, repeated and unknown words)
+CORPUS = [
+    "This product is amazing, best purchase I have made all year!!!",
+    "Battery broke after one week. Terrible quality, do not buy.",
+    "Good value for the price; shipping was fast and the box was intact.",
+    "ok",
+    "",
+    "!!! ??? ...",
+    "5 stars 5 stars 5 stars 5 stars 5 stars",
+    "Worst worst worst worst worst experience ever",
+    "Café crème, naïve façade — not great, not terrible",
+    "The the the and a of to in it is",
+    "qwertyuiop asdfghjkl zxcvbnm",
+    "Received a replacement after 2 weeks, the 2nd unit works fine at 100%",
+    "I love it! " * 50,
+    "Cheap plastic, stopped charging, refund requested; seller never replied.",
+]
+
+
+@pytest.fixture
+def predict(tmp_path, monkeypatch):
+    """predict(backend) -> (ml_model_predict per text, ml_model_predict_batch) on a fresh registry."""
+    if not (os.path.exists(ml_layer.MODEL_PATH) and os.path.exists(ml_layer.VECTORIZER_PATH)):
+        pytest.skip("pickled model files missing")
+    compiled_dir = str(tmp_path / "compiled")
+    loaded = ml_layer.load_ml_model()
+    compile_model(loaded, compiled_dir, parity_texts=[ml_layer.clean_text(t) for t in CORPUS])
+    # Every call must reach the model, not a cached score
+    monkeypatch.setattr(ml_layer.prediction_cache, "max_entries", 0)
+    monkeypatch.setattr(ml_layer.prediction_cache, "persistent", False)
+
+    def run(backend):
+        monkeypatch.setattr(ml_layer, "registry", ml_layer.ModelRegistry(backend=backend,
+                                                                         compiled_model_dir=compiled_dir))
+        return [ml_layer.ml_model_predict(text) for text in CORPUS], ml_layer.ml_model_predict_batch(CORPUS)
+    return run
+
+
+def _assert_same(expected, actual):
+    assert len(expected) == len(actual)
+    for text, want, got in zip(CORPUS, expected, actual):
+        assert got["is_fake_ml"] == want["is_fake_ml"], text
+        assert got["confidence"] == pytest.approx(want["confidence"], abs=1e-9), text
+        assert got["model_version"] == want["model_version"], text
+
+
+def test_compiled_matches_pickle(predict):
+    pickle_single, pickle_batch = predict("pickle")
+    compiled_single, compiled_batch = predict("compiled")
+    assert isinstance(ml_layer.registry.get().model, CompiledModel)
+    _assert_same(pickle_single, compiled_single)
+    _assert_same(pickle_batch, compiled_batch)
+    _assert_same(pickle_single, pickle_batch)
+
+
+def test_empty_parity_corpus_is_refused(tmp_path):
+    if not (os.path.exists(ml_layer.MODEL_PATH) and os.path.exists(ml_layer.VECTORIZER_PATH)):
+        pytest.skip("pickled model files missing")
+    loaded = ml_layer.load_ml_model()
+    out_dir = tmp_path / "compiled"
+    with pytest.raises(ValueError, match="empty"):
+        compile_model(loaded, str(out_dir), parity_texts=[])
+    assert not out_dir.exists()
+    with pytest.raises(ValueError, match="empty"):
+        check_parity(loaded, None, [])
@@ -0,0 +1,99 @@
+"""Duplicate scores through the LSH index vs get_duplicate_score over every review."""
+import random
+
+import pytest
+from flask import Flask
+
+import dedup_index
+from extensions import db
+from models import Review
+from rules import get_duplicate_score
+
+WORDS = (
+    "great good bad awful love hate quality price fast slow shipping arrived broken works "
+    "perfectly amazing cheap product battery screen sound gr8 ok nice value seller refund"
+).split()
+SHORT = ["gr8", "ok", "good", "nice", "gr8 product", "ok ok", "love it", "bad", "wow", "5 stars"]
+
+
+def _edit(rng, text):
+    """One random character insert, delete or substitution."""
+    i = rng.randrange(len(text) + 1)
+    op = rng.choice("ids") if text else "i"
+    c = rng.choice("abcdefghijklmnopqrstuvwxyz0123456789 ")
+    if op == "i":
+        return text[:i] + c + text[i:]
+    i = min(i, len(text) - 1)
+    return text[:i] + (c if op == "s" else "") + text[i + 1:]
+
+
+def generate_corpus(seed, n_long=120):
+    rng = random.Random(seed)
+    texts = list(SHORT) + [_edit(rng, t) for t in SHORT]
+    for _ in range(n_long):
+        texts.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))))
+    return texts
+
+
+def generate_queries(seed, corpus, n=80):
+    rng = random.Random(seed + 1000)
+    queries = list(SHORT)
+    for _ in range(n):
+        text = rng.choice(corpus)
+        for _ in range(rng.choice([1, 1, 2])):
+            text = _edit(rng, text)
+        queries.append(text.strip())
+    return [q for q in queries if q]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'reviews.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def _index(corpus):
+    for i, text in enumerate(corpus):
+        review = Review(id=f"r{i:05d}", review_text=text, clean_review_text=text)
+        db.session.add(review)
+        dedup_index.index_review(review)
+    db.session.commit()
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_scores_match_brute_force(app, seed):
+    corpus = generate_corpus(seed)
+    _index(corpus)
+
+    queries = generate_queries(seed, corpus)
+    batch = dedup_index.find_candidate_texts_batch(queries)
+    for query, batch_candidates in zip(queries, batch):
+        expected = get_duplicate_score(query, corpus)
+        for candidates in (dedup_index.find_candidate_texts(query), batch_candidates):
+            got = get_duplicate_score(query, candidates)
+            assert got <= expected
+            # The duplicate_text rule (> 0.8) and the stored score of every
+            # near-duplicate match the comparison with all reviews
+            if expected > 0.8:
+                assert got == expected, query
+
+
+def test_short_near_duplicates_are_candidates(app):
+    _index(["gr8", "good", "gr8 product", "love it"])
+    assert "gr8" in dedup_index.find_candidate_texts("gr88")
+    assert "good" in dedup_index.find_candidate_texts("goood")
+    assert "gr8 product" in dedup_index.find_candidate_texts("gr8 prodct")
+    assert "love it" in dedup_index.find_candidate_texts("love itt")
+
+
+def test_popular_bucket_keeps_the_best_match(app):
+    # More exact-token neighbours than MAX_CANDIDATES share the query's buckets
+    filler = [f"battery works great value {i}" for i in range(3 * dedup_index.MAX_CANDIDATES)]
+    _index(filler + ["battery works great valve"])
+    candidates = dedup_index.find_candidate_texts("battery works great valve!")
+    assert len(candidates) == dedup_index.MAX_CANDIDATES
+    assert "battery works great valve" in candidates
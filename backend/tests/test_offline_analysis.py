@@ -0,0 +1,68 @@
+"""flask analyze (analysis.run_offline_analysis) on reviews that have no user."""
+import itertools
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import analysis
+import ml_layer
+from extensions import db
+from models import AnalysisState, Product, Review, User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    if not (os.path.exists(ml_layer.MODEL_PATH) and os.path.exists(ml_layer.VECTORIZER_PATH)):
+        pytest.skip("pickled model files missing")
+    monkeypatch.setattr(ml_layer.prediction_cache, "persistent", False)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'reviews.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Product(id="p0", name="product"))
+        start = datetime(2024, 1, 1)
+        for u in range(4):
+            db.session.add(User(id=f"u{u}", user_name=f"u{u}"))
+            for i in range(3):
+                db.session.add(_review(f"r{u}-{i}", f"u{u}", start + timedelta(hours=i)))
+        # The NULL-user tail: more reviews than one page
+        for i in range(5):
+            db.session.add(_review(f"anon-{i}", None, start + timedelta(minutes=i)))
+        db.session.commit()
+        yield app
+
+
+def _review(review_id, user_id, timestamp):
+    return Review(
+        id=review_id, user_id=user_id, product_id="p0", rating=5, timestamp=timestamp,
+        review_text="great product would buy again", clean_review_text="great product would buy again",
+        is_fake_rule_based=0, user_ip="10.0.0.1", device_fingerprint=f"device-{user_id}",
+    )
+
+
+def test_null_user_reviews_are_scored_once(app):
+    with app.app_context():
+        chunks = list(itertools.islice(analysis.iter_offline_chunks(chunk_size=2), 50))
+        assert len(chunks) < 50, "offline pass did not terminate"
+
+        scored = [r["review_id"] for chunk in chunks for r in chunk["results"]]
+        assert sorted(scored) == sorted(review_id for (review_id,) in db.session.query(Review.id))
+        assert chunks[-1]["last_user_id"] is None
+        assert {r["review_id"] for r in chunks[-1]["results"]} == {f"anon-{i}" for i in range(5)}
+        assert Review.query.filter(Review.user_id.is_(None), Review.is_fake.is_(None)).count() == 0
+
+
+def test_resume_scores_the_null_user_tail(app):
+    with app.app_context():
+        # An earlier run committed every user but not the final pass
+        name = analysis.offline_state_name()
+        db.session.add(AnalysisState(name=name, checkpoint_user_id="u3"))
+        db.session.commit()
+
+        totals = analysis.run_offline_analysis(chunk_size=2)
+        assert totals["resumed_after_user"] == "u3"
+        assert totals["analyzed"] == 5
+        assert analysis.get_watermark(name).checkpoint_user_id is None
@@ -0,0 +1,80 @@
+"""parallel_scoring on a forked pool vs the serial functions it replaces."""
+import os
+
+import pytest
+
+import ml_layer
+import parallel_scoring
+from test_behavioral_parity import generate_reviews, generate_rings
+
+WORKERS = 3
+
+pytestmark = pytest.mark.skipif(not parallel_scoring.fork_available(), reason="needs the fork start method")
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Force real pools on any runner; returns the list of pool sizes forked."""
+    monkeypatch.setattr(parallel_scoring.os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(parallel_scoring, "PARALLEL_MIN_ROWS", 1)
+    monkeypatch.setattr(parallel_scoring, "ML_MIN_BATCH_SIZE", 1)
+    forked = []
+    forked_pool = parallel_scoring._forked_pool
+
+    def recording_forked_pool(workers, n_tasks=None, **inherited):
+        forked.append(parallel_scoring._pool_size(workers, n_tasks))
+        return forked_pool(workers, n_tasks, **inherited)
+    monkeypatch.setattr(parallel_scoring, "_forked_pool", recording_forked_pool)
+    return forked
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+@pytest.mark.parametrize("with_rings", [False, True])
+def test_behavioral_rows_match_serial(pools, seed, with_rings):
+    rows = ml_layer.behavioral_rows_from_dicts(generate_reviews(seed))
+    rings = generate_rings(seed) if with_rings else None
+
+    expected = ml_layer.behavioral_analysis_rows(rows, rings=rings)
+    got = parallel_scoring.behavioral_rows(rows, rings=rings, workers=WORKERS)
+
+    assert max(pools) >= 2
+    assert list(got) == list(expected)
+    assert got == expected
+
+
+@pytest.fixture
+def texts(monkeypatch):
+    if not (os.path.exists(ml_layer.MODEL_PATH) and os.path.exists(ml_layer.VECTORIZER_PATH)):
+        pytest.skip("pickled model files missing")
+    # Every call must reach the model, not a cached score
+    monkeypatch.setattr(ml_layer.prediction_cache, "max_entries", 0)
+    monkeypatch.setattr(ml_layer.prediction_cache, "persistent", False)
+    monkeypatch.setattr(ml_layer, "registry", ml_layer.ModelRegistry(backend="pickle"))
+    monkeypatch.setattr(parallel_scoring, "registry", ml_layer.registry)
+    words = "great bad awful good love hate quality price fast slow shipping broken works cheap".split()
+    return [" ".join(words[(i * 7 + j) % len(words)] for j in range(2 + i % 9)) for i in range(200)]
+
+
+def _assert_same(expected, actual):
+    assert len(expected) == len(actual)
+    for want, got in zip(expected, actual):
+        assert got["is_fake_ml"] == want["is_fake_ml"]
+        assert got["confidence"] == want["confidence"]
+
+
+def test_predict_batch_matches_serial(pools, texts):
+    expected = ml_layer.ml_model_predict_batch(texts, batch_size=50)
+    got = parallel_scoring.predict_batch(texts, workers=WORKERS, batch_size=50)
+
+    assert max(pools) >= 2
+    _assert_same(expected, got)
+
+
+def test_scoring_pool_matches_serial(pools, texts):
+    expected = ml_layer.ml_model_predict_batch(texts, batch_size=50)
+    with parallel_scoring.scoring_pool(WORKERS) as pool:
+        assert pool is not None
+        got = parallel_scoring.predict_batch(texts, workers=WORKERS, batch_size=50, pool=pool)
+
+    assert max(pools) >= 2
+    _assert_same(expected, got)
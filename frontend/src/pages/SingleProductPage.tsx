@@ -22,7 +22,7 @@ export default function SingleProduct() {
   
   useEffect(() => {
     fetchSingleProduct(productId);
-    fetchReviews(productId, true);
+    fetchReviews(productId, true, "full"); // whole review text, not the list preview
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
@@ -6,6 +6,7 @@ export interface Review {
   user_id?: string;
   rating: number;
   review_text: string;
+  review_text_truncated?: boolean;
   timestamp: string;
 }
 
@@ -16,7 +17,7 @@ interface ReviewState {
   nextCursor: string | null;
   limit: number;
 
-  fetchReviews: (productId?: string, reset?: boolean) => Promise<void>;
+  fetchReviews: (productId?: string, reset?: boolean, view?: "compact" | "full") => Promise<void>;
   fetchSingleReview: (reviewId: string) => Promise<void>;
   addReview: (review: Omit<Review, "id" | "timestamp">) => Promise<void>;
   updateReview: (reviewId: string, updates: Partial<Review>) => Promise<void>;
@@ -31,7 +32,7 @@ export const useReviewStore = create<ReviewState>((set, get) => ({
   limit: 10,
 
   // Fetch reviews (supports product filter + cursor pagination)
-  fetchReviews: async (productId, reset = false) => {
+  fetchReviews: async (productId, reset = false, view = "compact") => {
     try {
       set({ loading: true });
 
@@ -42,6 +43,8 @@ export const useReviewStore = create<ReviewState>((set, get) => ({
       url.searchParams.append("limit", String(limit));
       if (cursor) url.searchParams.append("cursor", cursor);
       if (productId) url.searchParams.append("product_id", productId);
+      // The compact view cuts long review_text (review_text_truncated is set)
+      if (view !== "compact") url.searchParams.append("view", view);
 
       const res = await fetch(url.toString());
       const data = await res.json();